@@ -3,6 +3,7 @@ import time
 from datetime import datetime
 from data.database import Database
 from utils.notifications import NotificationManager
+from utils.scheduler import start_default_scheduler
 
 # Initialize database and notification manager
 @st.cache_resource
@@ -13,8 +14,13 @@ def init_database():
 def init_notifications():
     return NotificationManager()
 
+@st.cache_resource
+def init_scheduler():
+    return start_default_scheduler(init_database(), init_notifications())
+
 db = init_database()
 notifications = init_notifications()
+scheduler = init_scheduler()
 
 # Page configuration
 st.set_page_config(
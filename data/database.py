@@ -1,20 +1,53 @@
 import sqlite3
 import json
+import os
 import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 
+def _round_or_none(value):
+    """Round a reading to an integer column value, keeping missing values as None"""
+    return int(round(value)) if value is not None else None
+
+
+def _growth_pct(current: float, previous: float) -> float:
+    """Percent change from the previous period (0 when there is nothing to compare)"""
+    return round((current - previous) / previous * 100, 1) if previous > 0 else 0.0
+
+
+# Days covered by each report period of the ESG page
+ESG_PERIOD_DAYS = {
+    "Última Semana": 7,
+    "Último Mês": 30,
+    "Últimos 3 Meses": 90,
+    "Último Ano": 365,
+}
+
+
 class Database:
+    # Listeners are shared by every instance on the same database file: each
+    # page caches its own Database, and ingestion through any of them must
+    # reach the scheduler's listeners
+    _listeners: Dict[tuple, list] = {}
+    # Same for the GPS fix buffer, so one scheduler job can flush it for every page
+    _telemetry_buffers: Dict[str, Any] = {}
+
     def __init__(self, db_path: str = "ecosmart.db"):
         self.db_path = db_path
+        self._reading_listeners = self._listeners.setdefault(("reading", os.path.abspath(db_path)), [])
+        self._position_listeners = self._listeners.setdefault(("position", os.path.abspath(db_path)), [])
         self.init_database()
         self.populate_sample_data()
+        self.populate_fleet_data()
     
     def init_database(self):
         """Initialize database tables"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL lets telemetry ingestion and page reads run concurrently
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Bins table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS bins (
@@ -47,6 +80,38 @@ class Database:
             )
         """)
         
+        # Sensor readings table (append-only history written by bulk ingestion)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sensor_readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sensor_id TEXT NOT NULL,
+                bin_id TEXT NOT NULL,
+                recorded_at TEXT NOT NULL,
+                fill_level REAL NOT NULL,
+                battery_level REAL,
+                temperature REAL,
+                humidity REAL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_sensor_readings_bin_time
+            ON sensor_readings (bin_id, recorded_at)
+        """)
+        
+        # Hourly rollup of sensor readings, kept after raw readings are archived
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sensor_readings_hourly (
+                bin_id TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                avg_fill_level REAL,
+                max_fill_level REAL,
+                min_battery_level REAL,
+                avg_temperature REAL,
+                readings INTEGER DEFAULT 0,
+                PRIMARY KEY (bin_id, hour)
+            )
+        """)
+        
         # Users table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -85,15 +150,95 @@ class Database:
             )
         """)
         
-        # Truck location table
+        # Fleet table: one row per truck, with its latest telemetry denormalized
+        # so the map and the route planner never scan the positions history
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS truck_location (
-                id INTEGER PRIMARY KEY,
-                coordinates TEXT NOT NULL,
-                fuel_level INTEGER DEFAULT 75,
-                speed INTEGER DEFAULT 25,
+            CREATE TABLE IF NOT EXISTS trucks (
+                truck_id TEXT PRIMARY KEY,
+                plate TEXT,
                 driver TEXT DEFAULT 'João Silva',
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                capacity_kg REAL DEFAULT 8000,
+                depot TEXT,
+                status TEXT DEFAULT 'active',
+                last_lat REAL,
+                last_lon REAL,
+                last_speed REAL DEFAULT 0,
+                last_fuel_level REAL DEFAULT 100,
+                last_seen TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Truck positions table (append-only GPS/fuel/speed history)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS truck_positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                truck_id TEXT NOT NULL,
+                recorded_at TEXT NOT NULL,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                speed REAL DEFAULT 0,
+                fuel_level REAL,
+                heading REAL,
+                FOREIGN KEY (truck_id) REFERENCES trucks(truck_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_truck_positions_truck_time
+            ON truck_positions (truck_id, recorded_at)
+        """)
+        
+        # Collections detected from truck GPS dwell at a bin, confirmed by a fill-level drop
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS collection_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection_id INTEGER,
+                bin_id TEXT NOT NULL,
+                truck_id TEXT NOT NULL,
+                arrived_at TEXT NOT NULL,
+                dwell_seconds REAL DEFAULT 0,
+                distance_m REAL,
+                fill_before REAL,
+                fill_after REAL,
+                status TEXT DEFAULT 'pending',
+                confirmed_at TEXT,
+                FOREIGN KEY (collection_id) REFERENCES collections(id)
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_collection_events_bin_status
+            ON collection_events (bin_id, status)
+        """)
+        
+        # Fuel/CO2 of executed routes and of their unoptimized baseline
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS route_energy (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                executed_at TEXT NOT NULL,
+                route_kind TEXT DEFAULT 'fleet',
+                truck_id TEXT,
+                stops INTEGER DEFAULT 0,
+                load_kg REAL DEFAULT 0,
+                idle_min REAL DEFAULT 0,
+                distance_km REAL DEFAULT 0,
+                fuel_l REAL DEFAULT 0,
+                co2_kg REAL DEFAULT 0,
+                baseline_distance_km REAL DEFAULT 0,
+                baseline_fuel_l REAL DEFAULT 0,
+                baseline_co2_kg REAL DEFAULT 0
+            )
+        """)
+        
+        # Daily totals of route_energy, maintained on insert so ESG reports never rescan routes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS esg_daily (
+                day TEXT PRIMARY KEY,
+                routes INTEGER DEFAULT 0,
+                distance_km REAL DEFAULT 0,
+                fuel_l REAL DEFAULT 0,
+                co2_kg REAL DEFAULT 0,
+                fuel_saved_l REAL DEFAULT 0,
+                co2_avoided_kg REAL DEFAULT 0
             )
         """)
         
@@ -203,12 +348,6 @@ class Database:
                 VALUES (?, ?, ?)
             """, (timestamp, activity, activity_type))
         
-        # Initial truck location
-        cursor.execute("""
-            INSERT INTO truck_location (id, coordinates, fuel_level, speed, driver)
-            VALUES (1, ?, 78, 25, 'João Silva')
-        """, (json.dumps([-23.5505, -46.6333]),))
-        
         # Sample API logs
         api_logs = [
             ("/api/sensors/data", "success", 45),
@@ -228,6 +367,54 @@ class Database:
         conn.commit()
         conn.close()
     
+    def populate_fleet_data(self):
+        """Populate the fleet with sample trucks and their first GPS fix"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM trucks")
+        if cursor.fetchone()[0] > 0:
+            conn.close()
+            return
+        
+        depot = [-23.5505, -46.6333]
+        
+        # Databases created before the fleet model kept a single truck row
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'truck_location'")
+        if cursor.fetchone():
+            cursor.execute("SELECT coordinates FROM truck_location WHERE id = 1")
+            row = cursor.fetchone()
+            if row:
+                depot = json.loads(row[0])
+        
+        trucks_data = [
+            ("TRUCK_001", "ECO-1A23", "João Silva", 8000, depot),
+            ("TRUCK_002", "ECO-2B45", "Carlos Souza", 8000, depot),
+            ("TRUCK_003", "ECO-3C67", "Ana Pereira", 6000, depot),
+        ]
+        
+        cursor.executemany("""
+            INSERT INTO trucks (truck_id, plate, driver, capacity_kg, depot)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(truck_id, plate, driver, capacity, json.dumps(coords))
+              for truck_id, plate, driver, capacity, coords in trucks_data])
+        
+        conn.commit()
+        conn.close()
+        
+        now = datetime.now()
+        self.record_truck_positions([
+            {
+                'truck_id': truck_id,
+                'recorded_at': now.isoformat(),
+                'lat': coords[0] + random.uniform(-0.01, 0.01),
+                'lon': coords[1] + random.uniform(-0.01, 0.01),
+                'speed': 25,
+                'fuel_level': random.randint(60, 95)
+            }
+            for truck_id, _, _, _, coords in trucks_data
+        ])
+    
     def get_all_bins(self) -> List[Dict[str, Any]]:
         """Get all bins with their current status"""
         conn = sqlite3.connect(self.db_path)
@@ -296,43 +483,151 @@ class Database:
         conn.close()
         return activities
     
-    def get_truck_location(self) -> Dict[str, Any] | None:
-        """Get current truck location and status"""
+    def get_trucks(self) -> List[Dict[str, Any]]:
+        """Get the fleet definition with each truck's latest telemetry"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT coordinates, fuel_level, speed, driver
-            FROM truck_location
-            WHERE id = 1
+            SELECT truck_id, plate, driver, capacity_kg, depot, status,
+                   last_lat, last_lon, last_speed, last_fuel_level, last_seen
+            FROM trucks
+            ORDER BY truck_id
         """)
         
-        row = cursor.fetchone()
+        trucks = []
+        for row in cursor.fetchall():
+            trucks.append({
+                'truck_id': row[0],
+                'plate': row[1],
+                'driver': row[2],
+                'capacity_kg': row[3],
+                'depot': json.loads(row[4]) if row[4] else None,
+                'status': row[5],
+                'coordinates': [row[6], row[7]] if row[6] is not None else None,
+                'speed': row[8],
+                'fuel_level': row[9],
+                'last_seen': row[10]
+            })
+        
         conn.close()
+        return trucks
+    
+    def get_latest_truck_positions(self, truck_ids: List[str] | None = None) -> Dict[str, Dict[str, Any]]:
+        """Get the latest known position of each truck, keyed by truck_id"""
+        trucks = self.get_trucks()
+        if truck_ids is not None:
+            wanted = set(truck_ids)
+            trucks = [t for t in trucks if t['truck_id'] in wanted]
         
-        if row:
-            return {
-                'coordinates': json.loads(row[0]),
-                'fuel_level': row[1],
-                'speed': row[2],
-                'driver': row[3]
-            }
-        return None
+        return {t['truck_id']: t for t in trucks if t['coordinates'] is not None}
+    
+    def get_truck_location(self, truck_id: str = "TRUCK_001") -> Dict[str, Any] | None:
+        """Get current truck location and status"""
+        return self.get_latest_truck_positions([truck_id]).get(truck_id)
     
-    def update_truck_location(self, lat: float, lon: float):
-        """Update truck GPS coordinates"""
+    def record_truck_positions(self, positions: List[Dict[str, Any]]) -> int:
+        """Append a batch of truck GPS fixes and refresh each truck's latest position
+        
+        Each position needs truck_id, lat and lon; recorded_at, speed, fuel_level
+        and heading are optional. The whole batch is written in one transaction.
+        """
+        if not positions:
+            return 0
+        
+        now = datetime.now().isoformat()
+        rows = [
+            (p['truck_id'], p.get('recorded_at') or now, p['lat'], p['lon'],
+             p.get('speed', 0), p.get('fuel_level'), p.get('heading'))
+            for p in positions
+        ]
+        
+        # Only the newest fix of each truck in the batch touches the fleet table
+        latest = {}
+        for row in rows:
+            if row[0] not in latest or row[1] >= latest[row[0]][1]:
+                latest[row[0]] = row
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        new_coords = json.dumps([lat, lon])
-        cursor.execute("""
-            UPDATE truck_location
-            SET coordinates = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE id = 1
-        """, (new_coords,))
+        cursor.executemany("""
+            INSERT INTO truck_positions (truck_id, recorded_at, lat, lon, speed, fuel_level, heading)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        cursor.executemany("""
+            UPDATE trucks
+            SET last_lat = ?, last_lon = ?, last_speed = ?,
+                last_fuel_level = COALESCE(?, last_fuel_level), last_seen = ?
+            WHERE truck_id = ? AND (last_seen IS NULL OR last_seen <= ?)
+        """, [(r[2], r[3], r[4], r[5], r[1], r[0], r[1]) for r in latest.values()])
         
         conn.commit()
         conn.close()
+        
+        for listener in self._position_listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"Error in truck position listener: {e}")
+        return len(rows)
+    
+    def add_position_listener(self, listener):
+        """Register a callback run after every batch of truck positions with the stored rows"""
+        self._position_listeners.append(listener)
+    
+    def remove_position_listener(self, listener):
+        if listener in self._position_listeners:
+            self._position_listeners.remove(listener)
+    
+    @property
+    def telemetry(self):
+        """TelemetryBuffer that batches truck fixes for this database file"""
+        from utils.fleet_telemetry import TelemetryBuffer
+        
+        key = os.path.abspath(self.db_path)
+        if key not in self._telemetry_buffers:
+            self._telemetry_buffers.setdefault(key, TelemetryBuffer(self))
+        return self._telemetry_buffers[key]
+    
+    def update_truck_location(self, lat: float, lon: float, truck_id: str = "TRUCK_001",
+                              speed: float = 0, fuel_level: float | None = None,
+                              heading: float | None = None, recorded_at: str | None = None) -> int:
+        """Queue a truck GPS fix; fixes are written in batches (see TelemetryBuffer)"""
+        return self.telemetry.add(truck_id, lat, lon, speed, fuel_level, heading, recorded_at)
+    
+    def flush_truck_positions(self) -> int:
+        """Write buffered fixes that have waited long enough"""
+        return self.telemetry.flush_due()
+    
+    def get_truck_track(self, truck_id: str, since: str | None = None,
+                        limit: int = 5000) -> List[Dict[str, Any]]:
+        """Get the recorded positions of a truck in chronological order"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT recorded_at, lat, lon, speed, fuel_level, heading
+            FROM truck_positions
+            WHERE truck_id = ? AND recorded_at >= ?
+            ORDER BY recorded_at
+            LIMIT ?
+        """, (truck_id, since or "", limit))
+        
+        track = []
+        for row in cursor.fetchall():
+            track.append({
+                'recorded_at': row[0],
+                'lat': row[1],
+                'lon': row[2],
+                'speed': row[3],
+                'fuel_level': row[4],
+                'heading': row[5]
+            })
+        
+        conn.close()
+        return track
     
     def get_all_sensors(self) -> List[Dict[str, Any]]:
         """Get all sensor data"""
@@ -362,48 +657,80 @@ class Database:
         return sensors
     
     def get_realtime_sensor_data(self) -> List[Dict[str, Any]]:
-        """Get real-time sensor data with slight variations"""
-        sensors = self.get_all_sensors()
+        """Get real-time sensor data as last written by the ingestion path"""
+        return self.get_all_sensors()
+    
+    def update_sensor_data_realtime(self, simulator=None):
+        """Advance the sensor simulator by one tick and persist the readings"""
+        from utils.sensor_simulator import SensorSimulator
         
-        # Simulate small changes in data
-        for sensor in sensors:
-            # Small random variations
-            sensor['fill_level'] = max(0, min(100, sensor['fill_level'] + random.randint(-2, 3)))
-            sensor['battery_level'] = max(0, min(100, sensor['battery_level'] + random.randint(-1, 1)))
-            sensor['last_update'] = datetime.now().strftime("%H:%M:%S")
+        if simulator is None:
+            if getattr(self, '_simulator', None) is None:
+                self._simulator = SensorSimulator.from_database(self)
+            simulator = self._simulator
         
-        return sensors
+        # Levels written through the API or by collections take precedence over the simulation
+        simulator.sync_from_database()
+        return simulator.tick()
     
-    def update_sensor_data_realtime(self):
-        """Update sensor data with simulated real-time changes"""
+    def rollup_sensor_readings(self, since_hours: int = 2, since: str | None = None) -> int:
+        """Aggregate recent raw sensor readings into hourly rows per bin (from since, when given)"""
+        since = since or (datetime.now() - timedelta(hours=since_hours)).strftime("%Y-%m-%dT%H:00:00")
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Update a few random sensors
-        sensor_ids = [f"SENS_{i:03d}" for i in range(1, 13)]
+        cursor.execute("""
+            INSERT OR REPLACE INTO sensor_readings_hourly
+            (bin_id, hour, avg_fill_level, max_fill_level, min_battery_level, avg_temperature, readings)
+            SELECT bin_id, substr(recorded_at, 1, 13) || ':00:00' AS hour,
+                   AVG(fill_level), MAX(fill_level), MIN(battery_level), AVG(temperature), COUNT(*)
+            FROM sensor_readings
+            WHERE recorded_at >= ?
+            GROUP BY bin_id, hour
+        """, (since,))
         
-        for sensor_id in random.sample(sensor_ids, 3):  # Update 3 random sensors
-            fill_change = random.randint(-2, 5)  # Mostly increase fill level
-            battery_change = random.randint(-1, 0)  # Slowly decrease battery
-            
-            cursor.execute("""
-                UPDATE sensors
-                SET fill_level = CASE 
-                    WHEN fill_level + ? > 100 THEN 100
-                    WHEN fill_level + ? < 0 THEN 0
-                    ELSE fill_level + ?
-                END,
-                battery_level = CASE
-                    WHEN battery_level + ? < 0 THEN 0
-                    ELSE battery_level + ?
-                END,
-                last_update = ?
-                WHERE sensor_id = ?
-            """, (fill_change, fill_change, fill_change, battery_change, battery_change, 
-                  datetime.now().strftime("%H:%M:%S"), sensor_id))
+        rows = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return rows
+    
+    def archive_old_data(self, retention_days: int = 7, archive_path: str | None = None) -> Dict[str, int]:
+        """Move raw readings and truck positions older than the retention window to an archive database"""
+        archive_path = archive_path or self.db_path.replace(".db", "") + "_archive.db"
+        # Whole hours only, so no hourly rollup is ever left with part of its raw rows
+        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%dT%H:00:00")
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'sensor_readings'")
+        archived_until = None
+        if cursor.fetchone():
+            cursor.execute("SELECT MAX(recorded_at) FROM archive.sensor_readings")
+            archived_until = cursor.fetchone()[0]
+        
+        # Make sure the hours being archived are covered by the rollup. Hours up to the last
+        # archived reading may have lost raw rows already, so their rollups are kept as they are
+        since = (datetime.now() - timedelta(days=retention_days, hours=24)).strftime("%Y-%m-%dT%H:00:00")
+        if archived_until is not None:
+            next_hour = (datetime.fromisoformat(archived_until[:13] + ":00:00") + timedelta(hours=1)).isoformat()
+            since = max(since, next_hour)
+        self.rollup_sensor_readings(since=since)
+        
+        archived = {}
+        for table, time_column in (("sensor_readings", "recorded_at"), ("truck_positions", "recorded_at")):
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS archive.{table} AS SELECT * FROM main.{table} WHERE 0")
+            cursor.execute(f"""
+                INSERT INTO archive.{table} SELECT * FROM main.{table} WHERE {time_column} < ?
+            """, (cutoff,))
+            cursor.execute(f"DELETE FROM main.{table} WHERE {time_column} < ?", (cutoff,))
+            archived[table] = cursor.rowcount
         
         conn.commit()
+        cursor.execute("DETACH DATABASE archive")
         conn.close()
+        return archived
     
     def get_user_data(self, user_id: str) -> Dict[str, Any] | None:
         """Get user data by ID"""
@@ -497,20 +824,187 @@ class Database:
         conn.close()
         return collections
     
+    def record_detected_collections(self, events: List[Dict[str, Any]]) -> List[int]:
+        """Insert detected collections (collections row plus its pending collection_events row)
+        
+        Each event has bin_id, truck_id, arrived_at, dwell_seconds, distance_m,
+        fill_before, amount_kg, location and waste_type. Returns the event ids.
+        """
+        if not events:
+            return []
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        ids = []
+        for e in events:
+            cursor.execute("""
+                INSERT INTO collections (bin_id, amount, collection_date, efficiency, location, waste_type)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (e['bin_id'], round(e['amount_kg'], 1), e['arrived_at'], _round_or_none(e['fill_before']),
+                  e.get('location'), e.get('waste_type')))
+            cursor.execute("""
+                INSERT INTO collection_events
+                (collection_id, bin_id, truck_id, arrived_at, dwell_seconds, distance_m, fill_before)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (cursor.lastrowid, e['bin_id'], e['truck_id'], e['arrived_at'], round(e['dwell_seconds'], 1),
+                  _round_or_none(e['distance_m']), e['fill_before']))
+            ids.append(cursor.lastrowid)
+        
+        conn.commit()
+        conn.close()
+        return ids
+    
+    def resolve_detected_collections(self, confirmed: List[tuple], expired: List[int]):
+        """Mark detections as confirmed ((event_id, fill_after, confirmed_at) tuples) or unconfirmed"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+            UPDATE collection_events
+            SET status = 'confirmed', fill_after = ?, confirmed_at = ?
+            WHERE id = ?
+        """, [(fill_after, confirmed_at, event_id) for event_id, fill_after, confirmed_at in confirmed])
+        cursor.executemany("""
+            UPDATE bins SET last_collection = ?
+            WHERE id = (SELECT bin_id FROM collection_events WHERE id = ?)
+        """, [(confirmed_at, event_id) for event_id, _, confirmed_at in confirmed])
+        cursor.executemany("""
+            UPDATE collection_events SET status = 'unconfirmed' WHERE id = ?
+        """, [(event_id,) for event_id in expired])
+        
+        conn.commit()
+        conn.close()
+    
+    def get_bin_fill_levels(self) -> Dict[str, float]:
+        """Current fill level of every bin"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, fill_level FROM bins")
+        levels = {row[0]: float(row[1] or 0) for row in cursor.fetchall()}
+        conn.close()
+        return levels
+    
+    def get_pending_collection_bins(self, after_event_id: int = 0) -> tuple:
+        """Bins with a pending detected collection newer than after_event_id, and the newest event id"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, bin_id FROM collection_events
+            WHERE id > ? AND status = 'pending'
+            ORDER BY id
+        """, (after_event_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [row[1] for row in rows], (rows[-1][0] if rows else after_event_id)
+    
+    def get_collection_events(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent detected collections"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT e.bin_id, e.truck_id, e.arrived_at, e.dwell_seconds, e.fill_before, e.fill_after,
+                   e.status, b.name
+            FROM collection_events e LEFT JOIN bins b ON b.id = e.bin_id
+            ORDER BY e.arrived_at DESC
+            LIMIT ?
+        """, (limit,))
+        
+        events = []
+        for row in cursor.fetchall():
+            events.append({
+                'bin_id': row[0],
+                'truck_id': row[1],
+                'arrived_at': row[2],
+                'dwell_seconds': row[3],
+                'fill_before': row[4],
+                'fill_after': row[5],
+                'status': row[6],
+                'bin_name': row[7]
+            })
+        
+        conn.close()
+        return events
+    
     def save_sensor_data(self, data: Dict[str, Any]):
         """Save sensor data from API"""
+        self.save_sensor_readings_bulk([data])
+    
+    def save_sensor_readings_bulk(self, readings: List[Dict[str, Any]] | List[tuple]) -> int:
+        """Bulk ingestion path for sensor readings
+        
+        Readings are either dicts with sensor_id, bin_id, fill_level,
+        battery_level and optional timestamp/temperature/humidity, or tuples
+        (sensor_id, bin_id, timestamp, fill_level, battery_level, temperature,
+        humidity). Everything is written in a single transaction: the readings
+        are appended to sensor_readings and the latest values are upserted into
+        sensors and bins.
+        """
+        if not readings:
+            return 0
+        
+        now = datetime.now().isoformat()
+        if isinstance(readings[0], dict):
+            rows = [
+                (r['sensor_id'], r['bin_id'], r.get('timestamp') or now, r['fill_level'],
+                 r.get('battery_level'), r.get('temperature'), r.get('humidity'))
+                for r in readings
+            ]
+        else:
+            rows = readings
+        
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT OR REPLACE INTO sensors 
-            (sensor_id, bin_id, fill_level, battery_level, status, last_update)
-            VALUES (?, ?, ?, ?, 'online', ?)
-        """, (data['sensor_id'], data['bin_id'], data['fill_level'], 
-              data['battery_level'], data['timestamp']))
+        cursor.executemany("""
+            INSERT INTO sensor_readings
+            (sensor_id, bin_id, recorded_at, fill_level, battery_level, temperature, humidity)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        cursor.executemany("""
+            INSERT INTO sensors
+            (sensor_id, bin_id, fill_level, battery_level, temperature, humidity, status, last_update)
+            VALUES (?, ?, ?, COALESCE(?, 100), COALESCE(?, 20.0), COALESCE(?, 50), 'online', ?)
+            ON CONFLICT(sensor_id) DO UPDATE SET
+                bin_id = excluded.bin_id,
+                fill_level = excluded.fill_level,
+                battery_level = COALESCE(?, sensors.battery_level),
+                temperature = COALESCE(?, sensors.temperature),
+                humidity = COALESCE(?, sensors.humidity),
+                status = 'online',
+                last_update = excluded.last_update
+        """, [
+            (r[0], r[1], int(round(r[3])), _round_or_none(r[4]), r[5], _round_or_none(r[6]),
+             r[2][11:19] if len(r[2]) >= 19 else r[2],
+             _round_or_none(r[4]), r[5], _round_or_none(r[6]))
+            for r in rows
+        ])
+        
+        cursor.executemany("""
+            UPDATE bins
+            SET fill_level = ?, battery_level = COALESCE(?, battery_level)
+            WHERE id = ?
+        """, [(int(round(r[3])), _round_or_none(r[4]), r[1]) for r in rows])
         
         conn.commit()
         conn.close()
+        
+        for listener in self._reading_listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"Error in sensor reading listener: {e}")
+        return len(rows)
+    
+    def add_reading_listener(self, listener):
+        """Register a callback run after every ingestion with the stored reading tuples"""
+        self._reading_listeners.append(listener)
+    
+    def remove_reading_listener(self, listener):
+        if listener in self._reading_listeners:
+            self._reading_listeners.remove(listener)
     
     def get_api_logs(self) -> List[Dict[str, Any]]:
         """Get recent API logs"""
@@ -536,10 +1030,85 @@ class Database:
         conn.close()
         return logs
     
+    def record_route_energy(self, routes: List[Dict[str, Any]], kind: str = "fleet",
+                            executed_at: str | None = None) -> int:
+        """Store per-route fuel/CO2 (see RouteEnergyModel.evaluate) and add them to the daily ESG totals"""
+        if not routes:
+            return 0
+        
+        executed_at = executed_at or datetime.now().isoformat()
+        rows = [
+            (executed_at, kind, r.get('truck_id'), r['stops'], r['load_kg'], r.get('idle_min', 0),
+             r['distance_km'], r['fuel_l'], r['co2_kg'],
+             r['baseline_distance_km'], r['baseline_fuel_l'], r['baseline_co2_kg'])
+            for r in routes
+        ]
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+            INSERT INTO route_energy
+            (executed_at, route_kind, truck_id, stops, load_kg, idle_min, distance_km, fuel_l, co2_kg,
+             baseline_distance_km, baseline_fuel_l, baseline_co2_kg)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        cursor.execute("""
+            INSERT INTO esg_daily (day, routes, distance_km, fuel_l, co2_kg, fuel_saved_l, co2_avoided_kg)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(day) DO UPDATE SET
+                routes = esg_daily.routes + excluded.routes,
+                distance_km = esg_daily.distance_km + excluded.distance_km,
+                fuel_l = esg_daily.fuel_l + excluded.fuel_l,
+                co2_kg = esg_daily.co2_kg + excluded.co2_kg,
+                fuel_saved_l = esg_daily.fuel_saved_l + excluded.fuel_saved_l,
+                co2_avoided_kg = esg_daily.co2_avoided_kg + excluded.co2_avoided_kg
+        """, (
+            executed_at[:10], len(rows),
+            sum(r[6] for r in rows), sum(r[7] for r in rows), sum(r[8] for r in rows),
+            sum(r[10] - r[7] for r in rows), sum(r[11] - r[8] for r in rows)
+        ))
+        
+        conn.commit()
+        conn.close()
+        return len(rows)
+    
+    def get_route_energy_totals(self, days: int, offset_days: int = 0) -> Dict[str, float]:
+        """Summed esg_daily totals over `days` days ending offset_days ago"""
+        end = datetime.now().date() - timedelta(days=offset_days)
+        start = end - timedelta(days=days - 1)
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(routes), 0), COALESCE(SUM(distance_km), 0), COALESCE(SUM(fuel_l), 0),
+                   COALESCE(SUM(co2_kg), 0), COALESCE(SUM(fuel_saved_l), 0), COALESCE(SUM(co2_avoided_kg), 0)
+            FROM esg_daily
+            WHERE day BETWEEN ? AND ?
+        """, (start.isoformat(), end.isoformat()))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return {
+            'days_with_routes': row[0],
+            'routes': row[1],
+            'distance_km': row[2],
+            'fuel_l': row[3],
+            'co2_kg': row[4],
+            'fuel_saved_l': row[5],
+            'co2_avoided_kg': row[6]
+        }
+    
     def get_esg_data(self, period: str = "Último Mês") -> Dict[str, Any]:
-        """Get ESG report data"""
+        """Get ESG report data
+
+        Fuel saved and CO2 avoided come from the recorded route energy totals
+        (esg_daily) when any exist for the period; growth compares with the
+        previous period of the same length.
+        """
         # Simulated ESG data for demonstration
-        return {
+        data = {
             'total_recycled': 2.3,
             'recycled_growth': 15.2,
             'co2_avoided': 5.1,
@@ -586,6 +1155,19 @@ class Database:
             'risk_mitigation': 92.3,
             'stakeholder_satisfaction': 8.2
         }
+        
+        days = ESG_PERIOD_DAYS.get(period, 30)
+        current = self.get_route_energy_totals(days)
+        if current['routes']:
+            previous = self.get_route_energy_totals(days, offset_days=days)
+            data['fuel_saved'] = current['fuel_saved_l']
+            data['co2_avoided'] = current['co2_avoided_kg'] / 1000.0
+            data['fuel_growth'] = _growth_pct(current['fuel_saved_l'], previous['fuel_saved_l'])
+            data['co2_growth'] = _growth_pct(current['co2_avoided_kg'], previous['co2_avoided_kg'])
+            data['fuel_used'] = current['fuel_l']
+            data['route_co2_emitted'] = current['co2_kg'] / 1000.0
+            data['route_distance_km'] = current['distance_km']
+        return data
     
     def generate_esg_report(self, data: Dict[str, Any]) -> str:
         """Generate ESG report"""
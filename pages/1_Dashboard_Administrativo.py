@@ -4,6 +4,8 @@ import plotly.express as px
 from datetime import datetime, timedelta
 import time
 from data.database import Database
+from utils.bin_placement import BinPlacementAnalyzer
+from utils.fill_forecast import FillForecaster
 
 
 # Initialize database
@@ -15,6 +17,14 @@ def init_database():
 db = init_database()
 
 
+@st.cache_resource
+def init_forecaster():
+    return FillForecaster(db.db_path)
+
+
+forecaster = init_forecaster()
+
+
 # --- Page config ---
 st.set_page_config(
     page_title="Dashboard Administrativo - EcoSmart",
@@ -146,7 +156,8 @@ with col4:
 st.markdown("---")
 
 # --- Tabs for Organization ---
-tab_status, tab_performance = st.tabs(["Status em Tempo Real", "Indicadores de Performance"])
+tab_status, tab_performance, tab_placement = st.tabs(["Status em Tempo Real", "Indicadores de Performance",
+                                                      "Posicionamento de Lixeiras"])
 
 with tab_status:
     
@@ -208,10 +219,13 @@ with tab_status:
         filtered_bins = [b for b in bins_data if selected_region.lower() in b['location'].lower()]
 
     # Create detailed table
+    # Collection status from the level forecast for the middle of the next shift
+    forecasts = forecaster.forecast(filtered_bins, datetime.now() + timedelta(hours=4))
     bins_table_data = []
-    for bin_item in filtered_bins:
+    for bin_item, forecast in zip(filtered_bins, forecasts):
         status_emoji = "🔴" if bin_item['fill_level'] >= 80 else "🟡" if bin_item['fill_level'] >= 40 else "🟢"
-        collection_status = "Urgente" if bin_item['fill_level'] >= 80 else "Programada" if bin_item['fill_level'] >= 40 else "Não Necessária"
+        collection_status = "Urgente" if forecast['fill_level'] >= 80 else "Programada" if forecast['fill_level'] >= 40 else "Não Necessária"
+        hours_to_full = forecast.get('hours_to_full')
 
         bins_table_data.append({
             "Status": status_emoji,
@@ -219,6 +233,8 @@ with tab_status:
             "Nome": bin_item['name'],
             "Localização": bin_item['location'],
             "Nível (%)": bin_item['fill_level'],
+            "Previsto 4h (%)": forecast['fill_level'],
+            "Cheia em": f"{hours_to_full:.1f}h" if hours_to_full is not None else "—",
             "Tipo": bin_item['waste_type'],
             "Coleta": collection_status,
             "Última Coleta": bin_item.get('last_collection', 'N/A')
@@ -303,6 +319,68 @@ with tab_performance:
             st.info("Nenhuma coleta recente registrada.")
 
 
+with tab_placement:
+
+    # --- Bin placement analysis ---
+    st.markdown("### 📍 Onde Adicionar, Mover ou Remover Lixeiras")
+    st.caption("Baseado na taxa de enchimento de cada lixeira e nos locais de descarte registrados pelos usuários")
+
+    col_radius, col_days, col_run = st.columns([1, 1, 1])
+    with col_radius:
+        walk_radius = st.slider("Distância máxima a pé (m)", 50, 400, 150, step=25)
+    with col_days:
+        placement_days = st.slider("Histórico de descartes (dias)", 7, 90, 30)
+    with col_run:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("🔍 Analisar Posicionamento", use_container_width=True):
+            analyzer = BinPlacementAnalyzer(db.db_path, forecaster, walk_radius_m=walk_radius)
+            with st.spinner("Avaliando locais candidatos..."):
+                try:
+                    st.session_state['placement'] = analyzer.analyze(days=placement_days)
+                except ValueError as e:
+                    st.error(f"⚠️ {e}")
+
+    placement = st.session_state.get('placement')
+    if placement:
+        summary = placement['summary']
+        pl_col1, pl_col2, pl_col3, pl_col4 = st.columns(4)
+        with pl_col1:
+            st.metric("Cobertura da Demanda", f"{summary['coverage_after_pct']:.1f}%",
+                      delta=f"{summary['coverage_after_pct'] - summary['coverage_before_pct']:+.1f} p.p.")
+        with pl_col2:
+            st.metric("Caminhada Média", f"{summary['avg_walk_m_after']:.0f} m",
+                      delta=f"{summary['avg_walk_m_after'] - summary['avg_walk_m_before']:+.0f} m",
+                      delta_color="inverse")
+        with pl_col3:
+            st.metric("Locais Avaliados", f"{summary['candidate_sites']:,}")
+        with pl_col4:
+            st.metric("Descartes Considerados", f"{summary['disposals']:,}")
+
+        st.markdown(f"**➕ Adicionar ({len(placement['add'])})**")
+        if placement['add']:
+            st.dataframe(pd.DataFrame([{
+                "Latitude": a['coordinates'][0],
+                "Longitude": a['coordinates'][1],
+                "Nova Demanda (kg/dia)": a['new_demand_kg_day'],
+                "Lixeira Mais Próxima (m)": a['nearest_bin_m'],
+            } for a in placement['add']]), use_container_width=True, hide_index=True)
+
+        st.markdown(f"**↔️ Mover ({len(placement['move'])})**")
+        if placement['move']:
+            st.dataframe(pd.DataFrame([{
+                "Lixeira": m['bin_id'],
+                "Para (lat, lon)": f"{m['to'][0]:.5f}, {m['to'][1]:.5f}",
+                "Deslocamento (m)": m['distance_m'],
+            } for m in placement['move']]), use_container_width=True, hide_index=True)
+
+        st.markdown(f"**➖ Remover ({len(placement['remove'])})**")
+        if placement['remove']:
+            st.dataframe(pd.DataFrame([{
+                "Lixeira": r['bin_id'],
+                "Resíduos (kg/dia)": r['fill_kg_day'],
+            } for r in placement['remove']]), use_container_width=True, hide_index=True)
+
+
 # Auto-refresh timer
 if auto_refresh:
     time.sleep(30)
@@ -7,6 +7,13 @@ from datetime import datetime
 import time
 import random
 from data.database import Database
+from utils.energy_model import RouteEnergyModel
+from utils.fill_forecast import FillForecaster
+from utils.gps_trace import TraceStore, tolerance_for_zoom
+from utils.notifications import NotificationManager
+from utils.route_cache import RouteCache
+from utils.route_optimizer import RouteOptimizer, AnytimeRouteJob, DEFAULT_DEPOT
+from utils.scheduler import default_dispatch, start_default_scheduler
 
 
 # Initialize services
@@ -16,6 +23,86 @@ def init_database():
 
 db = init_database()
 
+# The scheduler owns the shift's DispatchManager, which inserts bins as they fill up
+@st.cache_resource
+def init_scheduler():
+    return start_default_scheduler(init_database(), NotificationManager())
+
+scheduler = init_scheduler()
+dispatch = default_dispatch()
+
+@st.cache_resource
+def init_route_optimizer():
+    # The route cache serves reruns that ask for the same bins again
+    return RouteOptimizer(db.db_path, forecaster=FillForecaster(db.db_path), route_cache=RouteCache())
+
+route_optimizer = init_route_optimizer()
+
+@st.cache_resource
+def init_trace_store():
+    return TraceStore(db.db_path)
+
+trace_store = init_trace_store()
+
+ROUTE_COLORS = ['#008080', '#E53935', '#3949AB', '#FB8C00', '#7CB342', '#8E24AA', '#00ACC1', '#6D4C41']
+
+def route_version(routes):
+    """Identifies a set of routes by cost model, depots and stop order"""
+    return (route_optimizer.matrix_version(),
+            tuple((r.get('truck_id'), tuple(r['depot']), tuple(stop['id'] for stop in r['stops']),
+                   tuple(u['after_stop'] for u in r.get('unloads', []))) for r in routes))
+
+@st.cache_data(max_entries=32)
+def route_layer_data(version, _routes, zoom=12):
+    """Path and numbered stops of each route, computed once per route version
+
+    _routes is not hashed by Streamlit: version identifies it. Only plain
+    lists are cached; the folium layers are built per rerun by add_route_layers.
+    """
+    layers = []
+    for k, route in enumerate(_routes):
+        if not route['stops']:
+            continue
+        layers.append({
+            'name': f"🚛 {route['truck_id']}" if route.get('truck_id') else "🧭 Rota Otimizada",
+            'color': ROUTE_COLORS[k % len(ROUTE_COLORS)],
+            'distance_km': route.get('distance_km', route.get('total_distance_km', 0.0)),
+            'path': route_optimizer.route_geometry(route, tolerance_for_zoom(zoom, route['depot'][0])),
+            'stops': [(stop['stop_number'], stop['coordinates'], stop.get('name', stop['id']),
+                       stop.get('fill_level', 0), stop.get('arrival_time')) for stop in route['stops']],
+        })
+    return layers
+
+def add_route_layers(m, layers):
+    """Add one toggleable layer per route (path and numbered stop markers) to a map"""
+    for data in layers:
+        color = data['color']
+        layer = folium.FeatureGroup(name=f"{data['name']} - {len(data['stops'])} paradas")
+        folium.PolyLine(
+            data['path'],
+            color=color,
+            weight=4,
+            opacity=0.8,
+            tooltip=f"{data['name']}: {data['distance_km']:.1f} km - {len(data['stops'])} paradas"
+        ).add_to(layer)
+
+        for number, coordinates, name, fill_level, arrival_time in data['stops']:
+            arrival = f"<br>🕐 Chegada: {arrival_time}" if arrival_time else ""
+            folium.Marker(
+                location=coordinates,
+                tooltip=f"{number}. {name}",
+                popup=folium.Popup(f"<b>Parada {number}</b><br>{name}"
+                                   f"<br>📊 Nível: {fill_level:.0f}%{arrival}", max_width=250),
+                icon=folium.DivIcon(
+                    icon_size=(22, 22),
+                    icon_anchor=(11, 11),
+                    html=f'<div style="background:{color};color:white;border-radius:50%;width:22px;height:22px;'
+                         f'text-align:center;font:bold 11px/22px sans-serif;border:2px solid white">'
+                         f'{number}</div>'
+                )
+            ).add_to(layer)
+        layer.add_to(m)
+
 
 # --- Page config ---
 st.set_page_config(
@@ -89,7 +176,8 @@ st.markdown('<h1 class="main-header">🗺️ Mapa GPS - Rastreamento em Tempo Re
 
 # --- Data Fetching ---
 bins_data = db.get_all_bins()
-truck_location = db.get_truck_location()
+fleet_positions = db.get_latest_truck_positions()
+truck_location = fleet_positions.get("TRUCK_001") or next(iter(fleet_positions.values()), None)
 
 # --- Sidebar controls ---
 with st.sidebar:
@@ -112,8 +200,10 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("### 🚛 Rastreamento")
     
-    show_truck = st.checkbox("🚛 Mostrar caminhão", value=True)
+    show_truck = st.checkbox("🚛 Mostrar caminhões", value=True)
     real_time = st.checkbox("⚡ Rastreamento em tempo real", value=True)
+    show_tracks = st.checkbox("🛣️ Mostrar trajetos do dia", value=False)
+    track_day = st.date_input("Dia do trajeto:", value=datetime.now().date(), disabled=not show_tracks)
     
     st.markdown("---")
     
@@ -132,6 +222,35 @@ with st.sidebar:
             st.warning("⚠️ Caminhão não localizado")
 
 
+    st.markdown("---")
+    st.markdown("### 🧭 Rota Otimizada")
+
+    route_budget = st.slider("Tempo de otimização (s):", 2, 60, 10)
+    route_job = st.session_state.get("route_job")
+
+    if st.button("🧭 Calcular Rota", use_container_width=True):
+        if route_job is not None:
+            route_job.cancel()
+        route_job = AnytimeRouteJob(route_optimizer, bins_data, DEFAULT_DEPOT, time_budget=route_budget)
+        # The first (constructed) route is ready within a fraction of a second
+        route_job.wait_first(timeout=2)
+        st.session_state["route_job"] = route_job
+
+    if route_job is not None and not route_job.done:
+        if st.button("⏹️ Parar Otimização", use_container_width=True):
+            route_job.cancel()
+
+    show_fleet_routes = st.checkbox("🚛 Mostrar rotas da frota", value=True)
+    if st.button("🔁 Replanejar Rotas da Frota", use_container_width=True):
+        with st.spinner("Calculando rotas por caminhão..."):
+            try:
+                dispatch.plan(bins_data)
+            except ValueError as e:
+                st.warning(f"⚠️ {e}")
+    # Live shift routes, patched by the dispatcher as bins cross the threshold
+    fleet_routes = dispatch.routes() if show_fleet_routes and dispatch.active else None
+
+
 # --- Main Content Area ---
 col_map, col_stats = st.columns([3, 1])
 
@@ -185,22 +304,45 @@ with col_map:
             icon=folium.Icon(color=color, icon=icon, prefix='glyphicon')
         ).add_to(m)
 
-    # Add truck location if enabled
-    if show_truck and truck_location:
-        truck_popup = f"""
-        <b>🚛 Caminhão de Coleta</b><br>
-        📍 Localização atual<br>
-        🕐 Atualizado: {datetime.now().strftime('%H:%M:%S')}<br>
-        ⛽ Combustível: {truck_location.get('fuel_level', 78)}%<br>
-        👨‍💼 Operador: {truck_location.get('driver', 'João Silva')}
-        """
-
-        folium.Marker(
-            location=truck_location['coordinates'],
-            popup=folium.Popup(truck_popup, max_width=300),
-            tooltip="Caminhão de Coleta",
-            icon=folium.Icon(color='blue', icon='road', prefix='fa')
-        ).add_to(m)
+    # Day tracks, simplified for the map's zoom level
+    if show_tracks:
+        track_colors = ['#1E88E5', '#8E24AA', '#F4511E', '#43A047', '#6D4C41']
+        for k, truck_id in enumerate(fleet_positions):
+            polyline = trace_store.get_polyline(truck_id, track_day.isoformat(), zoom=12)
+            if len(polyline) >= 2:
+                folium.PolyLine(
+                    polyline,
+                    color=track_colors[k % len(track_colors)],
+                    weight=3,
+                    opacity=0.7,
+                    tooltip=f"Trajeto {truck_id} - {track_day.strftime('%d/%m')}"
+                ).add_to(m)
+
+    # Add fleet locations if enabled
+    if show_truck:
+        for truck in fleet_positions.values():
+            truck_popup = f"""
+            <b>🚛 Caminhão {truck['truck_id']}</b><br>
+            🪪 Placa: {truck.get('plate', 'N/A')}<br>
+            🕐 Atualizado: {truck.get('last_seen') or 'N/A'}<br>
+            ⛽ Combustível: {truck.get('fuel_level', 78):.0f}%<br>
+            🏃 Velocidade: {truck.get('speed', 0):.0f} km/h<br>
+            👨‍💼 Operador: {truck.get('driver', 'João Silva')}
+            """
+
+            folium.Marker(
+                location=truck['coordinates'],
+                popup=folium.Popup(truck_popup, max_width=300),
+                tooltip=f"Caminhão {truck['truck_id']}",
+                icon=folium.Icon(color='blue', icon='road', prefix='fa')
+            ).add_to(m)
+
+    # Best route found so far by the background optimizer, and the fleet's routes (one layer per truck)
+    route = route_job.latest if route_job is not None else None
+    planned = ([route] if route and route['stops'] else []) + (fleet_routes['routes'] if fleet_routes else [])
+    if planned:
+        add_route_layers(m, route_layer_data(route_version(planned), planned))
+        folium.LayerControl(collapsed=False).add_to(m)
 
     # Display map
     st_folium(m, width=900, height=600, returned_objects=["last_object_clicked"])
@@ -215,6 +357,50 @@ with col_stats:
     medium_bins = len([b for b in bins_data if 40 <= b['fill_level'] < 80])
     empty_bins = total_bins - full_bins - medium_bins
     
+    if route_job is not None:
+        st.markdown("### 🧭 Rota Otimizada")
+        with st.container(border=True):
+            if route_job.error:
+                st.error(f"❌ Erro na otimização: {route_job.error}")
+            elif route:
+                st.metric("Distância", f"{route['total_distance_km']:.1f} km",
+                          delta=f"-{route['improvement_pct']:.1f}%" if route['improvement_pct'] else None,
+                          delta_color="inverse")
+                st.markdown(f"**🗑️ Paradas:** {route['num_stops']}")
+                st.markdown(f"**✨ Melhorias:** {route_job.improvements}")
+            if route_job.done:
+                st.success(f"✅ Otimização concluída em {route_job.elapsed:.1f}s")
+                if route and route['stops']:
+                    energy = RouteEnergyModel(route_optimizer).evaluate(route)['totals']
+                    st.markdown(f"**⛽ Combustível:** {energy['fuel_l']:.1f} L "
+                                f"({energy['fuel_saved_l']:.1f} L a menos que a rota sem otimização)")
+                    st.markdown(f"**🌿 CO₂:** {energy['co2_kg']:.1f} kg "
+                                f"({energy['co2_avoided_kg']:.1f} kg evitados)")
+                    recorded = st.session_state.get("route_energy_recorded") == id(route_job)
+                    if st.button("✅ Registrar Rota Executada", disabled=recorded, use_container_width=True):
+                        RouteEnergyModel(route_optimizer).record(db, route, kind="tour")
+                        st.session_state["route_energy_recorded"] = id(route_job)
+                        st.success("Rota registrada nos indicadores ESG")
+            else:
+                st.info(f"⏳ Otimizando... {route_job.elapsed:.0f}s de {route_job.time_budget:.0f}s")
+        st.markdown("---")
+
+    if fleet_routes:
+        st.markdown("### 🚛 Rotas da Frota")
+        with st.container(border=True):
+            st.metric("Distância Total", f"{fleet_routes['total_distance_km']:.1f} km")
+            for fleet_route in fleet_routes['routes']:
+                st.markdown(f"**{fleet_route['truck_id']}:** {fleet_route['num_stops']} paradas · "
+                            f"{fleet_route['distance_km']:.1f} km · {fleet_route['utilization_pct']:.0f}% da capacidade")
+            if fleet_routes['unassigned']:
+                st.warning(f"⚠️ {len(fleet_routes['unassigned'])} lixeiras sem caminhão disponível")
+            for event in list(dispatch.events)[-3:][::-1]:
+                if event['status'] == 'inserted':
+                    st.caption(f"➕ {event['bin_id']} → {event['truck_id']} (+{event['added_km']:.1f} km)")
+                else:
+                    st.caption(f"⚠️ {event['bin_id']} sem rota disponível")
+        st.markdown("---")
+
     st.markdown("### 📊 Resumo de Status")
     
     # Data for Pie Chart
@@ -258,17 +444,19 @@ with col_stats:
 
     st.markdown("---")
 
-    # Truck information
-    if truck_location:
-        st.markdown("### 🚛 Status do Caminhão")
-        with st.container(border=True):
-            st.markdown(f"**📍 Localização:** {truck_location['coordinates'][0]:.4f}, {truck_location['coordinates'][1]:.4f}")
-            st.markdown(f"**⛽ Combustível:** {truck_location.get('fuel_level', 78)}%")
-            st.markdown(f"**🏃 Velocidade:** {truck_location.get('speed', 25)} km/h")
-            if real_time:
-                st.success("✅ Rastreamento Ativo")
-            else:
-                st.warning("⏸️ Rastreamento Pausado")
+    # Fleet information
+    if fleet_positions:
+        st.markdown("### 🚛 Status da Frota")
+        for truck in fleet_positions.values():
+            with st.container(border=True):
+                st.markdown(f"**🚛 {truck['truck_id']}** - {truck.get('driver', 'N/A')}")
+                st.markdown(f"**📍 Localização:** {truck['coordinates'][0]:.4f}, {truck['coordinates'][1]:.4f}")
+                st.markdown(f"**⛽ Combustível:** {truck.get('fuel_level', 78):.0f}%")
+                st.markdown(f"**🏃 Velocidade:** {truck.get('speed', 25):.0f} km/h")
+        if real_time:
+            st.success("✅ Rastreamento Ativo")
+        else:
+            st.warning("⏸️ Rastreamento Pausado")
     
     st.markdown("---")
     
@@ -276,13 +464,13 @@ with col_stats:
     st.markdown("### ⚡ Atualizações Recentes")
     
     with st.container(border=True):
-        # Recent location updates
+        # Collections detected from the trucks' GPS, newest first
+        status_icons = {'confirmed': "✅", 'pending': "⏳", 'unconfirmed': "❔"}
         recent_updates = [
-            "🚛 Caminhão chegou na Rua das Flores, 123",
-            "🗑️ Lixeira #15 enchimento 85% - coleta necessária", 
-            "✅ Coleta realizada na Av. Paulista, 456",
-            "🔋 Lixeira #8 bateria em 15% - manutenção necessária",
-        ]
+            f"{status_icons.get(e['status'], '🚛')} {e['truck_id']} coletou {e['bin_name'] or e['bin_id']} "
+            f"às {e['arrived_at'][11:16]}"
+            for e in db.get_collection_events(limit=4)
+        ] or ["Nenhuma coleta detectada ainda"]
 
         for update in recent_updates:
             st.markdown(f"• {update}")
@@ -291,6 +479,12 @@ with col_stats:
 
 
 # --- Auto-refresh mechanism ---
+# Enquanto a otimização de rota roda em segundo plano, a página é redesenhada
+# a cada segundo para mostrar a melhor rota encontrada até agora.
+if route_job is not None and not route_job.done:
+    time.sleep(1)
+    st.rerun()
+
 # Removido o st.rerun() e a simulação de movimento.
 # Se o aplicativo ainda estiver atualizando, o problema pode estar no Streamlit Cloud
 # ou em um widget que está sendo atualizado constantemente.
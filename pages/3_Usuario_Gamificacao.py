@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, timedelta
+import random
 import time
 from data.database import Database
 from utils.gamification import GamificationSystem
@@ -75,8 +76,15 @@ else:
     with col_header2:
         # QR Code simulation
         if st.button("📱 Simular QR Code", use_container_width=True):
-            # Simulate QR code scan for waste disposal
-            points_earned = gamification.process_waste_disposal(current_user['user_id'])
+            # Simulate QR code scan for waste disposal at a random bin
+            bins = db.get_all_bins()
+            if bins:
+                scanned = random.choice(bins)
+                points_earned = gamification.process_waste_disposal(
+                    current_user['user_id'], scanned['waste_type'], scanned['location'],
+                    bin_id=scanned['id'], coordinates=scanned['coordinates'])
+            else:
+                points_earned = gamification.process_waste_disposal(current_user['user_id'])
             if points_earned > 0:
                 st.success(f"🎉 +{points_earned} pontos! Resíduo descartado corretamente!")
                 
@@ -64,14 +64,14 @@ with col_summary2:
     st.metric(
         "🌿 Emissões Evitadas", 
         f"{esg_data['co2_avoided']:.1f}T CO₂",
-        delta=f"+{esg_data['co2_growth']:.1f}%"
+        delta=f"{esg_data['co2_growth']:+.1f}%"
     )
 
 with col_summary3:
     st.metric(
         "⛽ Economia Combustível",
         f"{esg_data['fuel_saved']:.1f}L",
-        delta=f"+{esg_data['fuel_growth']:.1f}%"
+        delta=f"{esg_data['fuel_growth']:+.1f}%"
     )
 
 with col_summary4:
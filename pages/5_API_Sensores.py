@@ -7,6 +7,8 @@ import requests
 import plotly.express as px
 import plotly.graph_objects as go
 from data.database import Database
+from utils.notifications import NotificationManager
+from utils.scheduler import start_default_scheduler
 
 # Page config
 st.set_page_config(
@@ -20,7 +22,13 @@ st.set_page_config(
 def init_database():
     return Database()
 
+# Background jobs (simulation ticks, rollups, cleanup) run outside page reruns
+@st.cache_resource
+def init_scheduler():
+    return start_default_scheduler(init_database(), NotificationManager())
+
 db = init_database()
+scheduler = init_scheduler()
 
 st.title("📡 API de Sensores IoT - Monitoramento em Tempo Real")
 st.markdown("---")
@@ -391,6 +399,20 @@ with tab4:
     )
     st.plotly_chart(fig_errors, use_container_width=True)
     
+    # Background jobs
+    st.markdown("### ⏱️ Tarefas em Segundo Plano")
+    
+    if scheduler.is_leader:
+        st.success("✅ Este processo executa as tarefas agendadas (líder)")
+    else:
+        st.info("ℹ️ Tarefas agendadas executadas por outro processo")
+    
+    jobs_df = pd.DataFrame(scheduler.get_metrics())
+    if not jobs_df.empty:
+        jobs_df = jobs_df[['job', 'interval_seconds', 'runs', 'skipped', 'errors', 'avg_seconds', 'max_seconds', 'last_run_at']]
+        jobs_df.columns = ['Tarefa', 'Intervalo (s)', 'Execuções', 'Puladas', 'Erros', 'Tempo Médio (s)', 'Tempo Máx (s)', 'Última Execução']
+        st.dataframe(jobs_df, use_container_width=True, hide_index=True)
+    
     # Data export section
     st.markdown("---")
     col_export1, col_export2 = st.columns([2, 1])
@@ -430,11 +452,9 @@ with tab4:
                 
                 st.success("✅ Arquivo gerado com sucesso!")
 
-# Auto-refresh mechanism
+# Auto-refresh mechanism (sensor data is updated by the background scheduler)
 if auto_refresh:
     time.sleep(10)
-    # Update sensor data in background
-    db.update_sensor_data_realtime()
     st.rerun()
 
 # Footer
@@ -0,0 +1,325 @@
+import math
+import time
+from typing import Callable, Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.vrp import RoutingProblem, RoutingSolution, improve_routes, insert_node, insertion_cost, solve_cvrp
+
+# Cost (km) charged per unserved stop, so fewer unassigned stops always wins
+UNASSIGNED_PENALTY_KM = 1000.0
+
+# Operator scores: new global best, better than current, accepted though worse
+SCORE_BEST = 33.0
+SCORE_BETTER = 9.0
+SCORE_ACCEPTED = 13.0
+
+
+def solution_cost(solution: RoutingSolution) -> float:
+    return solution.total_distance() + UNASSIGNED_PENALTY_KM * len(solution.unassigned)
+
+
+def remove_nodes(solution: RoutingSolution, nodes: List[int]):
+    """Take several stops out of their routes, refreshing each touched route once"""
+    touched = set()
+    for node in nodes:
+        vehicle = int(solution.route_of[node])
+        if vehicle >= 0:
+            touched.add(vehicle)
+            solution.route_of[node] = -1
+            solution.position[node] = -1
+    for vehicle in touched:
+        solution.routes[vehicle] = [n for n in solution.routes[vehicle] if solution.route_of[n] >= 0]
+        solution.refresh(vehicle)
+    removed = set(nodes)
+    solution.unassigned = [n for n in solution.unassigned if n not in removed]
+
+
+def routed_nodes(solution: RoutingSolution) -> np.ndarray:
+    return np.array([n for route in solution.routes for n in route], dtype=np.intp)
+
+
+# --- Destroy operators: choose up to q routed stops to remove ---
+
+def random_removal(solution: RoutingSolution, q: int, rng: np.random.Generator) -> List[int]:
+    """Uniformly random stops"""
+    routed = routed_nodes(solution)
+    return [int(n) for n in rng.choice(routed, size=min(q, len(routed)), replace=False)]
+
+
+def worst_removal(solution: RoutingSolution, q: int, rng: np.random.Generator,
+                  randomness: float = 3.0) -> List[int]:
+    """Stops whose detour (distance saved by removing them) is largest, with some randomization"""
+    problem = solution.problem
+    nodes, gains = [], []
+    for vehicle, route in enumerate(solution.routes):
+        if not route:
+            continue
+        depot = problem.vehicle_depot[vehicle]
+        path = np.array([depot] + route + [depot], dtype=np.intp)
+        prev, node, nxt = path[:-2], path[1:-1], path[2:]
+        nodes.append(node)
+        gains.append(problem.dist[prev, node] + problem.dist[node, nxt] - problem.dist[prev, nxt])
+    if not nodes:
+        return []
+    nodes = np.concatenate(nodes)[np.argsort(-np.concatenate(gains))]
+    # Biased sampling: rank floor(y^p * n) favours the worst stops without always taking them
+    picks = np.unique((rng.random(min(q, len(nodes)) * 2) ** randomness * len(nodes)).astype(np.intp))
+    return [int(n) for n in nodes[picks[:q]]]
+
+
+def related_removal(solution: RoutingSolution, q: int, rng: np.random.Generator,
+                    randomness: float = 4.0) -> List[int]:
+    """A random stop and the stops closest to it (Shaw removal by distance)"""
+    problem = solution.problem
+    routed = routed_nodes(solution)
+    if not len(routed):
+        return []
+    seed = int(rng.choice(routed))
+    closeness = problem.dist[seed, routed] + problem.dist[routed, seed]
+    ranked = routed[np.argsort(closeness)]
+    picks = np.unique((rng.random(min(q, len(ranked)) * 2) ** randomness * len(ranked)).astype(np.intp))
+    return [int(n) for n in ranked[picks[:q]]]
+
+
+# --- Repair operators: put the removed (and previously unassigned) stops back ---
+
+def greedy_repair(solution: RoutingSolution, nodes: List[int], rng: np.random.Generator) -> List[int]:
+    """Cheapest feasible insertion in random order"""
+    solution.unassigned = []
+    order = list(nodes)
+    rng.shuffle(order)
+    problem = solution.problem
+    for node in order:
+        best = (np.inf, -1, -1)
+        for vehicle in range(problem.num_vehicles):
+            cost, index = insertion_cost(solution, vehicle, node)
+            if cost < best[0]:
+                best = (cost, vehicle, index)
+        if best[1] >= 0:
+            insert_node(solution, best[1], node, best[2])
+        else:
+            solution.unassigned.append(node)
+    return solution.unassigned
+
+
+def regret_repair(solution: RoutingSolution, nodes: List[int], rng: np.random.Generator,
+                  k: int = 2) -> List[int]:
+    """Insert first the stop that would lose most by waiting (regret-k), at its cheapest place
+
+    Insertion costs are kept per (stop, vehicle) and only the column of the
+    route that changed is recomputed after each insertion.
+    """
+    problem = solution.problem
+    solution.unassigned = []
+    pending = list(nodes)
+    vehicles = problem.num_vehicles
+    cost = np.full((len(pending), vehicles), np.inf)
+    index = np.full((len(pending), vehicles), -1, dtype=np.intp)
+    for i, node in enumerate(pending):
+        for vehicle in range(vehicles):
+            cost[i, vehicle], index[i, vehicle] = insertion_cost(solution, vehicle, node)
+
+    active = np.ones(len(pending), dtype=bool)
+    while active.any():
+        rows = np.flatnonzero(active)
+        ordered = np.sort(cost[rows], axis=1)
+        best = ordered[:, 0]
+        feasible = np.isfinite(best)
+        if not feasible.any():
+            solution.unassigned.extend(pending[r] for r in rows)
+            break
+        kk = min(k, vehicles)
+        regret = np.where(np.isfinite(ordered[:, 1:kk]), ordered[:, 1:kk], 1e6).sum(axis=1) - (kk - 1) * best
+        regret[~feasible] = -np.inf
+        # Ties (e.g. a single vehicle) fall back to the cheapest insertion
+        choice = rows[np.lexsort((best, -regret))[0]]
+
+        node = pending[choice]
+        vehicle = int(np.argmin(cost[choice]))
+        insert_node(solution, vehicle, node, int(index[choice, vehicle]))
+        active[choice] = False
+        for r in np.flatnonzero(active):
+            cost[r, vehicle], index[r, vehicle] = insertion_cost(solution, vehicle, pending[r])
+
+    return solution.unassigned
+
+
+DESTROY_OPERATORS: Dict[str, Callable] = {
+    'random': random_removal,
+    'worst': worst_removal,
+    'related': related_removal,
+}
+REPAIR_OPERATORS: Dict[str, Callable] = {
+    'greedy': greedy_repair,
+    'regret2': lambda s, nodes, rng: regret_repair(s, nodes, rng, k=2),
+    'regret3': lambda s, nodes, rng: regret_repair(s, nodes, rng, k=3),
+}
+
+
+class _Snapshot:
+    """Routes and unassigned stops of a solution, to restore a rejected move"""
+
+    def __init__(self, solution: RoutingSolution):
+        self.routes = [list(r) for r in solution.routes]
+        self.unassigned = list(solution.unassigned)
+
+    def restore(self, solution: RoutingSolution):
+        for node in solution.unassigned:
+            solution.route_of[node] = -1
+            solution.position[node] = -1
+        changed = [vehicle for vehicle, route in enumerate(self.routes) if route != solution.routes[vehicle]]
+        for vehicle in changed:
+            for node in solution.routes[vehicle]:
+                solution.route_of[node] = -1
+                solution.position[node] = -1
+            solution.routes[vehicle] = list(self.routes[vehicle])
+        for vehicle in changed:
+            solution.refresh(vehicle)
+        for node in self.unassigned:
+            solution.route_of[node] = -1
+            solution.position[node] = -1
+        solution.unassigned = list(self.unassigned)
+
+
+def alns(solution: RoutingSolution, time_limit: float = 30.0, max_iterations: int | None = None,
+         seed: int = 0, min_remove: int = 4, max_remove: int = 40, max_remove_fraction: float = 0.15,
+         segment: int = 50, reaction: float = 0.2, start_acceptance: float = 0.05,
+         end_temperature_ratio: float = 0.002) -> Tuple[RoutingSolution, Dict[str, Any]]:
+    """Adaptive large-neighbourhood search from an initial solution
+
+    Each iteration removes q stops with a destroy operator and reinserts them
+    (plus any unassigned stops) with a repair operator, both drawn by roulette
+    over adaptive weights. The new solution is accepted by simulated
+    annealing: the start temperature accepts, with probability 1/2, an
+    iteration that makes the rebuilt share of the routes start_acceptance
+    longer, and it decays geometrically with elapsed time. Operator weights
+    are updated from their scores every segment iterations.
+    """
+    began = time.perf_counter()
+    deadline = began + time_limit
+    rng = np.random.default_rng(seed)
+    problem = solution.problem
+
+    destroy_names = list(DESTROY_OPERATORS)
+    repair_names = list(REPAIR_OPERATORS)
+    destroy_weights = np.ones(len(destroy_names))
+    repair_weights = np.ones(len(repair_names))
+    destroy_scores = np.zeros(len(destroy_names))
+    repair_scores = np.zeros(len(repair_names))
+    destroy_uses = np.zeros(len(destroy_names))
+    repair_uses = np.zeros(len(repair_names))
+
+    current_cost = solution_cost(solution)
+    best = _Snapshot(solution)
+    best_cost = current_cost
+    initial_cost = current_cost
+    max_remove = max(min_remove, min(max_remove, int(len(problem.customers) * max_remove_fraction)))
+    # Scale the temperature to the part of the solution one iteration rebuilds
+    rebuilt_share = min(1.0, (min_remove + max_remove) / 2 / max(len(problem.customers), 1))
+    start_temperature = max(start_acceptance * solution.total_distance() * rebuilt_share, 1e-6) / math.log(2)
+    iterations = accepted = improvements = 0
+
+    while time.perf_counter() < deadline and (max_iterations is None or iterations < max_iterations):
+        iterations += 1
+        d = int(rng.choice(len(destroy_names), p=destroy_weights / destroy_weights.sum()))
+        r = int(rng.choice(len(repair_names), p=repair_weights / repair_weights.sum()))
+        q = int(rng.integers(min_remove, max_remove + 1))
+
+        snapshot = _Snapshot(solution)
+        removed = DESTROY_OPERATORS[destroy_names[d]](solution, q, rng)
+        pending = list(solution.unassigned)
+        remove_nodes(solution, removed)
+        REPAIR_OPERATORS[repair_names[r]](solution, removed + pending, rng)
+        cost = solution_cost(solution)
+
+        progress = (time.perf_counter() - began) / time_limit
+        temperature = start_temperature * end_temperature_ratio ** min(progress, 1.0)
+        score = 0.0
+        if cost < best_cost - 1e-9:
+            best, best_cost = _Snapshot(solution), cost
+            current_cost = cost
+            score = SCORE_BEST
+            improvements += 1
+        elif cost < current_cost - 1e-9:
+            current_cost = cost
+            score = SCORE_BETTER
+        elif rng.random() < math.exp(-(cost - current_cost) / temperature):
+            current_cost = cost
+            score = SCORE_ACCEPTED
+        else:
+            snapshot.restore(solution)
+        if score:
+            accepted += 1
+
+        destroy_scores[d] += score
+        repair_scores[r] += score
+        destroy_uses[d] += 1
+        repair_uses[r] += 1
+        if iterations % segment == 0:
+            used = destroy_uses > 0
+            destroy_weights[used] = ((1 - reaction) * destroy_weights[used] +
+                                     reaction * destroy_scores[used] / destroy_uses[used])
+            used = repair_uses > 0
+            repair_weights[used] = ((1 - reaction) * repair_weights[used] +
+                                    reaction * repair_scores[used] / repair_uses[used])
+            destroy_weights = np.maximum(destroy_weights, 0.05)
+            repair_weights = np.maximum(repair_weights, 0.05)
+            destroy_scores[:] = repair_scores[:] = destroy_uses[:] = repair_uses[:] = 0
+
+    best.restore(solution)
+    stats = {
+        'iterations': iterations,
+        'accepted': accepted,
+        'improvements': improvements,
+        'initial_cost': round(initial_cost, 3),
+        'best_cost': round(best_cost, 3),
+        'destroy_weights': dict(zip(destroy_names, np.round(destroy_weights, 3).tolist())),
+        'repair_weights': dict(zip(repair_names, np.round(repair_weights, 3).tolist())),
+        'seconds': round(time.perf_counter() - began, 3),
+    }
+    return solution, stats
+
+
+def solve_alns(problem: RoutingProblem, time_limit: float = 30.0, seed: int = 0,
+               initial_routes: List[List[int]] | None = None) -> Tuple[RoutingSolution, Dict[str, Any]]:
+    """Savings (or initial_routes) + local search start (a fifth of the budget), ALNS, then intra-route polishing"""
+    deadline = time.perf_counter() + time_limit
+    solution = solve_cvrp(problem, time_limit * 0.2, initial_routes)
+    solution, stats = alns(solution, max(deadline - time.perf_counter(), 0.0) * 0.95, seed=seed)
+    solution = improve_routes(solution, deadline)
+    stats['final_cost'] = round(solution_cost(solution), 3)
+    return solution, stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from utils.route_instances import generate_city_instance
+    from utils.route_optimizer import RouteOptimizer
+
+    parser = argparse.ArgumentParser(description="ALNS vs. savings + local search on generated city instances")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 2000])
+    parser.add_argument("--time-limit", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    optimizer = RouteOptimizer()
+    print(f"{'stops':>6} {'trucks':>6} {'savings_km':>11} {'t_s':>6} {'alns_km':>9} {'t_s':>6} "
+          f"{'gain_%':>7} {'iters':>6}")
+    for size in args.sizes:
+        bins, fleet = generate_city_instance(size, seed=args.seed)
+        problem = optimizer.build_routing_problem(bins, fleet)
+
+        began = time.perf_counter()
+        baseline = solve_cvrp(problem, args.time_limit)
+        baseline_time = time.perf_counter() - began
+        baseline_cost = solution_cost(baseline)
+
+        began = time.perf_counter()
+        solution, stats = solve_alns(problem, args.time_limit, seed=args.seed)
+        alns_time = time.perf_counter() - began
+        cost = solution_cost(solution)
+
+        print(f"{size:>6} {len(fleet):>6} {baseline_cost:>11.1f} {baseline_time:>6.1f} {cost:>9.1f} "
+              f"{alns_time:>6.1f} {(1 - cost / baseline_cost) * 100:>7.2f} {stats['iterations']:>6}")
@@ -0,0 +1,285 @@
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.fill_forecast import FillForecaster
+from utils.route_optimizer import DEFAULT_BIN_VOLUME_LITERS, WASTE_DENSITY_KG_PER_LITER
+from utils.sensor_simulator import BASE_FILL_RATES, PROFILE_NAMES, profile_for_bin
+from utils.spatial_index import GridIndex
+
+# Demand farther than the walking radius from every bin costs this many radii
+UNCOVERED_FACTOR = 2.0
+
+# Weight of a disposal that cannot be attributed to a bin, when no attributed one exists
+DEFAULT_DISPOSAL_KG = 1.0
+
+
+class BinPlacementAnalyzer:
+    """Proposes bins to add, move or remove from where waste is produced.
+
+    Demand points carry kg/day: each bin's fitted fill rate (FillForecaster)
+    turned into kg, spread over the disposal locations recorded at that bin
+    in user_activities, or left at the bin when it has none. Candidate sites
+    are the existing bins plus the weighted centre of the demand in every
+    candidate_spacing_m cell, so tens of thousands of sites are common.
+
+    The objective is p-median style: the kg/day-weighted walking distance to
+    the nearest bin, where demand beyond walk_radius_m counts as
+    UNCOVERED_FACTOR radii. Only site-demand pairs within the radius are
+    kept (a sparse join on a GridIndex), and every evaluation of all sites
+    is one np.bincount over those pairs. Moves (close a bin, open the best
+    site near it), removals and greedy additions are applied while they
+    change the objective by more than their threshold (in kg·m/day).
+    """
+
+    def __init__(self, db_path: str = "ecosmart.db", forecaster: FillForecaster | None = None,
+                 walk_radius_m: float = 150.0, candidate_spacing_m: float = 50.0):
+        self.db_path = db_path
+        self.forecaster = forecaster or FillForecaster(db_path)
+        self.walk_radius_m = walk_radius_m
+        self.candidate_spacing_m = candidate_spacing_m
+
+    def load_bins(self) -> List[Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, location, coordinates, waste_type, status FROM bins")
+        bins = [{'id': row[0], 'name': row[1], 'location': row[2], 'coordinates': json.loads(row[3]),
+                 'waste_type': row[4], 'status': row[5]} for row in cursor.fetchall()]
+        conn.close()
+        return bins
+
+    def load_disposals(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Disposals of the last days with their coordinates and/or bin (from user_activities metadata)"""
+        since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT metadata FROM user_activities
+            WHERE activity_type = 'waste_disposal' AND timestamp >= ?
+        """, (since,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        disposals = []
+        for (metadata,) in rows:
+            try:
+                data = json.loads(metadata) if metadata else {}
+            except ValueError:
+                continue
+            disposals.append({'coordinates': data.get('coordinates'), 'bin_id': data.get('bin_id'),
+                              'location': data.get('location')})
+        return disposals
+
+    def bin_daily_kg(self, bins: List[Dict[str, Any]]) -> np.ndarray:
+        """Waste produced per day at each bin, from its fitted (or default) fill rate"""
+        forecaster = self.forecaster
+        forecaster._ensure_fitted()
+        profile_of = {name: i for i, name in enumerate(PROFILE_NAMES)}
+        daily = np.empty(len(bins))
+        for k, bin_item in enumerate(bins):
+            i = forecaster.index.get(bin_item['id'])
+            if i is not None:
+                rate, profile = forecaster.rate[i], forecaster.profile_index[i]
+            else:
+                rate = BASE_FILL_RATES.get(bin_item.get('waste_type') or 'comum', 1.5)
+                profile = profile_of[profile_for_bin(bin_item.get('name', ''))]
+            kg_per_pct = (bin_item.get('volume_liters') or DEFAULT_BIN_VOLUME_LITERS) / 100.0 * \
+                WASTE_DENSITY_KG_PER_LITER.get(bin_item.get('waste_type') or 'comum', 0.15)
+            daily[k] = rate * forecaster.cumulative[profile, 24] * kg_per_pct
+        return daily
+
+    def demand(self, bins: List[Dict[str, Any]], disposals: List[Dict[str, Any]],
+               bin_kg: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Demand points ([lat, lon] rows) and their kg/day"""
+        index = {b['id']: k for k, b in enumerate(bins)}
+        by_text = {}
+        for k, b in enumerate(bins):
+            by_text.setdefault(b.get('name'), k)
+            by_text.setdefault(b.get('location'), k)
+
+        points, owners = [], []
+        for disposal in disposals:
+            k = index.get(disposal.get('bin_id'))
+            if k is None and disposal.get('location'):
+                k = index.get(disposal['location'], by_text.get(disposal['location']))
+            coordinates = disposal.get('coordinates') or (bins[k]['coordinates'] if k is not None else None)
+            if coordinates is None:
+                continue
+            points.append(coordinates)
+            owners.append(-1 if k is None else k)
+
+        owners = np.array(owners, dtype=np.intp)
+        attributed = owners >= 0
+        counts = np.bincount(owners[attributed], minlength=len(bins))
+        weights = np.zeros(len(owners))
+        weights[attributed] = bin_kg[owners[attributed]] / counts[owners[attributed]]
+        weights[~attributed] = float(weights[attributed].mean()) if attributed.any() else DEFAULT_DISPOSAL_KG
+
+        # Bins nobody was seen using keep their own production at the bin
+        silent = np.flatnonzero(counts == 0)
+        coordinates = np.array(points + [bins[k]['coordinates'] for k in silent], dtype=np.float64).reshape(-1, 2)
+        return coordinates, np.concatenate([weights, bin_kg[silent]])
+
+    def candidate_sites(self, demand: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Weighted centre of the demand in every candidate_spacing_m cell"""
+        grid = GridIndex(demand[:, 0], demand[:, 1], cell_m=self.candidate_spacing_m)
+        cells = np.column_stack([np.floor(grid.x / self.candidate_spacing_m),
+                                 np.floor(grid.y / self.candidate_spacing_m)]).astype(np.int64)
+        _, cell = np.unique(cells, axis=0, return_inverse=True)
+        cell = cell.ravel()
+        total = np.bincount(cell, weights=weights)
+        total = np.where(total > 0, total, 1.0)
+        lat = np.bincount(cell, weights=weights * demand[:, 0]) / total
+        lon = np.bincount(cell, weights=weights * demand[:, 1]) / total
+        return np.column_stack([lat, lon])
+
+    def analyze(self, bins: List[Dict[str, Any]] | None = None,
+                disposals: List[Dict[str, Any]] | None = None, days: int = 30,
+                max_new: int = 20, max_moves: int = 20, max_removals: int = 20,
+                min_add_gain: float = 3000.0, min_move_gain: float = 1000.0,
+                remove_max_loss: float = 500.0) -> Dict[str, Any]:
+        """Add / move / remove proposals and coverage before and after them
+
+        bins and disposals default to the database (disposals of the last
+        days). Gains and losses are in kg·m/day of weighted walking distance.
+        """
+        started = time.perf_counter()
+        bins = bins if bins is not None else self.load_bins()
+        disposals = disposals if disposals is not None else self.load_disposals(days)
+        if not bins:
+            raise ValueError("No bins to analyze")
+        bin_kg = self.bin_daily_kg(bins)
+        demand, weights = self.demand(bins, disposals, bin_kg)
+
+        existing = np.array([b['coordinates'] for b in bins], dtype=np.float64)
+        sites = np.vstack([existing, self.candidate_sites(demand, weights)])
+        num_bins, num_sites = len(bins), len(sites)
+
+        radius = self.walk_radius_m
+        penalty = UNCOVERED_FACTOR * radius
+        grid = GridIndex(demand[:, 0], demand[:, 1], cell_m=radius)
+        site_of, demand_of, dist = grid.pairs_within(sites[:, 0], sites[:, 1], radius)
+        by_demand = np.lexsort((dist, demand_of))
+        site_x, site_y = grid.project(sites[:, 0], sites[:, 1])
+
+        def nearest_two(open_sites: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+            """Distance to the nearest and second nearest open site (capped at penalty) and the nearest"""
+            d1, d2 = np.full(len(weights), penalty), np.full(len(weights), penalty)
+            owner = np.full(len(weights), -1, dtype=np.intp)
+            entries = by_demand[open_sites[site_of[by_demand]]]
+            if len(entries):
+                dem = demand_of[entries]
+                first = np.r_[True, dem[1:] != dem[:-1]]
+                second = np.r_[False, first[:-1] & ~first[1:]]
+                d1[dem[first]] = dist[entries[first]]
+                owner[dem[first]] = site_of[entries[first]]
+                d2[dem[second]] = dist[entries[second]]
+            return d1, d2, owner
+
+        def gains(d1: np.ndarray) -> np.ndarray:
+            """Objective decrease from opening each site"""
+            saved = weights[demand_of] * np.maximum(d1[demand_of] - dist, 0.0)
+            return np.bincount(site_of, weights=saved, minlength=num_sites)
+
+        def removal_loss(d1: np.ndarray, d2: np.ndarray, owner: np.ndarray) -> np.ndarray:
+            """Objective increase from closing each open site"""
+            served = owner >= 0
+            return np.bincount(owner[served], weights=(weights * (d2 - d1))[served], minlength=num_sites)
+
+        def coverage(d1: np.ndarray) -> Dict[str, float]:
+            covered = d1 < penalty
+            total = float(weights.sum()) or 1.0
+            return {'coverage_pct': round(float(weights[covered].sum()) / total * 100.0, 2),
+                    'avg_walk_m': round(float((weights * d1)[covered].sum()) / max(float(weights[covered].sum()),
+                                                                                  1e-9), 1),
+                    'objective': round(float((weights * d1).sum()), 1)}
+
+        is_open = np.zeros(num_sites, dtype=bool)
+        is_open[:num_bins] = True
+        d1, d2, owner = nearest_two(is_open)
+        before = coverage(d1)
+
+        # Moves: relocate the least useful bins to the best site within the walking radius
+        moves, moved = [], np.zeros(num_bins, dtype=bool)
+        loss = removal_loss(d1, d2, owner)
+        for b in np.argsort(loss[:num_bins], kind='stable')[:3 * max_moves]:
+            if len(moves) >= max_moves:
+                break
+            is_open[b] = False
+            d1_closed, d2_closed, owner_closed = nearest_two(is_open)
+            closed_loss = float((weights * d1_closed).sum() - (weights * d1).sum())
+            site_gain = gains(d1_closed)
+            near = np.hypot(site_x - site_x[b], site_y - site_y[b]) <= radius
+            near[:num_bins] = False
+            site_gain[~near | is_open] = -np.inf
+            best = int(np.argmax(site_gain))
+            if np.isfinite(site_gain[best]) and site_gain[best] - closed_loss > min_move_gain:
+                is_open[best] = True
+                moved[b] = True
+                moves.append({'bin_id': bins[b]['id'], 'from': bins[b]['coordinates'],
+                              'to': [round(float(sites[best, 0]), 6), round(float(sites[best, 1]), 6)],
+                              'distance_m': round(float(np.hypot(site_x[best] - site_x[b], site_y[best] - site_y[b])), 1),
+                              'gain_kg_m_day': round(float(site_gain[best] - closed_loss), 1)})
+                d1, d2, owner = nearest_two(is_open)
+            else:
+                is_open[b] = True
+
+        # Removals: bins whose demand is served almost as well by their neighbours
+        removals = []
+        while len(removals) < max_removals:
+            loss = removal_loss(d1, d2, owner)[:num_bins]
+            loss[~is_open[:num_bins] | moved] = np.inf
+            b = int(np.argmin(loss))
+            if loss[b] > remove_max_loss:
+                break
+            is_open[b] = False
+            removals.append({'bin_id': bins[b]['id'], 'coordinates': bins[b]['coordinates'],
+                             'loss_kg_m_day': round(float(loss[b]), 1), 'fill_kg_day': round(float(bin_kg[b]), 1)})
+            d1, d2, owner = nearest_two(is_open)
+
+        # Additions: greedy, best objective decrease first
+        additions = []
+        by_site = np.argsort(site_of, kind='stable')
+        site_start = np.searchsorted(site_of[by_site], np.arange(num_sites + 1))
+        for _ in range(max_new):
+            site_gain = gains(d1)
+            site_gain[is_open] = -np.inf
+            best = int(np.argmax(site_gain))
+            if not np.isfinite(site_gain[best]) or site_gain[best] < min_add_gain:
+                break
+            entries = by_site[site_start[best]:site_start[best + 1]]
+            newly = entries[d1[demand_of[entries]] >= penalty]
+            is_open[best] = True
+            np.minimum.at(d1, demand_of[entries], dist[entries])
+            nearest_m = float(np.hypot(site_x[:num_bins] - site_x[best], site_y[:num_bins] - site_y[best]).min())
+            additions.append({'coordinates': [round(float(sites[best, 0]), 6), round(float(sites[best, 1]), 6)],
+                              'gain_kg_m_day': round(float(site_gain[best]), 1),
+                              'new_demand_kg_day': round(float(weights[demand_of[newly]].sum()), 1),
+                              'nearest_bin_m': round(nearest_m, 1)})
+
+        after = coverage(d1)
+        return {
+            'add': additions,
+            'move': moves,
+            'remove': removals,
+            'summary': {
+                'bins': num_bins,
+                'disposals': len(disposals),
+                'demand_points': int(len(weights)),
+                'demand_kg_day': round(float(weights.sum()), 1),
+                'candidate_sites': num_sites - num_bins,
+                'pairs': int(len(dist)),
+                'walk_radius_m': radius,
+                'coverage_before_pct': before['coverage_pct'],
+                'coverage_after_pct': after['coverage_pct'],
+                'avg_walk_m_before': before['avg_walk_m'],
+                'avg_walk_m_after': after['avg_walk_m'],
+                'objective_before': before['objective'],
+                'objective_after': after['objective'],
+                'seconds': round(time.perf_counter() - started, 3),
+            },
+        }
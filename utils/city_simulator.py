@@ -0,0 +1,283 @@
+import argparse
+import heapq
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.energy_model import RouteEnergyModel
+from utils.route_instances import generate_city_instance
+from utils.route_optimizer import (RouteOptimizer, DEFAULT_DEPOT, DEFAULT_BIN_VOLUME_LITERS, WASTE_DENSITY_KG_PER_LITER,
+                                   format_clock, parse_clock)
+from utils.sensor_simulator import BASE_FILL_RATES, SensorSimulator, profile_for_bin
+
+# Shifts above this many due bins are routed with district decomposition
+CITY_ROUTING_BINS = 600
+
+# Operating costs (BRL)
+DIESEL_PRICE_PER_L = 6.0
+CREW_COST_PER_HOUR = 120.0      # driver and two collectors
+TRUCK_COST_PER_DAY = 450.0      # lease/depreciation and maintenance of every truck in the fleet
+
+DEFAULT_SCENARIO = {
+    'name': None,
+    'bins': 1000,
+    'trucks': 4,
+    'shifts_per_day': 1,
+    'first_shift': "06:00",
+    'shift_hours': 8.0,
+    'capacity_kg': 8000.0,
+    'fill_threshold': 80,
+    'days': 14,
+    'tick_minutes': 60.0,
+    'route_time_limit': 2.0,
+    'seed': 0,
+}
+
+
+class CitySimulator:
+    """Discrete-event simulation of a city's bins and collection fleet.
+
+    Fill dynamics come from a SensorSimulator over the scenario's bins,
+    advanced between events in steps of at most tick_minutes. Events sit in
+    a heap keyed by simulated time: each shift start routes the bins at the
+    fill threshold with the RouteOptimizer (decomposed by districts for
+    large shifts), and every stop becomes a collection event at its planned
+    arrival time that empties the bin. Bins at 100% count as overflowing for
+    as long as they stay full. Fuel comes from the RouteEnergyModel and cost
+    from fuel, crew hours and truck days. Time is simulated, so weeks run in
+    seconds.
+    """
+
+    def __init__(self, scenario: Dict[str, Any] | None = None, start_date: datetime | None = None):
+        self.scenario = dict(DEFAULT_SCENARIO, **(scenario or {}))
+        s = self.scenario
+        self.bins, _ = generate_city_instance(s['bins'], num_trucks=1, seed=s['seed'], min_fill=0.0)
+        self.fleet_template = [{
+            'truck_id': f"TRUCK_{k + 1:03d}",
+            'driver': None,
+            'capacity_kg': s['capacity_kg'],
+            'depot': list(DEFAULT_DEPOT),
+            'shift_hours': s['shift_hours'],
+        } for k in range(s['trucks'])]
+
+        self.optimizer = RouteOptimizer(fill_threshold=s['fill_threshold'])
+        self.energy = RouteEnergyModel(self.optimizer)
+        self.sensors = SensorSimulator(
+            sensor_ids=[b['id'] for b in self.bins],
+            bin_ids=[b['id'] for b in self.bins],
+            profiles=[profile_for_bin(b['name']) for b in self.bins],
+            base_rates=np.array([BASE_FILL_RATES.get(b['waste_type'], 1.5) for b in self.bins]),
+            fill=np.array([b['fill_level'] for b in self.bins]),
+            report_interval=1e12,
+            seed=s['seed'],
+        )
+        start = start_date or datetime.now()
+        self.start = datetime(start.year, start.month, start.day)
+        self.sensors.clock = self.start
+        self.index = {b['id']: i for i, b in enumerate(self.bins)}
+        self.kg_per_pct = np.array([(b.get('volume_liters') or DEFAULT_BIN_VOLUME_LITERS) / 100.0 *
+                                    WASTE_DENSITY_KG_PER_LITER.get(b['waste_type'], 0.15) for b in self.bins])
+
+        self.now = 0.0  # simulated hours since start
+        self.events: list = []
+        self._sequence = itertools.count()
+        self.full = self.sensors.fill >= 100.0
+        self.pending = np.zeros(len(self.bins), dtype=bool)
+        self.totals = {'full_bin_hours': 0.0, 'overflow_events': 0, 'collections': 0, 'collected_kg': 0.0,
+                       'dispatches': 0, 'unassigned_stops': 0, 'distance_km': 0.0, 'fuel_l': 0.0, 'co2_kg': 0.0,
+                       'crew_hours': 0.0, 'route_seconds': 0.0}
+
+    def schedule(self, at_hours: float, kind: str, payload: Any = None):
+        heapq.heappush(self.events, (at_hours, next(self._sequence), kind, payload))
+
+    def advance(self, to_hours: float):
+        """Step the fill dynamics up to a time, accounting for bins that are full"""
+        step = self.scenario['tick_minutes'] / 60.0
+        while self.now < to_hours - 1e-9:
+            dt = min(step, to_hours - self.now)
+            self.sensors.step(dt * 3600.0)
+            full = self.sensors.fill >= 100.0
+            self.totals['overflow_events'] += int(np.count_nonzero(full & ~self.full))
+            self.totals['full_bin_hours'] += float(np.count_nonzero(full)) * dt
+            self.full = full
+            self.now += dt
+
+    def shift_starts(self) -> List[float]:
+        """Start of each shift, in hours after midnight"""
+        first = parse_clock(self.scenario['first_shift']) / 60.0
+        return [first + k * 24.0 / self.scenario['shifts_per_day'] for k in range(self.scenario['shifts_per_day'])]
+
+    def dispatch(self, shift_start: float):
+        """Route the due bins for a shift and schedule their collection events"""
+        s = self.scenario
+        day = np.floor(shift_start / 24.0) * 24.0
+        fleet = [dict(truck, shift_start=format_clock((shift_start - day) * 60.0),
+                      shift_hours=min(s['shift_hours'], 24.0 / s['shifts_per_day'])) for truck in self.fleet_template]
+        candidates = np.flatnonzero(~self.pending & (self.sensors.fill >= s['fill_threshold']))
+        bins = [dict(self.bins[i], fill_level=round(float(self.sensors.fill[i]), 1)) for i in candidates]
+        if not bins:
+            return
+
+        began = time.perf_counter()
+        if len(bins) > CITY_ROUTING_BINS:
+            result = self.optimizer.calculate_city_routes(bins, fleet, fill_threshold=0, workers=1,
+                                                          time_limit=s['route_time_limit'])
+        else:
+            result = self.optimizer.calculate_fleet_routes(bins, fleet, fill_threshold=0,
+                                                           time_limit=s['route_time_limit'])
+        self.totals['route_seconds'] += time.perf_counter() - began
+        self.totals['dispatches'] += 1
+        self.totals['unassigned_stops'] += len(result['unassigned'])
+
+        for route in result['routes']:
+            if not route['stops']:
+                continue
+            for stop in route['stops']:
+                i = self.index[stop['id']]
+                self.pending[i] = True
+                self.schedule(day + parse_clock(stop['arrival_time']) / 60.0, 'collect', i)
+            self._account_route(route)
+
+    def _account_route(self, route: Dict[str, Any]):
+        """Distance, fuel and crew time of one truck's shift"""
+        trips = route.get('trips') or [route]
+        for trip in trips:
+            energy = self.energy.sequence_energy(route['depot'], trip['stops'], 0.0, trip.get('unloads'))
+            self.totals['distance_km'] += energy['distance_km']
+            self.totals['fuel_l'] += energy['fuel_l']
+            self.totals['co2_kg'] += energy['co2_kg']
+        if route.get('return_time'):
+            self.totals['crew_hours'] += (parse_clock(route['return_time']) - parse_clock(route['shift_start'])) / 60.0
+
+    def collect(self, i: int):
+        self.totals['collections'] += 1
+        self.totals['collected_kg'] += float(self.sensors.fill[i] * self.kg_per_pct[i])
+        self.sensors.empty_bins([i])
+        self.full[i] = False
+        self.pending[i] = False
+
+    def run(self) -> Dict[str, Any]:
+        """Simulate the scenario's days and report service level, distance and cost"""
+        wall_start = time.perf_counter()
+        horizon = self.scenario['days'] * 24.0
+        for day in range(self.scenario['days']):
+            for start in self.shift_starts():
+                self.schedule(day * 24.0 + start, 'dispatch', day * 24.0 + start)
+        self.schedule(horizon, 'end')
+
+        while self.events:
+            at, _, kind, payload = heapq.heappop(self.events)
+            if at > horizon:
+                break
+            self.advance(at)
+            if kind == 'dispatch':
+                self.dispatch(payload)
+            elif kind == 'collect':
+                self.collect(payload)
+            elif kind == 'end':
+                break
+
+        return self.report(time.perf_counter() - wall_start)
+
+    def report(self, wall_seconds: float) -> Dict[str, Any]:
+        s, t = self.scenario, self.totals
+        days = s['days']
+        fuel_cost = t['fuel_l'] * DIESEL_PRICE_PER_L
+        crew_cost = t['crew_hours'] * CREW_COST_PER_HOUR
+        truck_cost = s['trucks'] * days * TRUCK_COST_PER_DAY
+        bin_hours = len(self.bins) * self.now
+        return {
+            'name': s['name'] or f"{s['bins']}b_{s['trucks']}t_{s['shifts_per_day']}s",
+            'bins': s['bins'],
+            'trucks': s['trucks'],
+            'shifts_per_day': s['shifts_per_day'],
+            'days': days,
+            'overflow_rate_pct': round(float(t['full_bin_hours'] / bin_hours * 100.0), 3) if bin_hours else 0.0,
+            'overflow_events': t['overflow_events'],
+            'collections': t['collections'],
+            'collected_t': round(t['collected_kg'] / 1000.0, 2),
+            'unassigned_stops': t['unassigned_stops'],
+            'distance_km': round(t['distance_km'], 1),
+            'km_per_day': round(t['distance_km'] / days, 1),
+            'fuel_l': round(t['fuel_l'], 1),
+            'co2_kg': round(t['co2_kg'], 1),
+            'crew_hours': round(t['crew_hours'], 1),
+            'cost_brl': round(fuel_cost + crew_cost + truck_cost, 2),
+            'cost_per_tonne_brl': round((fuel_cost + crew_cost + truck_cost) / (t['collected_kg'] / 1000.0), 2)
+            if t['collected_kg'] else None,
+            'route_seconds': round(t['route_seconds'], 2),
+            'wall_seconds': round(wall_seconds, 2),
+        }
+
+
+def simulate(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scenario (process pool worker)"""
+    return CitySimulator(scenario).run()
+
+
+def run_scenarios(scenarios: List[Dict[str, Any]], workers: int | None = None) -> List[Dict[str, Any]]:
+    """Run scenarios in parallel processes, in the given order"""
+    if workers == 1 or len(scenarios) <= 1:
+        return [simulate(scenario) for scenario in scenarios]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(simulate, scenarios))
+
+
+def capacity_plan(bin_counts: List[int], truck_counts: List[int], shifts: List[int] | None = None,
+                  target_overflow_pct: float = 5.0, workers: int | None = None,
+                  **scenario) -> Dict[str, Any]:
+    """Simulate every (bins, trucks, shifts) combination and pick the cheapest that meets the target
+
+    scenario holds the other DEFAULT_SCENARIO settings, shared by all runs.
+    For each bin count, the recommendation is the lowest-cost configuration
+    whose overflow rate is at most target_overflow_pct (None if none does).
+    """
+    shifts = shifts or [1]
+    grid = [dict(scenario, bins=b, trucks=k, shifts_per_day=s)
+            for b in bin_counts for k in truck_counts for s in shifts]
+    results = run_scenarios(grid, workers)
+
+    recommended = {}
+    for b in bin_counts:
+        meeting = [r for r in results if r['bins'] == b and r['overflow_rate_pct'] <= target_overflow_pct]
+        recommended[b] = min(meeting, key=lambda r: r['cost_brl']) if meeting else None
+    return {'results': results, 'recommended': recommended}
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Simulate EcoSmart collection to size the fleet")
+    parser.add_argument("--bins", nargs="*", type=int, default=[1000, 2000])
+    parser.add_argument("--trucks", nargs="*", type=int, default=[2, 4, 6])
+    parser.add_argument("--shifts", nargs="*", type=int, default=[1, 2])
+    parser.add_argument("--days", type=int, default=DEFAULT_SCENARIO['days'])
+    parser.add_argument("--fill-threshold", type=int, default=DEFAULT_SCENARIO['fill_threshold'])
+    parser.add_argument("--target-overflow", type=float, default=5.0, help="max %% of bin-hours at 100%%")
+    parser.add_argument("--route-time-limit", type=float, default=DEFAULT_SCENARIO['route_time_limit'])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    plan = capacity_plan(args.bins, args.trucks, args.shifts, args.target_overflow, args.workers,
+                         days=args.days, fill_threshold=args.fill_threshold,
+                         route_time_limit=args.route_time_limit, seed=args.seed)
+
+    print(f"{'scenario':<16} {'overflow_%':>10} {'km/day':>9} {'fuel_L':>9} {'cost_BRL':>11} {'BRL/t':>8} {'sec':>7}")
+    for r in plan['results']:
+        per_tonne = f"{r['cost_per_tonne_brl']:.0f}" if r['cost_per_tonne_brl'] is not None else "-"
+        print(f"{r['name']:<16} {r['overflow_rate_pct']:>10.2f} {r['km_per_day']:>9.1f} {r['fuel_l']:>9.1f} "
+              f"{r['cost_brl']:>11.0f} {per_tonne:>8} {r['wall_seconds']:>7.1f}")
+    print()
+    for bins, best in plan['recommended'].items():
+        if best is None:
+            print(f"{bins} lixeiras: nenhuma configuração atinge {args.target_overflow}% de transbordo")
+        else:
+            print(f"{bins} lixeiras: {best['trucks']} caminhões, {best['shifts_per_day']} turno(s)/dia "
+                  f"(R$ {best['cost_brl']:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.fill_forecast import COLLECTION_DROP
+from utils.route_optimizer import DEFAULT_BIN_VOLUME_LITERS, WASTE_DENSITY_KG_PER_LITER
+from utils.spatial_index import GridIndex
+
+
+class CollectionDetector:
+    """Detects bin collections from the truck GPS stream.
+
+    Registered as a position listener, it matches every batch of fixes to
+    the nearest bin within radius_m at once (GridIndex.pairs_within, a
+    binary search per grid cell). A truck that stays near the same bin at
+    walking speed for min_dwell_s is servicing it: the collection is
+    written immediately as pending, and confirmed when a sensor reading
+    within confirm_window_s shows the fill level fell by COLLECTION_DROP
+    points (unconfirmed otherwise). With a DispatchManager, detected stops
+    are also completed on the live routes.
+    """
+
+    def __init__(self, db, radius_m: float = 30.0, min_dwell_s: float = 20.0, max_speed_kmh: float = 5.0,
+                 max_gap_s: float = 120.0, confirm_window_s: float = 1800.0, revisit_s: float = 1800.0,
+                 dispatch=None):
+        self.db = db
+        self.radius_m = radius_m
+        self.min_dwell_s = min_dwell_s
+        self.max_speed_kmh = max_speed_kmh
+        self.max_gap_s = max_gap_s
+        self.confirm_window_s = confirm_window_s
+        self.revisit_s = revisit_s
+        self.dispatch = dispatch
+
+        self._lock = threading.Lock()
+        self._visits: Dict[str, Dict[str, Any]] = {}
+        self._last_collected: Dict[str, float] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._drops: Dict[str, tuple] = {}
+        self.stats = {'fixes': 0, 'matched': 0, 'detected': 0, 'confirmed': 0, 'unconfirmed': 0}
+        self.refresh_bins()
+
+    def refresh_bins(self):
+        """Rebuild the spatial index from the bins table"""
+        bins = self.db.get_all_bins()
+        coordinates = np.array([b['coordinates'] for b in bins], dtype=np.float64).reshape(-1, 2)
+        with self._lock:
+            self.bins = bins
+            self.fill = {b['id']: float(b['fill_level'] or 0) for b in bins}
+            self.index = GridIndex(coordinates[:, 0], coordinates[:, 1], cell_m=max(self.radius_m, 25.0))
+
+    def attach(self, db=None):
+        """Receive truck positions and sensor readings from a Database"""
+        db = db or self.db
+        db.add_position_listener(self.on_positions)
+        db.add_reading_listener(self.on_readings)
+
+    def match(self, lat: np.ndarray, lon: np.ndarray) -> tuple:
+        """Nearest bin index within radius_m (-1 if none) and its distance, for every fix"""
+        nearest = np.full(len(lat), -1, dtype=np.intp)
+        distance = np.full(len(lat), np.inf)
+        if not len(self.index) or not len(lat):
+            return nearest, distance
+        fix, bin_index, dist = self.index.pairs_within(lat, lon, self.radius_m)
+        # Closest pair per fix: sort by (fix, distance) and keep each fix's first
+        order = np.lexsort((dist, fix))
+        fix, bin_index, dist = fix[order], bin_index[order], dist[order]
+        first = np.r_[True, fix[1:] != fix[:-1]] if len(fix) else np.zeros(0, dtype=bool)
+        nearest[fix[first]] = bin_index[first]
+        distance[fix[first]] = dist[first]
+        return nearest, distance
+
+    def on_positions(self, rows: List[tuple]) -> List[Dict[str, Any]]:
+        """Position listener: rows are (truck_id, recorded_at, lat, lon, speed, fuel_level, heading)"""
+        if not rows:
+            return []
+        rows = sorted(rows, key=lambda r: (r[0], r[1]))
+        with self._lock:
+            nearest, distance = self.match(np.array([r[2] for r in rows], dtype=np.float64),
+                                           np.array([r[3] for r in rows], dtype=np.float64))
+            detected = []
+            for row, b, dist in zip(rows, nearest, distance):
+                event = self._step(row, int(b), float(dist))
+                if event is not None:
+                    detected.append(event)
+            self.stats['fixes'] += len(rows)
+            self.stats['matched'] += int(np.count_nonzero(nearest >= 0))
+
+        if detected:
+            ids = self.db.record_detected_collections(detected)
+            confirmed = []
+            with self._lock:
+                for event, event_id in zip(detected, ids):
+                    event['event_id'] = event_id
+                    if event['confirmed_by'] is not None:
+                        confirmed.append((event_id,) + event['confirmed_by'])
+                    else:
+                        self._pending.setdefault(event['bin_id'], []).append(event)
+                self.stats['confirmed'] += len(confirmed)
+            if confirmed:
+                self.db.resolve_detected_collections(confirmed, [])
+            if self.dispatch is not None:
+                for event in detected:
+                    self.dispatch.complete_stop(event['bin_id'])
+        return detected
+
+    def _step(self, row: tuple, b: int, dist: float) -> Dict[str, Any] | None:
+        """Advance one truck's visit state by one fix; returns a collection when the dwell completes"""
+        truck_id, recorded_at, speed = row[0], row[1], row[4] or 0.0
+        at = datetime.fromisoformat(recorded_at).timestamp()
+        visit = self._visits.get(truck_id)
+        stopped = b >= 0 and speed <= self.max_speed_kmh
+
+        if visit is not None and (not stopped or visit['bin'] != b or at - visit['last'] > self.max_gap_s):
+            del self._visits[truck_id]
+            visit = None
+        if not stopped:
+            return None
+        if visit is None:
+            self._visits[truck_id] = {'bin': b, 'start': at, 'arrived_at': recorded_at, 'last': at,
+                                      'distance': dist, 'recorded': False}
+            return None
+
+        visit['last'] = at
+        visit['distance'] = min(visit['distance'], dist)
+        if visit['recorded'] or at - visit['start'] < self.min_dwell_s:
+            return None
+
+        bin_item = self.bins[b]
+        visit['recorded'] = True
+        if at - self._last_collected.get(bin_item['id'], -np.inf) < self.revisit_s:
+            return None
+        self._last_collected[bin_item['id']] = at
+        self.stats['detected'] += 1
+
+        fill_before = self.fill.get(bin_item['id'], 0.0)
+        # The sensor may report the drop while the truck is still there
+        drop = self._drops.pop(bin_item['id'], None)
+        confirmed_by = None
+        if drop is not None and drop[0] >= visit['start'] - self.max_gap_s:
+            fill_before, confirmed_by = drop[1], (drop[2], drop[3])
+        kg_per_pct = DEFAULT_BIN_VOLUME_LITERS / 100.0 * WASTE_DENSITY_KG_PER_LITER.get(bin_item['waste_type'], 0.15)
+        return {
+            'bin_id': bin_item['id'],
+            'truck_id': truck_id,
+            'arrived_at': visit['arrived_at'],
+            'detected_at': at,
+            'dwell_seconds': at - visit['start'],
+            'distance_m': visit['distance'],
+            'fill_before': fill_before,
+            'amount_kg': fill_before * kg_per_pct,
+            'location': bin_item['location'],
+            'waste_type': bin_item['waste_type'],
+            'confirmed_by': confirmed_by,
+        }
+
+    def on_readings(self, rows: List[tuple]):
+        """Reading listener: confirm pending collections whose bin reports a fill-level drop"""
+        confirmed, expired = [], []
+        with self._lock:
+            for row in rows:
+                bin_id, recorded_at, fill_level = row[1], row[2], float(row[3])
+                at = datetime.fromisoformat(recorded_at).timestamp()
+                pending = self._pending.get(bin_id)
+                if pending:
+                    for event in list(pending):
+                        if at < event['detected_at'] - self.max_gap_s:
+                            continue
+                        if at - event['detected_at'] > self.confirm_window_s:
+                            pending.remove(event)
+                            expired.append(event['event_id'])
+                        elif fill_level <= event['fill_before'] - COLLECTION_DROP:
+                            pending.remove(event)
+                            confirmed.append((event['event_id'], fill_level, recorded_at))
+                    if not pending:
+                        del self._pending[bin_id]
+                if bin_id in self.fill:
+                    if not pending and fill_level <= self.fill[bin_id] - COLLECTION_DROP:
+                        self._drops[bin_id] = (at, self.fill[bin_id], fill_level, recorded_at)
+                    self.fill[bin_id] = fill_level
+            self.stats['confirmed'] += len(confirmed)
+            self.stats['unconfirmed'] += len(expired)
+
+        if confirmed or expired:
+            self.db.resolve_detected_collections(confirmed, expired)
+
+    def expire(self, now: datetime | None = None) -> int:
+        """Mark detections with no confirming reading within confirm_window_s as unconfirmed"""
+        at = (now or datetime.now()).timestamp()
+        expired = []
+        with self._lock:
+            for bin_id in list(self._pending):
+                for event in list(self._pending[bin_id]):
+                    if at - event['detected_at'] > self.confirm_window_s:
+                        self._pending[bin_id].remove(event)
+                        expired.append(event['event_id'])
+                if not self._pending[bin_id]:
+                    del self._pending[bin_id]
+            self.stats['unconfirmed'] += len(expired)
+        if expired:
+            self.db.resolve_detected_collections([], expired)
+        return len(expired)
@@ -0,0 +1,205 @@
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.decomposition import DEFAULT_DISTRICT_SIZE, project_km
+from utils.fill_forecast import FillForecaster, to_hours
+from utils.route_optimizer import (RouteOptimizer, DEFAULT_SHIFT_HOURS, DEFAULT_SHIFT_START, WASTE_DENSITY_KG_PER_LITER,
+                                   DEFAULT_BIN_VOLUME_LITERS, parse_clock)
+from utils.sensor_simulator import BASE_FILL_RATES, PROFILE_NAMES, profile_for_bin
+
+# Days solved with district decomposition instead of a single fleet solve above this many bins
+CITY_ROUTING_BINS = 600
+
+
+class CollectionPlanner:
+    """Chooses the collection day of every bin over a multi-day horizon.
+
+    Each day, a bin must be collected if its forecast level at the next
+    day's service time would reach overflow_level. Zones (grid cells of
+    zone_km) with no such bin are skipped that day; in zones the trucks do
+    visit, bins at min_fill that would be mandatory tomorrow are collected
+    as well, fullest first, while the day's fleet capacity lasts. If tomorrow's mandatory load would
+    not fit the fleet, the fullest of those bins are pulled forward to
+    today. Levels restart from empty after a planned collection, so a bin
+    can be visited several times in the horizon. Days are then routed with
+    the RouteOptimizer.
+    """
+
+    def __init__(self, optimizer: RouteOptimizer, forecaster: FillForecaster | None = None,
+                 horizon_days: int = 7, overflow_level: float = 100.0, min_fill: float = 50.0,
+                 zone_km: float = 2.0):
+        self.optimizer = optimizer
+        self.forecaster = forecaster or optimizer.forecaster or FillForecaster(optimizer.db_path)
+        self.horizon_days = horizon_days
+        self.overflow_level = overflow_level
+        self.min_fill = min_fill
+        self.zone_km = zone_km
+
+    def service_times(self, fleet: List[Dict[str, Any]], start_date: datetime) -> List[datetime]:
+        """Mid-shift time of each day in the horizon (plus the day after, for deadlines)"""
+        shift_start = min(parse_clock(t.get('shift_start', DEFAULT_SHIFT_START)) for t in fleet)
+        shift_hours = max(t.get('shift_hours', DEFAULT_SHIFT_HOURS) for t in fleet)
+        first = datetime(start_date.year, start_date.month, start_date.day) + \
+            timedelta(minutes=shift_start + shift_hours * 30.0)
+        return [first + timedelta(days=d) for d in range(self.horizon_days + 1)]
+
+    def _bin_arrays(self, bins: List[Dict[str, Any]], now: datetime) -> Dict[str, np.ndarray]:
+        """Fill model (level, observation time, rate, profile) and load per % of every bin"""
+        forecaster = self.forecaster
+        forecaster._ensure_fitted()
+        profile_of = {name: i for i, name in enumerate(PROFILE_NAMES)}
+        n = len(bins)
+        level, observed, rate = np.empty(n), np.empty(n), np.empty(n)
+        profile = np.empty(n, dtype=np.intp)
+        kg_per_pct = np.empty(n)
+        for k, bin_item in enumerate(bins):
+            i = forecaster.index.get(bin_item['id'])
+            if i is not None:
+                level[k], observed[k] = forecaster.level[i], forecaster.observed_at[i]
+                rate[k], profile[k] = forecaster.rate[i], forecaster.profile_index[i]
+            else:
+                level[k], observed[k] = bin_item.get('fill_level', 0), to_hours(now)
+                rate[k] = BASE_FILL_RATES.get(bin_item.get('waste_type', 'comum'), 1.5)
+                profile[k] = profile_of[profile_for_bin(bin_item.get('name', ''))]
+            volume = bin_item.get('volume_liters') or DEFAULT_BIN_VOLUME_LITERS
+            kg_per_pct[k] = volume / 100.0 * WASTE_DENSITY_KG_PER_LITER.get(bin_item.get('waste_type', 'comum'), 0.15)
+        return {'level': level, 'observed': observed, 'rate': rate, 'profile': profile, 'kg_per_pct': kg_per_pct}
+
+    def plan(self, bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]] | None = None,
+             start_date: datetime | None = None, route: bool = True,
+             time_limit: float | None = None, method: str = "savings") -> Dict[str, Any]:
+        """Collection days for bins over the horizon, each day routed unless route=False
+
+        time_limit is the routing budget of the whole horizon (split evenly
+        across days, and across districts on days routed by decomposition). Returns the days (date, bins with their predicted
+        level, load and routes), bins that will overflow despite the plan,
+        and visit counts against collecting every bin daily at the optimizer's
+        fill threshold.
+        """
+        start = time.perf_counter()
+        fleet = fleet if fleet is not None else self.optimizer.load_fleet()
+        if not fleet:
+            raise ValueError("Fleet definition is empty")
+        now = datetime.now()
+        start_date = start_date or now
+        times = self.service_times(fleet, start_date)
+        hours = np.array([to_hours(t) for t in times])
+
+        model = self._bin_arrays(bins, now)
+        n = len(bins)
+        profile, rate, kg_per_pct = model['profile'], model['rate'], model['kg_per_pct']
+        # Profile integral at every service time: (bins x days + 1)
+        weighted = np.column_stack([self.forecaster.profile_hours(profile, np.full(n, h)) for h in hours])
+        base_level = model['level'].copy()
+        base_weight = self.forecaster.profile_hours(profile, model['observed'])
+
+        zones = np.zeros(n, dtype=np.intp)
+        if n:
+            xy = project_km(np.array([b['coordinates'] for b in bins], dtype=np.float64))
+            cells = np.floor((xy - xy.min(axis=0)) / self.zone_km).astype(np.int64)
+            zones = np.unique(cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1], return_inverse=True)[1]
+        num_zones = int(zones.max()) + 1 if n else 0
+
+        capacity = float(sum(t.get('capacity_kg', 8000) for t in fleet))
+        days, overflows = [], []
+        daily_threshold_visits = daily_threshold_overflows = 0
+        threshold_level = model['level'].copy()
+        threshold_weight = base_weight.copy()
+
+        for d in range(self.horizon_days):
+            level_today = np.minimum(base_level + rate * np.maximum(weighted[:, d] - base_weight, 0.0), 100.0)
+            level_next = base_level + rate * np.maximum(weighted[:, d + 1] - base_weight, 0.0)
+            overflowing = level_today >= self.overflow_level
+            must = level_next >= self.overflow_level
+            chosen = must.copy()
+
+            # Bins that will be mandatory tomorrow
+            level_after = base_level + rate * np.maximum(weighted[:, min(d + 2, self.horizon_days)] - base_weight, 0.0)
+            tomorrow = ~must & (level_after >= self.overflow_level)
+
+            # Tomorrow's mandatory load that would not fit tomorrow's capacity comes forward
+            if d + 1 < self.horizon_days:
+                excess = float((np.minimum(level_next, 100.0) * kg_per_pct)[tomorrow].sum()) - capacity
+                if excess > 0:
+                    candidates = np.flatnonzero(tomorrow)
+                    candidates = candidates[np.argsort(-level_today[candidates], kind='stable')]
+                    moved = np.cumsum((level_today * kg_per_pct)[candidates])
+                    chosen[candidates[:int(np.searchsorted(moved, excess)) + 1]] = True
+
+            load = level_today * kg_per_pct
+            used = float(load[chosen].sum())
+            active_zones = np.bincount(zones[chosen], minlength=num_zones) > 0
+            optional = np.flatnonzero(~chosen & tomorrow & active_zones[zones] & (level_today >= self.min_fill))
+            optional = optional[np.argsort(-level_today[optional], kind='stable')]
+            fits = np.cumsum(load[optional]) <= capacity - used
+            chosen[optional[fits]] = True
+
+            picked = np.flatnonzero(chosen)
+            overflows.extend({'bin_id': bins[i]['id'], 'date': times[d].date().isoformat(),
+                              'predicted_level': round(float(level_today[i]), 1)} for i in np.flatnonzero(overflowing))
+            days.append({
+                'day': d,
+                'date': times[d].date().isoformat(),
+                'service_time': times[d].isoformat(timespec='minutes'),
+                'bins': [dict(bins[i], current_fill_level=bins[i].get('fill_level', 0),
+                              fill_level=round(float(level_today[i]), 1)) for i in picked],
+                'num_bins': int(len(picked)),
+                'mandatory': int(must.sum()),
+                'load_kg': round(float(load[picked].sum()), 1),
+                'capacity_kg': capacity,
+                'zones_visited': int(np.count_nonzero(np.bincount(zones[picked], minlength=num_zones))),
+            })
+
+            # Collected bins restart empty from today's service time
+            base_level[picked] = 0.0
+            base_weight[picked] = weighted[picked, d]
+
+            # Reference policy: every bin at the fill threshold is collected each day
+            threshold_today = threshold_level + rate * np.maximum(weighted[:, d] - threshold_weight, 0.0)
+            due = threshold_today >= self.optimizer.fill_threshold
+            daily_threshold_visits += int(due.sum())
+            daily_threshold_overflows += int((threshold_today >= self.overflow_level).sum())
+            threshold_level[due] = 0.0
+            threshold_weight[due] = weighted[due, d]
+
+        planned_at = time.perf_counter()
+        if route:
+            day_limit = time_limit / max(len(days), 1) if time_limit else None
+            for day in days:
+                day['routes'] = self._route_day(day['bins'], fleet, day_limit, method)
+
+        total_km = sum(day['routes']['total_distance_km'] for day in days if day.get('routes'))
+        return {
+            'days': days,
+            'overflows': overflows,
+            'summary': {
+                'horizon_days': self.horizon_days,
+                'bins': n,
+                'collections': sum(day['num_bins'] for day in days),
+                'daily_threshold_collections': daily_threshold_visits,
+                'daily_threshold_overflows': daily_threshold_overflows,
+                'total_distance_km': round(total_km, 3),
+                'overflow_count': len(overflows),
+            },
+            'plan_time_s': round(planned_at - start, 3),
+            'solve_time_s': round(time.perf_counter() - start, 3),
+        }
+
+    def _route_day(self, day_bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]],
+                   time_limit: float | None, method: str) -> Dict[str, Any] | None:
+        """Routes of one planned day (bins are already selected, so no threshold)"""
+        if not day_bins:
+            return None
+        if len(day_bins) > CITY_ROUTING_BINS:
+            # calculate_city_routes applies its time_limit to each district
+            districts = math.ceil(len(day_bins) / DEFAULT_DISTRICT_SIZE)
+            return self.optimizer.calculate_city_routes(day_bins, fleet, fill_threshold=0,
+                                                        district_size=DEFAULT_DISTRICT_SIZE,
+                                                        time_limit=time_limit / districts if time_limit else None,
+                                                        workers=None)
+        return self.optimizer.calculate_fleet_routes(day_bins, fleet, fill_threshold=0, time_limit=time_limit,
+                                                     method=method)
@@ -0,0 +1,260 @@
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.distance_matrix import haversine_matrix
+from utils.route_optimizer import (RouteOptimizer, DEFAULT_SHIFT_HOURS, DEFAULT_SHIFT_START, DEFAULT_UNLOAD_MINUTES,
+                                   format_clock, parse_clock)
+
+# Bins per district: small enough for a fast solve, large enough for good trips
+DEFAULT_DISTRICT_SIZE = 400
+
+# Time to unload at the depot before a truck starts its next trip
+UNLOAD_MINUTES = DEFAULT_UNLOAD_MINUTES
+
+KM_PER_DEGREE_LAT = 110.574
+
+
+def project_km(coordinates: np.ndarray) -> np.ndarray:
+    """Equirectangular projection of [lat, lon] rows to local km (x east, y north)"""
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    origin_lat = coordinates[:, 0].mean() if len(coordinates) else 0.0
+    return np.column_stack([coordinates[:, 1] * 111.320 * math.cos(math.radians(origin_lat)),
+                            coordinates[:, 0] * KM_PER_DEGREE_LAT])
+
+
+def morton_keys(xy: np.ndarray, bits: int = 16) -> np.ndarray:
+    """Z-order (Morton) key of each point, interleaving the bits of its grid cell"""
+    span = np.maximum(xy.max(axis=0) - xy.min(axis=0), 1e-9)
+    cells = ((xy - xy.min(axis=0)) / span * ((1 << bits) - 1)).astype(np.uint64)
+    keys = np.zeros(len(xy), dtype=np.uint64)
+    for bit in range(bits):
+        keys |= ((cells[:, 0] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        keys |= ((cells[:, 1] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+    return keys
+
+
+def grid_partition(coordinates: np.ndarray, weights: np.ndarray, k: int) -> np.ndarray:
+    """District label per point: the Z-order curve cut into k runs of equal total weight"""
+    order = np.argsort(morton_keys(project_km(coordinates)), kind='stable')
+    cumulative = np.cumsum(np.asarray(weights, dtype=np.float64)[order])
+    total = cumulative[-1] if len(cumulative) and cumulative[-1] > 0 else 1.0
+    labels = np.empty(len(order), dtype=np.intp)
+    labels[order] = np.minimum((cumulative - 1e-9) / total * k, k - 1).astype(np.intp)
+    return labels
+
+
+def balanced_kmeans(coordinates: np.ndarray, weights: np.ndarray, k: int, iterations: int = 40,
+                    seed: int = 0, balance: float = 0.5) -> np.ndarray:
+    """Load-weighted k-means whose clusters carry similar total weight
+
+    Assignment is one vectorized (points x centres) distance computation per
+    iteration. Every centre has a size multiplier that grows while its
+    cluster is heavier than the average and shrinks while it is lighter, so
+    clusters end up compact and balanced by load rather than by count.
+    """
+    xy = project_km(coordinates)
+    weights = np.asarray(weights, dtype=np.float64)
+    weights = np.where(weights > 0, weights, 1e-6)
+    n = len(xy)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+
+    # Weighted k-means++ initialisation
+    centres = np.empty((k, 2))
+    centres[0] = xy[rng.choice(n, p=weights / weights.sum())]
+    closest = ((xy - centres[0]) ** 2).sum(axis=1)
+    for j in range(1, k):
+        p = closest * weights
+        centres[j] = xy[rng.choice(n, p=p / p.sum())] if p.sum() > 0 else xy[rng.integers(n)]
+        closest = np.minimum(closest, ((xy - centres[j]) ** 2).sum(axis=1))
+
+    target = weights.sum() / k
+    scale = np.ones(k)
+    labels = np.zeros(n, dtype=np.intp)
+    for _ in range(iterations):
+        squared = ((xy[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        labels = np.argmin(squared * scale[None, :], axis=1)
+        load = np.bincount(labels, weights=weights, minlength=k)
+        scale *= np.clip(load / target, 0.5, 2.0) ** balance
+        for axis in range(2):
+            weighted = np.bincount(labels, weights=weights * xy[:, axis], minlength=k)
+            centres[:, axis] = np.where(load > 0, weighted / np.maximum(load, 1e-12), centres[:, axis])
+    return labels
+
+
+def truck_kind(truck: Dict[str, Any]) -> str:
+    """Streams a truck can carry (compartments / waste_types); trips only go to trucks of their kind"""
+    return json.dumps([truck.get('compartments'), truck.get('waste_types')], sort_keys=True)
+
+
+def _solve_district(args: Tuple) -> Dict[str, Any]:
+    """Worker: route one district's bins with as many trip-sized vehicles as it may need"""
+    db_path, road_network, bins, trip_fleet, time_limit, method = args
+    optimizer = RouteOptimizer(db_path, fill_threshold=0, road_network=road_network)
+    return optimizer.calculate_fleet_routes(bins, trip_fleet, fill_threshold=0, time_limit=time_limit,
+                                            method=method)
+
+
+def solve_by_districts(optimizer: RouteOptimizer, bins: List[Dict[str, Any]],
+                       fleet: List[Dict[str, Any]], district_size: int = DEFAULT_DISTRICT_SIZE,
+                       partition: str = "kmeans", workers: int | None = None,
+                       time_limit: float | None = None, method: str = "savings") -> Dict[str, Any]:
+    """Route a whole city by solving load-balanced districts independently
+
+    Bins are split into districts of about district_size bins with equal
+    expected load (balanced k-means, or cuts along a Z-order curve with
+    partition="grid") and each district goes to the nearest fleet depot.
+    Districts are solved in parallel as depot -> stops -> depot trips of one
+    truckload each; the trips are then stitched into truck shifts (tightest
+    service windows first, then longest, onto the truck free earliest, with
+    an unload stop between trips), re-checking time windows at each trip's
+    real start time.
+    """
+    start = time.perf_counter()
+    if not bins:
+        return {'routes': [], 'unassigned': [], 'districts': [], 'total_distance_km': 0.0, 'solve_time_s': 0.0}
+
+    coordinates = np.array([b['coordinates'] for b in bins], dtype=np.float64)
+    loads = np.array([optimizer.estimate_load(b) for b in bins])
+    k = max(1, int(math.ceil(len(bins) / district_size)))
+    if partition == "grid":
+        labels = grid_partition(coordinates, loads, k)
+    elif partition == "kmeans":
+        labels = balanced_kmeans(coordinates, loads, k)
+    else:
+        raise ValueError(f"Unknown partition method: {partition}")
+
+    depots = optimizer.fleet_depots(fleet)
+    kinds: Dict[str, Dict[str, Any]] = {}
+    for truck in fleet:
+        kind = kinds.setdefault(truck_kind(truck), {'compartments': truck.get('compartments'),
+                                                    'waste_types': truck.get('waste_types'),
+                                                    'capacity_kg': truck.get('capacity_kg', 8000)})
+        kind['capacity_kg'] = min(kind['capacity_kg'], truck.get('capacity_kg', 8000))
+    trip_capacity = min(kind['capacity_kg'] for kind in kinds.values())
+    longest_shift = max(t.get('shift_hours', DEFAULT_SHIFT_HOURS) for t in fleet)
+    earliest_start = min(parse_clock(t.get('shift_start', DEFAULT_SHIFT_START)) for t in fleet)
+
+    tasks, districts = [], []
+    for district in range(k):
+        members = np.flatnonzero(labels == district)
+        if not len(members):
+            continue
+        centre = coordinates[members].mean(axis=0)
+        depot = depots[int(np.argmin(haversine_matrix([centre], depots)[0]))]
+        district_load = float(loads[members].sum())
+        trips = int(math.ceil(district_load / trip_capacity * 1.3)) + 1
+        trip_fleet = [{
+            'truck_id': f"D{district}_K{k}_T{trip}", 'capacity_kg': kind['capacity_kg'], 'depot': depot,
+            'shift_hours': longest_shift, 'shift_start': format_clock(earliest_start),
+            'avg_speed_kmh': fleet[0].get('avg_speed_kmh', 25.0),
+            'compartments': kind['compartments'], 'waste_types': kind['waste_types'], 'kind': key,
+        } for k, (key, kind) in enumerate(kinds.items()) for trip in range(trips)]
+        district_limit = time_limit if time_limit is not None else max(2.0, len(members) / 100.0)
+        tasks.append((optimizer.db_path, optimizer.road_network, [bins[i] for i in members],
+                      trip_fleet, district_limit, method))
+        districts.append({'district': district, 'depot': depot, 'num_bins': int(len(members)),
+                          'load_kg': round(district_load, 1)})
+
+    if workers == 1 or len(tasks) == 1:
+        results = [_solve_district(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_solve_district, tasks))
+
+    trips, unassigned = [], []
+    for info, task, result in zip(districts, tasks, results):
+        district_trips = [route for route in result['routes'] if route['stops']]
+        info['trips'] = len(district_trips)
+        info['distance_km'] = round(sum(r['distance_km'] for r in district_trips), 3)
+        kind_of = {truck['truck_id']: truck['kind'] for truck in task[3]}
+        for route in district_trips:
+            # Latest start that keeps every service window, from the district's schedule
+            slack = min((parse_clock(stop['service_window'][1]) - parse_clock(stop['arrival_time'])
+                         for stop in route['stops'] if 'service_window' in stop), default=np.inf)
+            trips.append({'district': info['district'], 'depot': info['depot'], 'stops': route['stops'],
+                          'kind': kind_of[route['truck_id']],
+                          'duration_min': route['duration_min'], 'latest_start': earliest_start + slack})
+        unassigned.extend(result['unassigned'])
+
+    routes, left_over = stitch_trips(optimizer, trips, fleet)
+    unassigned.extend(left_over)
+    return {
+        'routes': routes,
+        'unassigned': unassigned,
+        'districts': districts,
+        'total_distance_km': round(sum(r['distance_km'] for r in routes), 3),
+        'solve_time_s': round(time.perf_counter() - start, 3),
+    }
+
+
+def stitch_trips(optimizer: RouteOptimizer, trips: List[Dict[str, Any]],
+                 fleet: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Assign district trips to trucks; returns per-truck routes and the stops no truck could take
+
+    Trips may carry latest_start (minutes), the latest departure that still
+    meets their service windows; they are placed in that order. Trips with a
+    kind (see truck_kind) only go to trucks of that kind.
+    """
+    shift_start = [parse_clock(t.get('shift_start', DEFAULT_SHIFT_START)) for t in fleet]
+    shift_end = [s + t.get('shift_hours', DEFAULT_SHIFT_HOURS) * 60.0 for s, t in zip(shift_start, fleet)]
+    available = list(shift_start)
+    assigned: List[List[Dict[str, Any]]] = [[] for _ in fleet]
+    left_over = []
+
+    # Trips with the tightest service windows first, then the longest ones
+    for trip in sorted(trips, key=lambda t: (t.get('latest_start', np.inf), -t['duration_min'])):
+        candidates = [v for v, truck in enumerate(fleet)
+                      if list(truck.get('depot') or trip['depot']) == list(trip['depot']) and
+                      truck_kind(truck) == trip.get('kind', truck_kind(truck))]
+        placed = False
+        for vehicle in sorted(candidates, key=lambda v: available[v]):
+            begin = available[vehicle] + (UNLOAD_MINUTES if assigned[vehicle] else 0.0)
+            if begin >= shift_end[vehicle]:
+                continue
+            truck = dict(fleet[vehicle], shift_start=format_clock(begin),
+                         shift_hours=(shift_end[vehicle] - begin) / 60.0)
+            problem = optimizer.build_routing_problem(trip['stops'], [truck])
+            route = list(problem.customers)
+            if problem.is_feasible(0, route):
+                starts, return_time = problem.route_schedule(0, route)
+                assigned[vehicle].append({
+                    'district': trip['district'],
+                    'stops': [dict(stop, arrival_time=format_clock(t)) for stop, t in zip(trip['stops'], starts)],
+                    'distance_km': round(problem.route_distance(0, route), 3),
+                    'load_kg': round(problem.route_load(route), 1),
+                    'start_time': format_clock(begin),
+                    'return_time': format_clock(return_time),
+                })
+                available[vehicle] = return_time
+                placed = True
+                break
+        if not placed:
+            left_over.extend(trip['stops'])
+
+    routes = []
+    for vehicle, truck in enumerate(fleet):
+        truck_trips = sorted(assigned[vehicle], key=lambda t: t['start_time'])
+        stops = []
+        for number, trip in enumerate(truck_trips, start=1):
+            for stop in trip['stops']:
+                stops.append(dict(stop, trip=number, stop_number=len(stops) + 1))
+        routes.append({
+            'truck_id': truck.get('truck_id'),
+            'driver': truck.get('driver'),
+            'depot': list(truck.get('depot') or []),
+            'trips': truck_trips,
+            'num_trips': len(truck_trips),
+            'stops': stops,
+            'num_stops': len(stops),
+            'distance_km': round(sum(t['distance_km'] for t in truck_trips), 3),
+            'load_kg': round(sum(t['load_kg'] for t in truck_trips), 1),
+            'shift_start': format_clock(shift_start[vehicle]),
+            'return_time': truck_trips[-1]['return_time'] if truck_trips else None,
+        })
+    return routes, left_over
@@ -0,0 +1,186 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.route_optimizer import RouteOptimizer
+from utils.tsp import IMPROVEMENT_EPS
+from utils.vrp import RoutingProblem, RoutingSolution, insert_node, insertion_cost, remove_node, solve_cvrp
+
+
+class DispatchManager:
+    """The day's active fleet routes, patched in place as bins fill up.
+
+    plan() solves the routes once. Afterwards, every bin that crosses the fill
+    threshold (reported through on_readings, which can be registered as a
+    Database reading listener) is inserted into the active routes at its
+    cheapest feasible position, followed by a small remove-and-reinsert
+    repair around it, instead of re-solving. Stops a truck has already served
+    are locked: nothing is inserted or moved before them.
+    """
+
+    def __init__(self, optimizer: RouteOptimizer, fill_threshold: int | None = None,
+                 repair_budget_ms: float = 5.0):
+        self.optimizer = optimizer
+        self.fill_threshold = optimizer.fill_threshold if fill_threshold is None else fill_threshold
+        self.repair_budget_ms = repair_budget_ms
+
+        self.problem: RoutingProblem | None = None
+        self.solution: RoutingSolution | None = None
+        self.fleet: List[Dict[str, Any]] = []
+        self.bins: List[Dict[str, Any]] = []
+        self.catalog: Dict[str, Dict[str, Any]] = {}
+        self.node_of: Dict[str, int] = {}
+        self.coordinates = np.empty((0, 2))
+        self.locked = np.zeros(0, dtype=np.intp)
+        self.events = deque(maxlen=200)
+        self._lock = threading.RLock()
+
+    @property
+    def active(self) -> bool:
+        return self.solution is not None
+
+    def plan(self, bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]] | None = None,
+             time_limit: float | None = None) -> Dict[str, Any]:
+        """Solve the shift's routes from scratch; bins not yet due are kept for later insertion"""
+        start = time.perf_counter()
+        with self._lock:
+            self.fleet = fleet if fleet is not None else self.optimizer.load_fleet()
+            if not self.fleet:
+                raise ValueError("Fleet definition is empty")
+            self.catalog = {b['id']: b for b in bins}
+            self.bins = self.optimizer.select_bins(bins, self.fill_threshold)
+
+            self.problem = self.optimizer.build_routing_problem(self.bins, self.fleet)
+            self.solution = solve_cvrp(self.problem, time_limit)
+
+            depots = self.optimizer.fleet_depots(self.fleet)
+            offset = len(depots)
+            self.node_of = {b['id']: offset + i for i, b in enumerate(self.bins)}
+            self.coordinates = np.array(depots + [b['coordinates'] for b in self.bins], dtype=np.float64)
+            self.locked = np.zeros(len(self.fleet), dtype=np.intp)
+            self.events.clear()
+            return self.optimizer._fleet_result(self.problem, self.solution, self.bins, self.fleet, start)
+
+    def routes(self) -> Dict[str, Any]:
+        """Current routes, in the format of RouteOptimizer.calculate_fleet_routes"""
+        with self._lock:
+            if not self.active:
+                return {'routes': [], 'unassigned': [], 'total_distance_km': 0.0, 'solve_time_s': 0.0}
+            return self.optimizer._fleet_result(self.problem, self.solution, self.bins, self.fleet,
+                                                time.perf_counter())
+
+    def attach(self, db):
+        """Receive every sensor ingestion from a Database"""
+        db.add_reading_listener(self.on_readings)
+
+    def on_readings(self, rows: List[tuple]):
+        """Reading listener: insert bins that reached the threshold and are not routed yet"""
+        # Listeners run on ingestion threads while plan() may swap the catalog
+        with self._lock:
+            if not self.active:
+                return
+            due = {}
+            for row in rows:
+                bin_id, fill_level = row[1], row[3]
+                bin_item = self.catalog.get(bin_id)
+                if bin_item is None:
+                    continue
+                bin_item['fill_level'] = fill_level
+                if fill_level >= self.fill_threshold and bin_id not in self.node_of:
+                    due[bin_id] = bin_item
+            for bin_item in due.values():
+                self.insert_bin(bin_item)
+
+    def insert_bin(self, bin_item: Dict[str, Any]) -> Dict[str, Any]:
+        """Add one bin to the active routes (cheapest feasible insertion plus local repair)"""
+        start = time.perf_counter()
+        with self._lock:
+            if bin_item['id'] in self.node_of:
+                return {'bin_id': bin_item['id'], 'status': 'already_routed'}
+
+            problem, solution = self.problem, self.solution
+            to_node, from_node = self.optimizer.point_costs(self.coordinates, bin_item['coordinates'])
+            window_start, window_end, service = self.optimizer.service_window(bin_item)
+            load = self.optimizer.estimate_load(bin_item)
+            streams = None
+            if problem.compartment_demand is not None:
+                streams = np.zeros(problem.compartment_demand.shape[1])
+                streams[self.optimizer.stream_index(bin_item)] = load
+            node = problem.add_customer(to_node, from_node, load, service, window_start, window_end, streams)
+            solution.grow()
+            self.coordinates = np.vstack([self.coordinates, bin_item['coordinates']])
+            self.bins.append(bin_item)
+            self.node_of[bin_item['id']] = node
+            self.catalog.setdefault(bin_item['id'], bin_item)
+
+            vehicle, added_km = self._insert(node)
+            moves = 0
+            if vehicle is None:
+                solution.unassigned.append(node)
+            else:
+                deadline = time.perf_counter() + self.repair_budget_ms / 1000.0
+                moves = self._repair(node, deadline)
+
+            event = {
+                'bin_id': bin_item['id'],
+                'status': 'inserted' if vehicle is not None else 'unassigned',
+                'truck_id': self.fleet[int(solution.route_of[node])].get('truck_id') if vehicle is not None else None,
+                'added_km': round(added_km, 3) if vehicle is not None else None,
+                'repair_moves': moves,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            }
+            self.events.append(event)
+            return event
+
+    def complete_stop(self, bin_id: str) -> bool:
+        """Record that a truck served a bin: it and the stops before it become fixed"""
+        with self._lock:
+            node = self.node_of.get(bin_id)
+            if node is None or self.solution.route_of[node] < 0:
+                return False
+            vehicle = int(self.solution.route_of[node])
+            self.locked[vehicle] = max(self.locked[vehicle], int(self.solution.position[node]) + 1)
+            return True
+
+    def _is_locked(self, node: int) -> bool:
+        vehicle = int(self.solution.route_of[node])
+        return vehicle < 0 or self.solution.position[node] < self.locked[vehicle]
+
+    def _insert(self, node: int) -> tuple:
+        """Insert node at its cheapest feasible place in any route: (vehicle or None, added km)"""
+        best = (np.inf, None, -1)
+        for vehicle in range(self.problem.num_vehicles):
+            cost, index = insertion_cost(self.solution, vehicle, node, int(self.locked[vehicle]))
+            if cost < best[0]:
+                best = (cost, vehicle, index)
+        if best[1] is None:
+            return None, 0.0
+        insert_node(self.solution, best[1], node, best[2])
+        return best[1], float(best[0])
+
+    def _repair(self, node: int, deadline: float) -> int:
+        """Remove and reinsert the new stop and its nearest routed neighbours while it pays off"""
+        problem, solution = self.problem, self.solution
+        moves = 0
+        for candidate in [node] + [int(n) for n in problem.neighbours[node]]:
+            if time.perf_counter() > deadline:
+                break
+            if self._is_locked(candidate):
+                continue
+            vehicle = int(solution.route_of[candidate])
+            index = int(solution.position[candidate])
+            prev, nxt = solution.adjacent_nodes(vehicle, index)
+            gain = problem.dist[prev, candidate] + problem.dist[candidate, nxt] - problem.dist[prev, nxt]
+
+            remove_node(solution, candidate)
+            target, added = self._insert(candidate)
+            if target is None or added > gain - IMPROVEMENT_EPS:
+                if target is not None:
+                    remove_node(solution, candidate)
+                insert_node(solution, vehicle, candidate, index)
+            else:
+                moves += 1
+        return moves
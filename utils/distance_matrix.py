@@ -0,0 +1,180 @@
+import json
+import os
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(a: Sequence[float], b: Sequence[float]) -> float:
+    """Great-circle distance in km between two [lat, lon] points"""
+    return float(haversine_matrix(np.array([a]), np.array([b]))[0, 0])
+
+
+def haversine_matrix(origins: np.ndarray | List[List[float]],
+                     destinations: np.ndarray | List[List[float]] | None = None) -> np.ndarray:
+    """Great-circle distance matrix in km between [lat, lon] rows
+
+    With a single argument the square matrix between all points is returned.
+    The computation is fully vectorized: every pair is evaluated in one
+    broadcasted NumPy expression.
+    """
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    destinations = origins if destinations is None else np.radians(
+        np.asarray(destinations, dtype=np.float64).reshape(-1, 2))
+
+    lat1 = origins[:, 0][:, None]
+    lon1 = origins[:, 1][:, None]
+    lat2 = destinations[:, 0][None, :]
+    lon2 = destinations[:, 1][None, :]
+
+    h = (np.sin((lat2 - lat1) / 2.0) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def haversine_costs(origins: np.ndarray, destinations: np.ndarray,
+                    speed_kmh: float = 25.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Straight-line distance (km) and duration (min) matrices at a constant speed"""
+    distance = haversine_matrix(origins, destinations)
+    return distance, distance / speed_kmh * 60.0
+
+
+class DistanceMatrixStore:
+    """Disk-backed distance/duration matrices keyed by bin (or depot) ID.
+
+    Both matrices are float32 .npy files opened as memory maps, with one
+    slot per ID and spare capacity for growth. When IDs are added or their
+    coordinates change only the affected rows and columns are recomputed.
+    submatrix() returns a view of the memory map, without copying, when the
+    requested IDs occupy consecutive slots in order (IDs synced together are
+    stored together); other selections are gathered into a new array.
+    """
+
+    def __init__(self, path: str = "matrix_cache", cost_fn: Callable | None = None,
+                 initial_capacity: int = 256):
+        self.path = path
+        self.cost_fn = cost_fn or haversine_costs
+        os.makedirs(path, exist_ok=True)
+
+        self.meta_file = os.path.join(path, "matrix_meta.json")
+        self.distance_file = os.path.join(path, "distance_km.npy")
+        self.duration_file = os.path.join(path, "duration_min.npy")
+
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file) as f:
+                meta = json.load(f)
+            self.ids: List[str | None] = meta['ids']
+            self.coordinates = np.array(meta['coordinates'], dtype=np.float64).reshape(-1, 2)
+            self.version = meta['version']
+            self.distance = np.load(self.distance_file, mmap_mode='r+')
+            self.duration = np.load(self.duration_file, mmap_mode='r+')
+        else:
+            self.ids = []
+            self.coordinates = np.empty((0, 2))
+            self.version = 0
+            self.distance = self._allocate(self.distance_file, initial_capacity)
+            self.duration = self._allocate(self.duration_file, initial_capacity)
+
+        self.slot = {item_id: index for index, item_id in enumerate(self.ids) if item_id is not None}
+
+    @property
+    def capacity(self) -> int:
+        return self.distance.shape[0]
+
+    def __len__(self) -> int:
+        return len(self.slot)
+
+    def _allocate(self, filename: str, capacity: int, previous: np.ndarray | None = None,
+                  used: int = 0) -> np.ndarray:
+        """Create a (capacity x capacity) float32 memory map, copying used rows of previous"""
+        temporary = filename + ".tmp"
+        matrix = np.lib.format.open_memmap(temporary, mode='w+', dtype=np.float32, shape=(capacity, capacity))
+        # Copy in row blocks so growing a large store never loads it into memory
+        for row in range(0, used, 1024):
+            matrix[row:row + 1024, :used] = previous[row:row + 1024, :used]
+        matrix.flush()
+        del matrix
+        os.replace(temporary, filename)
+        return np.load(filename, mmap_mode='r+')
+
+    def _grow(self, needed: int):
+        capacity = self.capacity
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        used = len(self.ids)
+        self.distance = self._allocate(self.distance_file, capacity, self.distance, used)
+        self.duration = self._allocate(self.duration_file, capacity, self.duration, used)
+
+    def sync(self, items: List[Tuple[str, Sequence[float]]]) -> Dict[str, int]:
+        """Make sure every (id, [lat, lon]) is in the store with current coordinates
+
+        New IDs get consecutive slots (in the given order); only rows and
+        columns of new or moved IDs are recomputed.
+        """
+        added, moved = [], []
+        for item_id, coords in items:
+            index = self.slot.get(item_id)
+            if index is None:
+                added.append((item_id, coords))
+            elif not np.allclose(self.coordinates[index], coords, atol=1e-7):
+                moved.append(index)
+                self.coordinates[index] = coords
+
+        if added:
+            start = len(self.ids)
+            self._grow(start + len(added))
+            for item_id, _ in added:
+                self.slot[item_id] = len(self.ids)
+                self.ids.append(item_id)
+            self.coordinates = np.vstack([self.coordinates, np.array([c for _, c in added], dtype=np.float64)])
+            moved.extend(range(start, start + len(added)))
+
+        if moved:
+            self._recompute(np.array(sorted(moved), dtype=np.intp))
+            self.version += 1
+            self._save_meta()
+
+        return {'added': len(added), 'moved': len(moved) - len(added), 'version': self.version}
+
+    def remove(self, ids: List[str]):
+        """Forget IDs (their slots are left empty)"""
+        for item_id in ids:
+            index = self.slot.pop(item_id, None)
+            if index is not None:
+                self.ids[index] = None
+        self.version += 1
+        self._save_meta()
+
+    def _recompute(self, changed: np.ndarray):
+        used = len(self.ids)
+        everything = self.coordinates[:used]
+        distance, duration = self.cost_fn(self.coordinates[changed], everything)
+        self.distance[changed, :used] = distance
+        self.duration[changed, :used] = duration
+        distance, duration = self.cost_fn(everything, self.coordinates[changed])
+        self.distance[:used, changed] = distance
+        self.duration[:used, changed] = duration
+        self.distance.flush()
+        self.duration.flush()
+
+    def _save_meta(self):
+        temporary = self.meta_file + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'ids': self.ids, 'coordinates': self.coordinates.tolist(), 'version': self.version}, f)
+        os.replace(temporary, self.meta_file)
+
+    def indices(self, ids: List[str]) -> np.ndarray:
+        """Slots of the given IDs (KeyError if one is missing)"""
+        return np.array([self.slot[item_id] for item_id in ids], dtype=np.intp)
+
+    def submatrix(self, ids: List[str], kind: str = "distance") -> np.ndarray:
+        """Matrix between the given IDs, in the given order"""
+        matrix = self.distance if kind == "distance" else self.duration
+        slots = self.indices(ids)
+        if len(slots) and np.all(np.diff(slots) == 1):
+            return matrix[slots[0]:slots[-1] + 1, slots[0]:slots[-1] + 1]
+        return matrix[np.ix_(slots, slots)]
@@ -0,0 +1,128 @@
+from datetime import datetime
+from typing import Dict, List, Any, Sequence
+
+import numpy as np
+
+from utils.route_optimizer import RouteOptimizer, DEFAULT_DEPOT, DEFAULT_SPEED_KMH
+
+# Diesel combustion, tank-to-wheel
+CO2_KG_PER_LITER = 2.68
+
+# Consumption of a typical 15 t compactor truck
+VEHICLE_PROFILES = {
+    'compactor': {
+        'empty_l_per_km': 0.38,        # driving empty
+        'l_per_km_per_tonne': 0.018,   # extra per tonne of payload
+        'stop_start_l': 0.04,          # braking and pulling away at each stop
+        'idle_l_per_h': 2.8,           # engine idling (waiting for a window)
+        'service_l_per_h': 4.5,        # idling plus lift/compactor at a stop
+    },
+}
+
+
+class RouteEnergyModel:
+    """Fuel and CO2 of collection routes, against a naive baseline.
+
+    Fuel is summed per leg from its distance and the payload carried on it
+    (the load curve grows at each stop and drops at unloads), plus a fixed
+    amount per stop, the lift/compactor time at each stop and idling while
+    waiting for service windows. The baseline visits the same stops in a
+    fixed order (by bin ID) with the same trucks, as a planner without
+    optimization would.
+    """
+
+    def __init__(self, optimizer: RouteOptimizer, vehicle: str = 'compactor'):
+        self.optimizer = optimizer
+        self.profile = VEHICLE_PROFILES[vehicle]
+
+    def leg_fuel(self, leg_km: np.ndarray, payload_kg: np.ndarray) -> np.ndarray:
+        """Litres burnt on each leg for its distance and payload"""
+        return leg_km * (self.profile['empty_l_per_km'] + self.profile['l_per_km_per_tonne'] * payload_kg / 1000.0)
+
+    def sequence_energy(self, depot: Sequence[float], stops: List[Dict[str, Any]], idle_min: float = 0.0,
+                        unloads: List[Dict[str, Any]] | None = None) -> Dict[str, float]:
+        """Fuel (L), CO2 (kg) and distance (km) of depot -> stops -> depot in the given order
+
+        unloads are the route's unload visits (after_stop, facility,
+        coordinates): the truck drives there and the payload drops to zero.
+        """
+        if not stops:
+            return {'distance_km': 0.0, 'fuel_l': 0.0, 'co2_kg': 0.0}
+        pending = sorted(unloads or [], key=lambda u: u['after_stop'])
+        points, loads = [], []
+        for index, stop in enumerate(stops + [None]):
+            while pending and pending[0]['after_stop'] <= index:
+                unload = pending.pop(0)
+                points.append({'id': f"facility:{unload.get('facility')}", 'coordinates': unload['coordinates']})
+                loads.append(None)
+            if stop is not None:
+                points.append(stop)
+                loads.append(stop.get('load_kg', self.optimizer.estimate_load(stop)))
+
+        dist = self.optimizer.cost_matrix([list(depot)], points)
+        nodes = np.arange(len(points) + 2) % (len(points) + 1)
+        legs = dist[nodes[:-1], nodes[1:]]
+        payload = np.zeros(len(legs))
+        carried = 0.0
+        for leg, load in enumerate(loads, start=1):
+            carried = 0.0 if load is None else carried + load
+            payload[leg] = carried
+        service_min = sum(self.optimizer.service_window(s)[2] for s in stops)
+
+        fuel = (float(self.leg_fuel(legs, payload).sum()) + self.profile['stop_start_l'] * len(stops) +
+                self.profile['service_l_per_h'] * service_min / 60.0 + self.profile['idle_l_per_h'] * idle_min / 60.0)
+        return {'distance_km': round(float(legs.sum()), 3), 'fuel_l': round(fuel, 3),
+                'co2_kg': round(fuel * CO2_KG_PER_LITER, 3)}
+
+    def idle_minutes(self, route: Dict[str, Any], speed_kmh: float) -> float:
+        """Engine-on minutes neither driving nor serving (window waits, unloading) of a fleet route"""
+        if 'duration_min' not in route or not route['stops']:
+            return 0.0
+        driving = route['distance_km'] / speed_kmh * 60.0
+        service = sum(self.optimizer.service_window(s)[2] for s in route['stops'])
+        return max(0.0, route['duration_min'] - driving - service)
+
+    def evaluate(self, result: Dict[str, Any], fleet: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
+        """Energy of every route in a calculate_* result and of its naive baseline"""
+        routes = result['routes'] if 'routes' in result else [dict(result, truck_id=None)]
+        speeds = {t.get('truck_id'): t.get('avg_speed_kmh', DEFAULT_SPEED_KMH) for t in fleet or []}
+
+        evaluated = []
+        for route in routes:
+            truck_id, stops = route.get('truck_id'), route['stops']
+            if not stops:
+                continue
+            depot = route.get('depot') or DEFAULT_DEPOT
+            unloads = route.get('unloads', [])
+            # Waiting and unloading are charged to both: the baseline is not credited with shorter waits
+            idle = self.idle_minutes(route, speeds.get(truck_id, DEFAULT_SPEED_KMH))
+            optimized = self.sequence_energy(depot, stops, idle, unloads)
+            # Same trucks and trip splits, stops in a fixed (ID) order within each trip
+            bounds = [0] + [u['after_stop'] for u in unloads if u['after_stop'] < len(stops)] + [len(stops)]
+            naive = [s for a, b in zip(bounds[:-1], bounds[1:]) for s in sorted(stops[a:b], key=lambda s: str(s['id']))]
+            baseline = self.sequence_energy(depot, naive, idle, unloads)
+            evaluated.append({
+                'truck_id': truck_id,
+                'stops': len(stops),
+                'idle_min': round(idle, 1),
+                'load_kg': round(sum(s.get('load_kg', self.optimizer.estimate_load(s)) for s in stops), 1),
+                **optimized,
+                'baseline_distance_km': baseline['distance_km'],
+                'baseline_fuel_l': baseline['fuel_l'],
+                'baseline_co2_kg': baseline['co2_kg'],
+            })
+
+        totals = {key: round(sum(r[key] for r in evaluated), 3)
+                  for key in ('distance_km', 'fuel_l', 'co2_kg', 'baseline_distance_km', 'baseline_fuel_l',
+                              'baseline_co2_kg')}
+        totals['fuel_saved_l'] = round(totals['baseline_fuel_l'] - totals['fuel_l'], 3)
+        totals['co2_avoided_kg'] = round(totals['baseline_co2_kg'] - totals['co2_kg'], 3)
+        return {'routes': evaluated, 'totals': totals}
+
+    def record(self, db, result: Dict[str, Any], fleet: List[Dict[str, Any]] | None = None,
+               kind: str = 'fleet', executed_at: str | None = None) -> Dict[str, Any]:
+        """Evaluate a result and store it through Database.record_route_energy"""
+        energy = self.evaluate(result, fleet)
+        db.record_route_energy(energy['routes'], kind=kind, executed_at=executed_at or datetime.now().isoformat())
+        return energy
+
@@ -0,0 +1,207 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.sensor_simulator import BASE_FILL_RATES, FILL_RATE_PROFILES, PROFILE_NAMES, profile_for_bin
+
+# A fall of at least this many points between two readings means the bin was emptied
+COLLECTION_DROP = 20.0
+
+# Weight of the waste-type prior, in reading pairs, when blending it with the fitted rate
+PRIOR_PAIRS = 3.0
+
+# Readings at or above this level are of a full bin, whose fill can no longer rise
+FULL_LEVEL = 100.0 - 1e-6
+
+_EPOCH = np.datetime64('1970-01-01T00:00:00')
+
+
+def to_hours(value) -> np.ndarray | float:
+    """Hours since 1970-01-01 (local wall time) of datetimes or ISO strings"""
+    if isinstance(value, datetime):
+        return (value - datetime(1970, 1, 1)).total_seconds() / 3600.0
+    stamps = np.asarray(value, dtype='datetime64[us]')
+    return (stamps - _EPOCH) / np.timedelta64(1, 'h')
+
+
+class FillForecaster:
+    """Per-bin fill-rate models fitted from the sensor reading history.
+
+    A bin fills at base_rate x the hourly multiplier of its usage profile
+    (the same profiles the sensor simulator uses). fit() estimates every
+    bin's base rate at once: consecutive readings give fill increments and
+    the profile-weighted hours between them, and a least-squares slope per
+    bin is taken with np.bincount. Readings around a collection (a large
+    drop) are skipped, and sparse histories are pulled towards the
+    waste-type default rate.
+    """
+
+    def __init__(self, db_path: str = "ecosmart.db", history_hours: int = 72, refit_seconds: float = 300.0):
+        self.db_path = db_path
+        self.history_hours = history_hours
+        self.refit_seconds = refit_seconds
+
+        self.profiles = np.array([FILL_RATE_PROFILES[name] for name in PROFILE_NAMES], dtype=np.float64)
+        self.cumulative = np.concatenate([np.zeros((len(PROFILE_NAMES), 1)), np.cumsum(self.profiles, axis=1)],
+                                         axis=1)
+        self.bin_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.rate = np.zeros(0)
+        self.level = np.zeros(0)
+        self.observed_at = np.zeros(0)
+        self.profile_index = np.zeros(0, dtype=np.intp)
+        self.pairs = np.zeros(0, dtype=np.int64)
+        self.fitted_at: float | None = None
+        self._alerted: Dict[str, float] = {}
+
+    def profile_hours(self, profile_index: np.ndarray, hours: np.ndarray) -> np.ndarray:
+        """Integral of the profile multiplier from the epoch to each time (vectorized)"""
+        hours = np.asarray(hours, dtype=np.float64)
+        day = np.floor(hours / 24.0)
+        within = hours - day * 24.0
+        hour = np.minimum(within.astype(np.intp), 23)
+        return (day * self.cumulative[profile_index, 24] + self.cumulative[profile_index, hour] +
+                (within - hour) * self.profiles[profile_index, hour])
+
+    def _invert_profile_hours(self, profile_index: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """Time (hours since epoch) at which profile_hours reaches target"""
+        total = self.cumulative[profile_index, 24]
+        day = np.floor(target / total)
+        remainder = target - day * total
+        hours = np.empty(len(target))
+        for p in np.unique(profile_index):
+            rows = profile_index == p
+            hour = np.clip(np.searchsorted(self.cumulative[p], remainder[rows], side='right') - 1, 0, 23)
+            hours[rows] = hour + (remainder[rows] - self.cumulative[p, hour]) / self.profiles[p, hour]
+        return day * 24.0 + hours
+
+    def fit(self, now: datetime | None = None) -> Dict[str, Any]:
+        """Fit every bin's rate from the last history_hours of readings"""
+        started = time.perf_counter()
+        now = now or datetime.now()
+        since = (now - timedelta(hours=self.history_hours)).isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name, waste_type, fill_level FROM bins ORDER BY id")
+        bins = cursor.fetchall()
+        cursor.execute("""
+            SELECT bin_id, recorded_at, fill_level
+            FROM sensor_readings
+            WHERE recorded_at >= ? AND bin_id IS NOT NULL
+            ORDER BY bin_id, recorded_at
+        """, (since,))
+        readings = cursor.fetchall()
+        conn.close()
+
+        self.bin_ids = [row[0] for row in bins]
+        self.index = {bin_id: i for i, bin_id in enumerate(self.bin_ids)}
+        n = len(self.bin_ids)
+        profile_of = {name: i for i, name in enumerate(PROFILE_NAMES)}
+        self.profile_index = np.array([profile_of[profile_for_bin(row[1])] for row in bins], dtype=np.intp)
+        prior = np.array([BASE_FILL_RATES.get(row[2] or 'comum', 1.5) for row in bins])
+        self.level = np.array([float(row[3] or 0) for row in bins])
+        self.observed_at = np.full(n, to_hours(now))
+
+        readings = [r for r in readings if r[0] in self.index]
+        if readings:
+            b = np.array([self.index[r[0]] for r in readings], dtype=np.intp)
+            t = to_hours([r[1] for r in readings])
+            y = np.array([r[2] for r in readings], dtype=np.float64)
+            weight_hours = self.profile_hours(self.profile_index[b], t)
+
+            same = b[1:] == b[:-1]
+            rise = y[1:] - y[:-1]
+            dw = weight_hours[1:] - weight_hours[:-1]
+            # Pairs starting at a full bin are censored (it cannot rise further) and would bias rates down
+            valid = same & (rise > -COLLECTION_DROP) & (dw > 0) & (y[:-1] < FULL_LEVEL)
+            owner = b[1:][valid]
+            sum_xy = np.bincount(owner, weights=(rise * dw)[valid], minlength=n)
+            sum_xx = np.bincount(owner, weights=(dw * dw)[valid], minlength=n)
+            self.pairs = np.bincount(owner, minlength=n)
+
+            fitted = np.divide(sum_xy, sum_xx, out=np.zeros(n), where=sum_xx > 1e-9)
+            self.rate = np.maximum((self.pairs * fitted + PRIOR_PAIRS * prior) / (self.pairs + PRIOR_PAIRS), 0.0)
+
+            # Latest reading per bin is the starting point of the forecast
+            last = np.flatnonzero(np.append(b[1:] != b[:-1], True))
+            self.level[b[last]] = y[last]
+            self.observed_at[b[last]] = t[last]
+        else:
+            self.pairs = np.zeros(n, dtype=np.int64)
+            self.rate = prior
+
+        self.fitted_at = time.time()
+        return {'bins': n, 'readings': len(readings), 'fitted_bins': int(np.count_nonzero(self.pairs)),
+                'seconds': round(time.perf_counter() - started, 3)}
+
+    def _ensure_fitted(self):
+        if self.fitted_at is None or time.time() - self.fitted_at > self.refit_seconds:
+            self.fit()
+
+    def predict(self, at: datetime | None = None) -> np.ndarray:
+        """Predicted fill level (%) of every bin at a time"""
+        self._ensure_fitted()
+        at_hours = to_hours(at or datetime.now())
+        gained = self.rate * (self.profile_hours(self.profile_index, np.full(len(self.rate), at_hours)) -
+                              self.profile_hours(self.profile_index, self.observed_at))
+        return np.clip(self.level + np.maximum(gained, 0.0), 0.0, 100.0)
+
+    def hours_to_full(self, threshold: float = 100.0, now: datetime | None = None) -> np.ndarray:
+        """Hours from now until each bin reaches threshold (0 if already there, inf if not filling)"""
+        self._ensure_fitted()
+        now_hours = to_hours(now or datetime.now())
+        missing = np.maximum(threshold - self.level, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            needed = np.where(self.rate > 0, missing / self.rate, np.inf)
+        result = np.full(len(self.rate), np.inf)
+        finite = np.isfinite(needed)
+        start = self.profile_hours(self.profile_index[finite], self.observed_at[finite])
+        result[finite] = self._invert_profile_hours(self.profile_index[finite], start + needed[finite]) - now_hours
+        return np.maximum(result, 0.0)
+
+    def forecast(self, bins: List[Dict[str, Any]], at: datetime | None = None,
+                 threshold: float = 100.0) -> List[Dict[str, Any]]:
+        """Copies of bins with fill_level replaced by the prediction at a time
+
+        The measured value is kept in current_fill_level; fill_rate (%/h at
+        the base rate) and hours_to_full are added. Bins without a model keep
+        their current level, and bins that already carry a forecast
+        (current_fill_level) are passed through unchanged.
+        """
+        predicted = self.predict(at)
+        to_full = self.hours_to_full(threshold)
+        result = []
+        for bin_item in bins:
+            i = self.index.get(bin_item['id'])
+            if 'current_fill_level' in bin_item:
+                result.append(bin_item)
+                continue
+            item = dict(bin_item, current_fill_level=bin_item.get('fill_level', 0))
+            if i is not None:
+                item['fill_level'] = round(float(max(predicted[i], bin_item.get('fill_level', 0))), 1)
+                item['fill_rate'] = round(float(self.rate[i]), 3)
+                item['hours_to_full'] = round(float(to_full[i]), 1) if np.isfinite(to_full[i]) else None
+            result.append(item)
+        return result
+
+    def overflow_alerts(self, notifications, within_hours: float = 6.0, user_id: str = "admin") -> int:
+        """Alert once per bin that is forecast to be full within within_hours; returns alerts sent"""
+        self.fit()
+        to_full = self.hours_to_full()
+        current = self.predict()
+        sent = 0
+        for i, bin_id in enumerate(self.bin_ids):
+            if to_full[i] <= within_hours:
+                if bin_id not in self._alerted:
+                    if notifications.send_overflow_forecast_alert(user_id, bin_id, float(to_full[i]),
+                                                                  float(current[i])):
+                        self._alerted[bin_id] = time.time()
+                        sent += 1
+            else:
+                # Emptied or slowed down: alert again next time it gets close
+                self._alerted.pop(bin_id, None)
+        return sent
@@ -0,0 +1,85 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Any
+
+
+class TelemetryBuffer:
+    """Batches high-rate truck GPS/fuel/speed fixes before writing them.
+
+    Trucks can report several fixes per second; writing each one in its own
+    transaction would make SQLite the bottleneck. Fixes are accumulated in
+    memory and flushed through Database.record_truck_positions once the batch
+    is full or the oldest pending fix is older than max_delay seconds. Trucks
+    that stop reporting need flush_due() to be called periodically (the
+    scheduler does), so their last fixes are not held back.
+    """
+
+    def __init__(self, db, batch_size: int = 500, max_delay: float = 2.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending: List[Dict[str, Any]] = []
+        self._oldest_pending: float | None = None
+        self._lock = threading.Lock()
+        self.total_written = 0
+
+    def add(self, truck_id: str, lat: float, lon: float, speed: float = 0,
+            fuel_level: float | None = None, heading: float | None = None,
+            recorded_at: str | None = None) -> int:
+        """Queue one fix; returns the number of fixes written if this flushed"""
+        fix = {
+            'truck_id': truck_id,
+            'recorded_at': recorded_at or datetime.now().isoformat(),
+            'lat': lat,
+            'lon': lon,
+            'speed': speed,
+            'fuel_level': fuel_level,
+            'heading': heading
+        }
+
+        with self._lock:
+            self._pending.append(fix)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._oldest_pending >= self.max_delay)
+
+        return self.flush() if due else 0
+
+    def add_many(self, fixes: List[Dict[str, Any]]) -> int:
+        """Queue several fixes at once (same keys as Database.record_truck_positions)"""
+        if not fixes:
+            return 0
+        with self._lock:
+            self._pending.extend(fixes)
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            due = (len(self._pending) >= self.batch_size or
+                   time.monotonic() - self._oldest_pending >= self.max_delay)
+
+        return self.flush() if due else 0
+
+    def flush_due(self) -> int:
+        """Flush if the oldest pending fix has waited max_delay seconds"""
+        with self._lock:
+            due = self._oldest_pending is not None and time.monotonic() - self._oldest_pending >= self.max_delay
+        return self.flush() if due else 0
+
+    def flush(self) -> int:
+        """Write all pending fixes in a single transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._oldest_pending = None
+
+        if not batch:
+            return 0
+
+        written = self.db.record_truck_positions(batch)
+        self.total_written += written
+        return written
+
+    def pending_count(self) -> int:
+        """Number of fixes waiting to be written"""
+        with self._lock:
+            return len(self._pending)
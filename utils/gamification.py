@@ -181,8 +181,13 @@ class GamificationSystem:
         conn.close()
     
     def process_waste_disposal(self, user_id: str, bin_type: str = "comum", 
-                             location: str | None = None) -> int:
-        """Process a waste disposal and award points"""
+                             location: str | None = None, bin_id: str | None = None,
+                             coordinates: List[float] | None = None) -> int:
+        """Process a waste disposal and award points
+
+        bin_id and coordinates (where the user disposed) are kept in the
+        activity metadata for bin placement analysis.
+        """
         # Base points for correct disposal
         base_points = 10
         
@@ -205,6 +210,8 @@ class GamificationSystem:
         self._record_user_activity(user_id, "waste_disposal", total_points, {
             'bin_type': bin_type,
             'location': location,
+            'bin_id': bin_id,
+            'coordinates': coordinates,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -0,0 +1,274 @@
+import math
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+import numpy as np
+
+from utils.spatial_index import METERS_PER_DEGREE_LAT, METERS_PER_DEGREE_LON_EQUATOR
+
+# Fixed-point scales: 1e-6 degrees (~0.1 m) and 0.1 km/h
+COORDINATE_SCALE = 1_000_000
+SPEED_SCALE = 10
+
+# Web Mercator ground resolution at the equator, zoom 0 (metres per pixel)
+METERS_PER_PIXEL_ZOOM0 = 156_543.03
+
+# Tolerance of a zoom level, in screen pixels
+SIMPLIFY_PIXELS = 1.5
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """LEB128 bytes of non-negative integers (vectorized over all values)"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b""
+    groups = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    chunks = ((values[:, None] >> groups) & np.uint64(0x7F)).astype(np.uint8)
+    length = 1 + np.count_nonzero((values[:, None] >> groups[1:]) != 0, axis=1)
+    keep = np.arange(10) < length[:, None]
+    more = np.arange(10) < (length - 1)[:, None]
+    return (chunks | (more.astype(np.uint8) << 7))[keep].tobytes()
+
+
+def varint_decode(data: bytes, count: int, offset: int = 0) -> tuple:
+    """count integers from LEB128 bytes at offset; returns (values, next offset)"""
+    raw = np.frombuffer(data, dtype=np.uint8, offset=offset)
+    ends = np.flatnonzero(raw < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError("Truncated varint stream")
+    used = int(ends[-1]) + 1 if count else 0
+    raw = raw[:used].astype(np.uint64)
+    starts = np.r_[0, ends[:-1] + 1] if count else np.zeros(0, dtype=np.int64)
+    shift = (np.arange(used) - np.repeat(starts, ends - starts + 1)).astype(np.uint64) * np.uint64(7)
+    values = np.add.reduceat((raw & np.uint64(0x7F)) << shift, starts) if count else np.zeros(0, dtype=np.uint64)
+    return values.astype(np.uint64), offset + used
+
+
+def encode_trace(seconds: np.ndarray, lat: np.ndarray, lon: np.ndarray, speed: np.ndarray) -> bytes:
+    """Delta + zigzag + varint encoding of one track (columns stored one after another)"""
+    columns = [np.round(np.asarray(seconds, dtype=np.float64)).astype(np.int64),
+               np.round(np.asarray(lat, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64),
+               np.round(np.asarray(lon, dtype=np.float64) * COORDINATE_SCALE).astype(np.int64),
+               np.round(np.nan_to_num(np.asarray(speed, dtype=np.float64)) * SPEED_SCALE).astype(np.int64)]
+    return b"".join(varint_encode(_zigzag(np.diff(column, prepend=0))) for column in columns)
+
+
+def decode_trace(blob: bytes, count: int) -> Dict[str, np.ndarray]:
+    """Inverse of encode_trace: seconds, lat, lon and speed arrays"""
+    columns, offset = [], 0
+    for _ in range(4):
+        values, offset = varint_decode(blob, count, offset)
+        columns.append(np.cumsum(_unzigzag(values)))
+    return {'seconds': columns[0].astype(np.float64),
+            'lat': columns[1] / COORDINATE_SCALE,
+            'lon': columns[2] / COORDINATE_SCALE,
+            'speed': columns[3] / SPEED_SCALE}
+
+
+def douglas_peucker(lat: np.ndarray, lon: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Indices of the points kept by Douglas-Peucker simplification at tolerance_m
+
+    Iterative (explicit stack) so day-long tracks do not hit the recursion
+    limit; the distances of a whole segment are computed at once.
+    """
+    n = len(lat)
+    if n <= 2 or tolerance_m <= 0:
+        return np.arange(n)
+    scale = METERS_PER_DEGREE_LON_EQUATOR * math.cos(math.radians(float(np.mean(lat))))
+    x = np.asarray(lon, dtype=np.float64) * scale
+    y = np.asarray(lat, dtype=np.float64) * METERS_PER_DEGREE_LAT
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        length = math.hypot(dx, dy)
+        if length > 0:
+            distance = np.abs(px * dy - py * dx) / length
+        else:
+            distance = np.hypot(px, py)
+        k = int(np.argmax(distance))
+        if distance[k] > tolerance_m:
+            split = first + 1 + k
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+
+def tolerance_for_zoom(zoom: float, lat: float) -> float:
+    """Simplification tolerance (m) that is SIMPLIFY_PIXELS on screen at a map zoom level"""
+    return SIMPLIFY_PIXELS * METERS_PER_PIXEL_ZOOM0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+class TraceStore:
+    """Compressed per-truck, per-day GPS tracks and simplified polylines for the map.
+
+    Closed days are read from truck_positions and stored as one
+    delta/zigzag/varint blob per truck and day in truck_traces (time, lat,
+    lon and speed; fuel and heading stay in the raw/archived positions), so
+    tracks survive archive_old_data. The current day is read raw. Simplified
+    polylines of stored days are cached in memory.
+    """
+
+    def __init__(self, db_path: str = "ecosmart.db", cache_size: int = 256):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.init_trace_table()
+
+    def init_trace_table(self):
+        """Initialize the compressed traces table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS truck_traces (
+                truck_id TEXT NOT NULL,
+                day TEXT NOT NULL,
+                start_at TEXT NOT NULL,
+                end_at TEXT NOT NULL,
+                points INTEGER NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                encoded BLOB NOT NULL,
+                PRIMARY KEY (truck_id, day)
+            )
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def _raw_day(self, truck_id: str, day: str) -> tuple:
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT recorded_at, lat, lon, speed FROM truck_positions
+            WHERE truck_id = ? AND recorded_at >= ? AND recorded_at < ?
+            ORDER BY recorded_at
+        """, (truck_id, day, (datetime.fromisoformat(day) + timedelta(days=1)).date().isoformat()))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def compress_day(self, truck_id: str, day: str) -> Dict[str, Any] | None:
+        """Encode one truck's positions of a day (YYYY-MM-DD) into truck_traces"""
+        rows = self._raw_day(truck_id, day)
+        if not rows:
+            return None
+        midnight = datetime.fromisoformat(day)
+        seconds = np.array([(datetime.fromisoformat(r[0]) - midnight).total_seconds() for r in rows])
+        blob = encode_trace(seconds, np.array([r[1] for r in rows]), np.array([r[2] for r in rows]),
+                            np.array([r[3] if r[3] is not None else 0.0 for r in rows]))
+        # Size of the same columns as stored in truck_positions (ISO text + three REALs)
+        raw_bytes = sum(len(r[0]) for r in rows) + 24 * len(rows)
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO truck_traces (truck_id, day, start_at, end_at, points, raw_bytes, encoded)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (truck_id, day, rows[0][0], rows[-1][0], len(rows), raw_bytes, blob))
+        conn.commit()
+        conn.close()
+
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == truck_id and k[1] == day]:
+                del self._cache[key]
+        return {'truck_id': truck_id, 'day': day, 'points': len(rows), 'bytes': len(blob), 'raw_bytes': raw_bytes}
+
+    def compress_closed_days(self, days_back: int = 2) -> int:
+        """Compress every truck's last days_back full days (before today); returns tracks written"""
+        today = datetime.now().date()
+        since = (today - timedelta(days=days_back)).isoformat()
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        # Days not stored yet, or with positions that arrived after they were stored
+        cursor.execute("""
+            SELECT p.truck_id, p.day FROM (
+                SELECT truck_id, substr(recorded_at, 1, 10) AS day, COUNT(*) AS points
+                FROM truck_positions
+                WHERE recorded_at >= ? AND recorded_at < ?
+                GROUP BY truck_id, day
+            ) p LEFT JOIN truck_traces t ON t.truck_id = p.truck_id AND t.day = p.day
+            WHERE t.points IS NULL OR t.points != p.points
+        """, (since, today.isoformat()))
+        pending = cursor.fetchall()
+        conn.close()
+
+        return sum(1 for truck_id, day in pending if self.compress_day(truck_id, day) is not None)
+
+    def get_trace(self, truck_id: str, day: str) -> Dict[str, np.ndarray] | None:
+        """Full-resolution track of a truck's day (stored trace, else raw positions)"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT points, encoded FROM truck_traces WHERE truck_id = ? AND day = ?", (truck_id, day))
+        row = cursor.fetchone()
+        conn.close()
+        if row is not None:
+            return decode_trace(row[1], row[0])
+
+        rows = self._raw_day(truck_id, day)
+        if not rows:
+            return None
+        midnight = datetime.fromisoformat(day)
+        return {'seconds': np.array([(datetime.fromisoformat(r[0]) - midnight).total_seconds() for r in rows]),
+                'lat': np.array([r[1] for r in rows], dtype=np.float64),
+                'lon': np.array([r[2] for r in rows], dtype=np.float64),
+                'speed': np.array([r[3] or 0.0 for r in rows], dtype=np.float64)}
+
+    def get_polyline(self, truck_id: str, day: str | None = None, tolerance_m: float | None = None,
+                     zoom: float | None = None) -> List[List[float]]:
+        """Simplified [lat, lon] polyline of a truck's day at tolerance_m (or the tolerance of a zoom level)"""
+        day = day or datetime.now().date().isoformat()
+        closed = day < datetime.now().date().isoformat()
+        key = (truck_id, day, tolerance_m, zoom)
+        if closed:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    return self._cache[key]
+
+        trace = self.get_trace(truck_id, day)
+        if trace is None:
+            return []
+        if tolerance_m is None:
+            tolerance_m = tolerance_for_zoom(zoom, float(trace['lat'][0])) if zoom is not None else 0.0
+        kept = douglas_peucker(trace['lat'], trace['lon'], tolerance_m)
+        polyline = np.column_stack([trace['lat'][kept], trace['lon'][kept]]).round(6).tolist()
+
+        if closed:
+            with self._lock:
+                self._cache[key] = polyline
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return polyline
+
+    def get_storage_stats(self) -> Dict[str, Any]:
+        """Stored tracks, points and compressed vs raw size"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*), COALESCE(SUM(points), 0), COALESCE(SUM(LENGTH(encoded)), 0), "
+                       "COALESCE(SUM(raw_bytes), 0) FROM truck_traces")
+        tracks, points, encoded, raw = cursor.fetchone()
+        conn.close()
+        return {'tracks': tracks, 'points': points, 'bytes': encoded, 'raw_bytes': raw,
+                'bytes_per_point': round(encoded / points, 2) if points else 0.0,
+                'compression_ratio': round(raw / encoded, 1) if encoded else 0.0}
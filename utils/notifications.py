@@ -236,7 +236,33 @@ class NotificationManager:
             data=data,
             expires_hours=6
         )
-    
+
+    def send_overflow_forecast_alert(self, user_id: str, bin_id: str, hours_to_full: float,
+                                     fill_level: float) -> bool:
+        """Send alert for a bin forecast to overflow soon"""
+        title = "⏳ Transbordo Previsto"
+        if hours_to_full <= 0:
+            message = f"Lixeira {bin_id} deve estar cheia agora ({fill_level:.0f}% estimado)"
+        else:
+            message = f"Lixeira {bin_id} deve encher em {hours_to_full:.1f}h ({fill_level:.0f}% agora)"
+
+        data = {
+            'bin_id': bin_id,
+            'fill_level': round(fill_level, 1),
+            'hours_to_full': round(hours_to_full, 1),
+            'priority': 'high' if hours_to_full <= 2 else 'medium',
+            'timestamp': datetime.now().isoformat()
+        }
+
+        return self.send_notification(
+            user_id=user_id,
+            title=title,
+            message=message,
+            notification_type="urgent" if hours_to_full <= 2 else "warning",
+            data=data,
+            expires_hours=max(1, int(hours_to_full) + 1)
+        )
+
     def send_weekly_summary(self, user_id: str, stats: Dict[str, Any]) -> bool:
         """Send weekly summary notification"""
         title = "📊 Resumo Semanal"
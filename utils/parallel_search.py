@@ -0,0 +1,119 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.tsp import iterated_local_search, nearest_neighbour_tour, randomized_nearest_neighbour_tour
+
+# Matrix of the current worker process, attached once by _attach_matrix
+_worker_matrix: np.ndarray | None = None
+_worker_memory: shared_memory.SharedMemory | None = None
+
+
+def _attach_matrix(name: str, shape: Tuple[int, int], dtype: str):
+    """Pool initializer: map the shared distance matrix without copying it"""
+    global _worker_matrix, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_matrix = np.ndarray(shape, dtype=dtype, buffer=_worker_memory.buf)
+
+
+def _run_start(dist: np.ndarray, start_index: int, seed: int, deadline: float | None,
+               max_kicks: int, initial_tour: np.ndarray | None = None) -> Dict[str, Any]:
+    """One start: initial_tour (or plain nearest neighbour) for start 0, randomized for the others"""
+    began = time.perf_counter()
+    rng = np.random.default_rng([seed, start_index])
+    if start_index == 0 and initial_tour is not None:
+        tour = np.asarray(initial_tour, dtype=np.intp)
+    elif start_index == 0:
+        tour = nearest_neighbour_tour(dist, 0)
+    else:
+        tour = randomized_nearest_neighbour_tour(dist, rng, 0)
+    tour, length = iterated_local_search(dist, tour, rng, deadline, max_kicks)
+    return {'start': start_index, 'tour': tour, 'length': length,
+            'seconds': time.perf_counter() - began}
+
+
+def _worker_start(start_index: int, seed: int, deadline: float | None, max_kicks: int,
+                  initial_tour: np.ndarray | None = None) -> Dict[str, Any]:
+    return _run_start(_worker_matrix, start_index, seed, deadline, max_kicks, initial_tour)
+
+
+def default_workers() -> int:
+    return max(1, len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)
+
+
+def multi_start_search(dist: np.ndarray, starts: int = 8, workers: int | None = None,
+                       time_limit: float | None = None, seed: int = 0,
+                       max_kicks: int = 20, initial_tour: np.ndarray | None = None) -> Dict[str, Any]:
+    """Best tour over several randomized starts, run in parallel processes
+
+    The distance matrix is copied once into shared memory and every worker
+    maps it read-only, so the matrix is not pickled per task. Each start is
+    a (randomized) nearest-neighbour tour improved by iterated local search.
+    With workers=1 the starts run in this process. initial_tour (e.g. a
+    warm start) replaces the nearest-neighbour tour of start 0.
+    """
+    began = time.perf_counter()
+    workers = min(workers or default_workers(), starts)
+    # perf_counter is system-wide on Linux, so the deadline is valid in the workers too
+    deadline = began + time_limit if time_limit else None
+
+    if workers <= 1:
+        results = [_run_start(dist, k, seed, deadline, max_kicks, initial_tour if k == 0 else None)
+                   for k in range(starts)]
+    else:
+        matrix = np.ascontiguousarray(dist, dtype=np.float64)
+        memory = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=memory.buf)[:] = matrix
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_matrix,
+                                     initargs=(memory.name, matrix.shape, matrix.dtype.str)) as pool:
+                futures = [pool.submit(_worker_start, k, seed, deadline, max_kicks,
+                                       initial_tour if k == 0 else None) for k in range(starts)]
+                results = [future.result() for future in futures]
+        finally:
+            memory.close()
+            memory.unlink()
+
+    best = min(results, key=lambda r: r['length'])
+    return {
+        'tour': best['tour'],
+        'length': best['length'],
+        'best_start': best['start'],
+        'start_lengths': [round(r['length'], 3) for r in results],
+        'workers': workers,
+        'seconds': time.perf_counter() - began,
+    }
+
+
+def scaling_report(dist: np.ndarray, starts: int = 8, worker_counts: List[int] | None = None,
+                   seed: int = 0, max_kicks: int = 20) -> List[Dict[str, Any]]:
+    """Wall time and speed-up of multi_start_search for each worker count"""
+    worker_counts = worker_counts or sorted({1, 2, 4, default_workers()})
+    report = []
+    baseline = None
+    for workers in worker_counts:
+        result = multi_start_search(dist, starts, workers, seed=seed, max_kicks=max_kicks)
+        baseline = baseline or result['seconds']
+        report.append({
+            'workers': result['workers'],
+            'starts': starts,
+            'seconds': round(result['seconds'], 3),
+            'speedup': round(baseline / result['seconds'], 2),
+            'best_length': round(result['length'], 3),
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from utils.distance_matrix import haversine_matrix
+
+    rng = np.random.default_rng(42)
+    points = np.column_stack([rng.uniform(-23.70, -23.45, 1000), rng.uniform(-46.80, -46.50, 1000)])
+    print(f"{'workers':>8} {'starts':>7} {'seconds':>8} {'speedup':>8} {'best_km':>9}")
+    for row in scaling_report(haversine_matrix(points), starts=8, max_kicks=5):
+        print(f"{row['workers']:>8} {row['starts']:>7} {row['seconds']:>8} {row['speedup']:>8} "
+              f"{row['best_length']:>9}")
@@ -0,0 +1,381 @@
+import hashlib
+import heapq
+import os
+import re
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.distance_matrix import EARTH_RADIUS_KM, haversine_matrix
+from utils.spatial_index import GridIndex
+
+# Default speeds (km/h) for a collection truck by OSM highway class
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 70, 'motorway_link': 45,
+    'trunk': 55, 'trunk_link': 40,
+    'primary': 45, 'primary_link': 35,
+    'secondary': 40, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 30,
+    'unclassified': 30, 'residential': 25,
+    'living_street': 10, 'service': 15, 'road': 25,
+}
+DEFAULT_ROAD_SPEED_KMH = 25
+KM_PER_MILE = 1.609344
+
+# Factor applied to straight-line distance when two points are not connected
+UNREACHABLE_DETOUR = 1.5
+
+# Memory for one batch of SciPy Dijkstra rows (sources x all graph nodes, float64)
+DIJKSTRA_CHUNK_BYTES = 128 * 1024 * 1024
+
+
+class RoadNetwork:
+    """Directed road graph in CSR form, loaded from a local OSM extract.
+
+    Supports OSMnx-style GraphML (stdlib parser) and OSM PBF (needs the
+    optional osmium package). The parsed graph is cached to disk as .npz,
+    keyed by the source file's path, size and mtime, so later loads skip
+    parsing. Points are snapped to their nearest graph node with a grid
+    index; distance matrices use one bounded Dijkstra per source (SciPy's
+    C implementation when installed) and single paths use A*.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 length_km: np.ndarray, time_min: np.ndarray):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.length_km = np.asarray(length_km, dtype=np.float64)
+        self.time_min = np.asarray(time_min, dtype=np.float64)
+        self.index = GridIndex(self.lat, self.lon, cell_m=200.0)
+        self._reverse = None
+        self._max_speed_kmh = float(max(HIGHWAY_SPEEDS_KMH.values()))
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.lat)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    # --- Loading ---
+
+    @classmethod
+    def load(cls, path: str, cache_dir: str = "matrix_cache/road_network") -> "RoadNetwork":
+        """Load a .graphml or .osm.pbf extract, using the preprocessed cache when valid"""
+        stat = os.stat(path)
+        key = hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+        cache_file = os.path.join(cache_dir, f"{key}.npz")
+
+        if os.path.exists(cache_file):
+            data = np.load(cache_file)
+            return cls(data['lat'], data['lon'], data['indptr'], data['indices'],
+                       data['length_km'], data['time_min'])
+
+        if path.endswith(".pbf"):
+            network = cls.from_osm_pbf(path)
+        else:
+            network = cls.from_graphml(path)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(cache_file, lat=network.lat, lon=network.lon, indptr=network.indptr,
+                 indices=network.indices, length_km=network.length_km, time_min=network.time_min)
+        return network
+
+    @classmethod
+    def from_edges(cls, lat: np.ndarray, lon: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                   length_km: np.ndarray, speed_kmh: np.ndarray) -> "RoadNetwork":
+        """Build the CSR graph from directed edge arrays"""
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(lat))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        length_km = np.asarray(length_km, dtype=np.float64)[order]
+        time_min = length_km / np.asarray(speed_kmh, dtype=np.float64)[order] * 60.0
+        return cls(lat, lon, indptr, np.asarray(targets, dtype=np.int64)[order], length_km, time_min)
+
+    @classmethod
+    def from_graphml(cls, path: str) -> "RoadNetwork":
+        """Parse a GraphML road graph (node attributes y/x, edge attribute length in metres)"""
+        keys: Dict[str, str] = {}
+        node_ids: Dict[str, int] = {}
+        lat: List[float] = []
+        lon: List[float] = []
+        edges: List[Tuple[str, str, Dict[str, str]]] = []
+        directed = True
+
+        for _, element in ET.iterparse(path, events=("end",)):
+            tag = element.tag.rsplit('}', 1)[-1]
+            if tag == "key":
+                keys[element.get("id")] = element.get("attr.name")
+            elif tag == "node":
+                attrs = {keys.get(d.get("key")): d.text for d in element if d.tag.endswith("data")}
+                node_ids[element.get("id")] = len(lat)
+                lat.append(float(attrs.get("y") or attrs.get("lat")))
+                lon.append(float(attrs.get("x") or attrs.get("lon")))
+                element.clear()
+            elif tag == "edge":
+                attrs = {keys.get(d.get("key")): d.text for d in element if d.tag.endswith("data")}
+                edges.append((element.get("source"), element.get("target"), attrs))
+                element.clear()
+            elif tag == "graph":
+                directed = element.get("edgedefault", "directed") == "directed"
+
+        coordinates = np.column_stack([lat, lon])
+        sources, targets, lengths, speeds = [], [], [], []
+        for source, target, attrs in edges:
+            u, v = node_ids[source], node_ids[target]
+            length = float(attrs["length"]) / 1000.0 if attrs.get("length") else float(
+                haversine_matrix(coordinates[u], coordinates[v])[0, 0])
+            speed = _edge_speed(attrs.get("highway"), attrs.get("maxspeed"))
+            sources.append(u)
+            targets.append(v)
+            lengths.append(length)
+            speeds.append(speed)
+            oneway = (attrs.get("oneway") or "").lower() in ("true", "yes", "1")
+            if not directed and not oneway:
+                sources.append(v)
+                targets.append(u)
+                lengths.append(length)
+                speeds.append(speed)
+
+        return cls.from_edges(np.array(lat), np.array(lon), np.array(sources), np.array(targets),
+                              np.array(lengths), np.array(speeds))
+
+    @classmethod
+    def from_osm_pbf(cls, path: str) -> "RoadNetwork":
+        """Parse drivable ways from an OSM PBF extract (requires osmium)"""
+        try:
+            import osmium
+        except ImportError as e:
+            raise ImportError("Reading .osm.pbf files requires the 'osmium' package "
+                              "(pip install osmium); GraphML extracts work without it") from e
+
+        node_ids: Dict[int, int] = {}
+        lat: List[float] = []
+        lon: List[float] = []
+        sources, targets, speeds = [], [], []
+
+        class WayHandler(osmium.SimpleHandler):
+            def way(self, way):
+                highway = way.tags.get("highway")
+                if highway not in HIGHWAY_SPEEDS_KMH:
+                    return
+                oneway = way.tags.get("oneway", "no")
+                speed = _edge_speed(highway, way.tags.get("maxspeed"))
+                previous = None
+                for node in way.nodes:
+                    if not node.location.valid():
+                        previous = None
+                        continue
+                    if node.ref not in node_ids:
+                        node_ids[node.ref] = len(lat)
+                        lat.append(node.location.lat)
+                        lon.append(node.location.lon)
+                    current = node_ids[node.ref]
+                    if previous is not None:
+                        forward = (previous, current) if oneway != "-1" else (current, previous)
+                        sources.append(forward[0])
+                        targets.append(forward[1])
+                        speeds.append(speed)
+                        if oneway not in ("yes", "true", "1", "-1"):
+                            sources.append(forward[1])
+                            targets.append(forward[0])
+                            speeds.append(speed)
+                    previous = current
+
+        WayHandler().apply_file(path, locations=True)
+
+        lat_array, lon_array = np.array(lat), np.array(lon)
+        sources_array, targets_array = np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+        lengths = _pairwise_haversine(lat_array[sources_array], lon_array[sources_array],
+                                      lat_array[targets_array], lon_array[targets_array])
+        return cls.from_edges(lat_array, lon_array, sources_array, targets_array, lengths, np.array(speeds))
+
+    # --- Queries ---
+
+    def snap(self, coordinates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest graph node of each [lat, lon] and the snapping distance in km"""
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        nodes, meters = self.index.nearest_many(coordinates[:, 0], coordinates[:, 1])
+        return nodes, meters / 1000.0
+
+    def _weights(self, weight: str) -> np.ndarray:
+        return self.length_km if weight == "length" else self.time_min
+
+    def _reversed(self) -> "RoadNetwork":
+        if self._reverse is None:
+            sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            order = np.argsort(self.indices, kind='stable')
+            counts = np.bincount(self.indices, minlength=self.num_nodes)
+            reverse = RoadNetwork.__new__(RoadNetwork)
+            reverse.lat, reverse.lon = self.lat, self.lon
+            reverse.indptr = np.concatenate(([0], np.cumsum(counts)))
+            reverse.indices = sources[order]
+            reverse.length_km = self.length_km[order]
+            reverse.time_min = self.time_min[order]
+            reverse.index = self.index
+            reverse._reverse = self
+            reverse._max_speed_kmh = self._max_speed_kmh
+            self._reverse = reverse
+        return self._reverse
+
+    def _dijkstra(self, source: int, targets: np.ndarray, weight: str) -> np.ndarray:
+        """Distances from source to targets, stopping once every target is settled"""
+        weights = self._weights(weight)
+        indptr, indices = self.indptr, self.indices
+        best = {source: 0.0}
+        remaining = set(int(t) for t in targets)
+        settled = set()
+        heap = [(0.0, source)]
+
+        while heap and remaining:
+            cost, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            remaining.discard(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = int(indices[edge])
+                candidate = cost + weights[edge]
+                if candidate < best.get(neighbour, np.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+
+        return np.array([best.get(int(t), np.inf) if int(t) in settled else np.inf for t in targets])
+
+    def many_to_many(self, sources: np.ndarray, targets: np.ndarray, weight: str = "length") -> np.ndarray:
+        """Shortest-path cost matrix (len(sources) x len(targets)) between graph nodes
+
+        Runs from whichever side is smaller, on the reversed graph when that
+        is the target side. SciPy returns each source's distances to every
+        node, so sources are processed in chunks of DIJKSTRA_CHUNK_BYTES and
+        only the target columns are kept.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if len(targets) < len(sources):
+            return self._reversed().many_to_many(targets, sources, weight).T
+
+        unique_sources, source_inverse = np.unique(sources, return_inverse=True)
+        try:
+            from scipy.sparse import csr_matrix
+            from scipy.sparse.csgraph import dijkstra
+        except ImportError:
+            rows = np.array([self._dijkstra(int(s), targets, weight) for s in unique_sources])
+        else:
+            graph = csr_matrix((self._weights(weight), self.indices, self.indptr),
+                               shape=(self.num_nodes, self.num_nodes))
+            chunk = max(1, DIJKSTRA_CHUNK_BYTES // (8 * max(self.num_nodes, 1)))
+            rows = np.empty((len(unique_sources), len(targets)))
+            for first in range(0, len(unique_sources), chunk):
+                batch = unique_sources[first:first + chunk]
+                rows[first:first + len(batch)] = dijkstra(graph, directed=True, indices=batch)[:, targets]
+        return rows.reshape(len(unique_sources), len(targets))[source_inverse]
+
+    def shortest_path(self, source: int, target: int, weight: str = "length") -> Tuple[List[int], float]:
+        """A* shortest path between two graph nodes: (node list, cost)"""
+        weights = self._weights(weight)
+        target_point = np.array([[self.lat[target], self.lon[target]]])
+        scale = 1.0 if weight == "length" else 60.0 / self._max_speed_kmh
+
+        def heuristic(node: int) -> float:
+            return float(haversine_matrix([[self.lat[node], self.lon[node]]], target_point)[0, 0]) * scale
+
+        best = {source: 0.0}
+        parent = {source: -1}
+        heap = [(heuristic(source), 0.0, source)]
+        closed = set()
+
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                path = [node]
+                while parent[path[-1]] != -1:
+                    path.append(parent[path[-1]])
+                return path[::-1], cost
+            if node in closed:
+                continue
+            closed.add(node)
+            for edge in range(self.indptr[node], self.indptr[node + 1]):
+                neighbour = int(self.indices[edge])
+                candidate = cost + weights[edge]
+                if candidate < best.get(neighbour, np.inf):
+                    best[neighbour] = candidate
+                    parent[neighbour] = node
+                    heapq.heappush(heap, (candidate + heuristic(neighbour), candidate, neighbour))
+
+        return [], np.inf
+
+    def path_geometry(self, origin: List[float], destination: List[float]) -> List[List[float]]:
+        """[lat, lon] polyline along the roads between two points"""
+        (source, target), _ = self.snap(np.array([origin, destination]))
+        path, cost = self.shortest_path(int(source), int(target))
+        if not np.isfinite(cost):
+            return [list(origin), list(destination)]
+        return [list(origin)] + [[float(self.lat[n]), float(self.lon[n])] for n in path] + [list(destination)]
+
+    def costs(self, origins: np.ndarray, destinations: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Road distance (km) and duration (min) matrices between [lat, lon] points
+
+        Has the cost_fn signature of DistanceMatrixStore. Snapping offsets are
+        added at both ends; disconnected pairs fall back to a detoured
+        straight-line estimate.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        origin_nodes, origin_offset = self.snap(origins)
+        destination_nodes, destination_offset = self.snap(destinations)
+        offset = origin_offset[:, None] + destination_offset[None, :]
+
+        distance = self.many_to_many(origin_nodes, destination_nodes, "length") + offset
+        duration = self.many_to_many(origin_nodes, destination_nodes, "time") + offset / DEFAULT_ROAD_SPEED_KMH * 60
+
+        unreachable = ~np.isfinite(distance)
+        if unreachable.any():
+            fallback = haversine_matrix(origins, destinations) * UNREACHABLE_DETOUR
+            distance[unreachable] = fallback[unreachable]
+            duration[unreachable] = fallback[unreachable] / DEFAULT_ROAD_SPEED_KMH * 60
+        same_point = haversine_matrix(origins, destinations) < 1e-9
+        distance[same_point] = 0.0
+        duration[same_point] = 0.0
+        return distance, duration
+
+    def summary(self) -> Dict[str, Any]:
+        return {'nodes': self.num_nodes, 'edges': self.num_edges,
+                'total_length_km': round(float(self.length_km.sum()), 1)}
+
+
+def _first_tag_value(value: str | None) -> str | None:
+    """First value of an OSM tag that may be an OSMnx list ("['50', '40']") or ';'-separated"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.startswith("["):
+        value = value.strip("[]").split(",")[0]
+    return value.split(";")[0].strip(" '\"") or None
+
+
+def _edge_speed(highway: str | None, maxspeed: str | None) -> float:
+    """Truck speed on an edge from its maxspeed tag (km/h or mph) or highway class"""
+    highway = _first_tag_value(highway)
+    class_speed = HIGHWAY_SPEEDS_KMH.get(highway or "", DEFAULT_ROAD_SPEED_KMH)
+    maxspeed = _first_tag_value(maxspeed)
+    if maxspeed:
+        number = re.search(r"\d+(?:\.\d+)?", maxspeed)
+        if number:
+            speed = float(number.group())
+            if "mph" in maxspeed.lower():
+                speed *= KM_PER_MILE
+            return float(min(speed, HIGHWAY_SPEEDS_KMH.get(highway or "", 60)))
+    return float(class_speed)
+
+
+def _pairwise_haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Element-wise great-circle distance in km"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
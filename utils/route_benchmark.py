@@ -0,0 +1,326 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Any
+
+import numpy as np
+
+from utils.distance_matrix import haversine_matrix
+from utils.parallel_search import multi_start_search
+from utils.route_instances import generate_city_instance
+from utils.route_optimizer import RouteOptimizer
+from utils.tsp import iterated_local_search, local_search, nearest_neighbour_tour, tour_length
+
+# Optimal tour lengths of common TSPLIB instances (TSPLIB distance conventions)
+TSPLIB_OPTIMA = {
+    'eil51': 426, 'berlin52': 7542, 'st70': 675, 'eil76': 538, 'pr76': 108159,
+    'kroA100': 21282, 'kroB100': 22141, 'kroC100': 20749, 'kroD100': 21294, 'kroE100': 22068,
+    'rd100': 7910, 'eil101': 629, 'lin105': 14379, 'ch130': 6110, 'ch150': 6528,
+    'kroA150': 26524, 'kroA200': 29368, 'a280': 2579, 'pcb442': 50778, 'att532': 27686,
+    'rat783': 8806, 'pr1002': 259045, 'pr2392': 378032, 'pcb3038': 137694,
+    'fnl4461': 182566, 'rl5915': 565530, 'usa13509': 19982859, 'd15112': 1573084,
+    'd18512': 645238,
+}
+
+# Beyond this many stops the single-matrix TSP configurations are skipped
+MAX_MATRIX_STOPS = 5000
+
+FIELDS = ['instance', 'source', 'stops', 'config', 'cost', 'best_known', 'gap_pct', 'seconds',
+          'peak_memory_mb', 'memory_scope', 'unassigned', 'status']
+
+# Configurations that solve in worker processes, whose memory tracemalloc does not see
+WORKER_PROCESS_CONFIGS = {'multi_start', 'districts'}
+
+
+def parse_tsplib(path: str) -> Dict[str, Any]:
+    """Read a TSPLIB .tsp file: name, distance matrix (TSPLIB rounding) and coordinates if any
+
+    Supports NODE_COORD_SECTION with EUC_2D, CEIL_2D, ATT and GEO weights and
+    EXPLICIT weights as FULL_MATRIX, UPPER_ROW, LOWER_ROW, UPPER_DIAG_ROW or
+    LOWER_DIAG_ROW.
+    """
+    header: Dict[str, str] = {}
+    coordinates: List[List[float]] = []
+    weights: List[float] = []
+    section = None
+
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == "EOF":
+                continue
+            if line.endswith("_SECTION"):
+                section = line
+                continue
+            if ":" in line:
+                key, _, value = line.partition(":")
+                header[key.strip().upper()] = value.strip()
+                section = None
+                continue
+            if section == "NODE_COORD_SECTION":
+                parts = line.split()
+                coordinates.append([float(parts[1]), float(parts[2])])
+            elif section == "EDGE_WEIGHT_SECTION":
+                weights.extend(float(v) for v in line.split())
+
+    n = int(header['DIMENSION'])
+    kind = header.get('EDGE_WEIGHT_TYPE', 'EUC_2D').upper()
+    if kind == "EXPLICIT":
+        dist = _explicit_matrix(weights, n, header.get('EDGE_WEIGHT_FORMAT', 'FULL_MATRIX').upper())
+        points = None
+    else:
+        points = np.array(coordinates[:n], dtype=np.float64)
+        dist = tsplib_distances(points, kind)
+
+    return {'name': header.get('NAME', os.path.splitext(os.path.basename(path))[0]),
+            'dist': dist, 'coordinates': points, 'stops': n}
+
+
+def tsplib_distances(points: np.ndarray, kind: str) -> np.ndarray:
+    """Distance matrix with the TSPLIB rounding rules of an edge weight type"""
+    dx = points[:, None, 0] - points[None, :, 0]
+    dy = points[:, None, 1] - points[None, :, 1]
+    if kind == "EUC_2D":
+        return np.floor(np.sqrt(dx ** 2 + dy ** 2) + 0.5)
+    if kind == "CEIL_2D":
+        return np.ceil(np.sqrt(dx ** 2 + dy ** 2))
+    if kind == "ATT":
+        r = np.sqrt((dx ** 2 + dy ** 2) / 10.0)
+        t = np.floor(r + 0.5)
+        return np.where(t < r, t + 1, t)
+    if kind == "GEO":
+        degrees = np.trunc(points)
+        radians = math.pi * (degrees + 5.0 * (points - degrees) / 3.0) / 180.0
+        lat, lon = radians[:, 0], radians[:, 1]
+        q1 = np.cos(lon[:, None] - lon[None, :])
+        q2 = np.cos(lat[:, None] - lat[None, :])
+        q3 = np.cos(lat[:, None] + lat[None, :])
+        dist = np.floor(6378.388 * np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1)) + 1.0)
+        np.fill_diagonal(dist, 0.0)
+        return dist
+    raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {kind}")
+
+
+def _explicit_matrix(weights: List[float], n: int, layout: str) -> np.ndarray:
+    values = np.array(weights, dtype=np.float64)
+    if layout == "FULL_MATRIX":
+        return values[:n * n].reshape(n, n)
+    dist = np.zeros((n, n))
+    diagonal = layout.endswith("DIAG_ROW")
+    upper = layout.startswith("UPPER")
+    rows, cols = np.triu_indices(n, 0 if diagonal else 1) if upper else np.tril_indices(n, 0 if diagonal else -1)
+    dist[rows, cols] = values[:len(rows)]
+    return np.maximum(dist, dist.T)
+
+
+# --- Solver configurations ---
+
+def _tsp_nearest_neighbour(dist: np.ndarray, time_limit: float, seed: int) -> np.ndarray:
+    return nearest_neighbour_tour(dist, 0)
+
+
+def _tsp_local_search(dist: np.ndarray, time_limit: float, seed: int) -> np.ndarray:
+    return local_search(dist, nearest_neighbour_tour(dist, 0), time.perf_counter() + time_limit)
+
+
+def _tsp_iterated(dist: np.ndarray, time_limit: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return iterated_local_search(dist, nearest_neighbour_tour(dist, 0), rng,
+                                 time.perf_counter() + time_limit, max_kicks=10 ** 6)[0]
+
+
+def _tsp_multi_start(dist: np.ndarray, time_limit: float, seed: int) -> np.ndarray:
+    return multi_start_search(dist, starts=4, time_limit=time_limit, seed=seed, max_kicks=10 ** 6)['tour']
+
+
+TSP_CONFIGS: Dict[str, Callable] = {
+    'nearest_neighbour': _tsp_nearest_neighbour,
+    'local_search': _tsp_local_search,
+    'iterated_local_search': _tsp_iterated,
+    'multi_start': _tsp_multi_start,
+}
+
+# Fleet (CVRP) configurations: RouteOptimizer call per configuration
+FLEET_CONFIGS: Dict[str, Callable] = {
+    'savings': lambda o, bins, fleet, t: o.calculate_fleet_routes(bins, fleet, 0, time_limit=t),
+    'alns': lambda o, bins, fleet, t: o.calculate_fleet_routes(bins, fleet, 0, time_limit=t, method="alns"),
+    'districts': lambda o, bins, fleet, t: o.calculate_city_routes(bins, fleet, 0, time_limit=max(t / 10, 1.0)),
+}
+
+# Fleet configurations that build one matrix over all stops
+FULL_MATRIX_CONFIGS = {'savings', 'alns'}
+
+
+def _measure(func: Callable, *args) -> tuple:
+    """Run func and return (result, seconds, peak traced memory in MB)
+
+    tracemalloc slows Python code several times over, so the timed run is
+    untraced and peak memory comes from a second, traced run. Only this
+    process is traced (see WORKER_PROCESS_CONFIGS).
+    """
+    began = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - began
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def _memory_scope(config: str) -> str:
+    return "main_process_only" if config in WORKER_PROCESS_CONFIGS else "process"
+
+
+def _gap(cost: float, best: float | None) -> float | None:
+    if best is None or best <= 0 or cost is None:
+        return None
+    return round((cost / best - 1) * 100, 3)
+
+
+def run_tsp_instance(name: str, source: str, dist: np.ndarray, configs: List[str], time_limit: float,
+                     seed: int = 0, best_known: float | None = None) -> List[Dict[str, Any]]:
+    """Run the TSP configurations on one distance matrix"""
+    rows = []
+    for config in configs:
+        row = {'instance': name, 'source': source, 'stops': dist.shape[0], 'config': config,
+               'best_known': best_known, 'unassigned': 0}
+        tour, seconds, peak = _measure(TSP_CONFIGS[config], dist, time_limit, seed)
+        valid = sorted(int(n) for n in tour) == list(range(dist.shape[0]))
+        row.update(cost=round(tour_length(dist, tour), 3), seconds=round(seconds, 3),
+                   peak_memory_mb=round(peak, 1), memory_scope=_memory_scope(config),
+                   status='ok' if valid else 'invalid_tour')
+        rows.append(row)
+    return rows
+
+
+def run_fleet_instance(name: str, bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]],
+                       configs: List[str], time_limit: float) -> List[Dict[str, Any]]:
+    """Run the fleet configurations on one generated city"""
+    optimizer = RouteOptimizer(fill_threshold=0)
+    rows = []
+    for config in configs:
+        row = {'instance': name, 'source': 'generated_fleet', 'stops': len(bins), 'config': config,
+               'best_known': None}
+        if config in FULL_MATRIX_CONFIGS and len(bins) > MAX_MATRIX_STOPS:
+            row.update(cost=None, seconds=None, peak_memory_mb=None, unassigned=None, status='skipped')
+            rows.append(row)
+            continue
+        result, seconds, peak = _measure(FLEET_CONFIGS[config], optimizer, bins, fleet, time_limit)
+        row.update(cost=result['total_distance_km'], seconds=round(seconds, 3), peak_memory_mb=round(peak, 1),
+                   memory_scope=_memory_scope(config), unassigned=len(result['unassigned']), status='ok')
+        rows.append(row)
+    return rows
+
+
+def fill_gaps(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Gap to the best known cost; instances without one use the best result of the run
+
+    Rows that left stops unassigned get no gap: a partial solution is
+    cheaper and would show a misleading negative gap.
+    """
+    best_in_run: Dict[str, float] = {}
+    for row in rows:
+        if row['status'] == 'ok' and not row.get('unassigned'):
+            best_in_run[row['instance']] = min(best_in_run.get(row['instance'], np.inf), row['cost'])
+    for row in rows:
+        if row['best_known'] is None and row['instance'] in best_in_run:
+            row['best_known'] = best_in_run[row['instance']]
+        complete = row['status'] == 'ok' and not row.get('unassigned')
+        row['gap_pct'] = _gap(row['cost'], row['best_known']) if complete else None
+    return rows
+
+
+def write_reports(rows: List[Dict[str, Any]], output_dir: str) -> Dict[str, str]:
+    """Write benchmark rows as CSV and JSON; returns the file paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_path = os.path.join(output_dir, f"route_benchmark_{stamp}.csv")
+    json_path = os.path.join(output_dir, f"route_benchmark_{stamp}.json")
+
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field) for field in FIELDS})
+    with open(json_path, 'w') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'results': rows}, f, indent=2)
+    return {'csv': csv_path, 'json': json_path}
+
+
+def run_benchmark(tsplib_files: List[str] | None = None, sizes: List[int] | None = None,
+                  tsp_configs: List[str] | None = None, fleet_configs: List[str] | None = None,
+                  time_limit: float = 10.0, seed: int = 0,
+                  best_known: Dict[str, float] | None = None) -> List[Dict[str, Any]]:
+    """Run every configuration on TSPLIB files and generated instances of the given sizes"""
+    tsp_configs = tsp_configs if tsp_configs is not None else list(TSP_CONFIGS)
+    fleet_configs = fleet_configs if fleet_configs is not None else list(FLEET_CONFIGS)
+    known = dict(TSPLIB_OPTIMA, **(best_known or {}))
+    rows: List[Dict[str, Any]] = []
+
+    for path in tsplib_files or []:
+        instance = parse_tsplib(path)
+        configs = tsp_configs if instance['stops'] <= MAX_MATRIX_STOPS else []
+        rows += run_tsp_instance(instance['name'], 'tsplib', instance['dist'], configs, time_limit, seed,
+                                 known.get(instance['name']))
+
+    for size in sizes or []:
+        bins, fleet = generate_city_instance(size, seed=seed)
+        if size <= MAX_MATRIX_STOPS and tsp_configs:
+            points = [[-23.5505, -46.6333]] + [b['coordinates'] for b in bins]
+            rows += run_tsp_instance(f"city{size}_tsp", 'generated_tsp', haversine_matrix(points),
+                                     tsp_configs, time_limit, seed, known.get(f"city{size}_tsp"))
+        if fleet_configs:
+            rows += run_fleet_instance(f"city{size}_fleet", bins, fleet, fleet_configs, time_limit)
+
+    return fill_gaps(rows)
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark the EcoSmart route optimizer")
+    parser.add_argument("--tsplib", nargs="*", default=[], help="TSPLIB .tsp files")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[50, 200, 1000],
+                        help="generated city sizes (stops), e.g. 50 1000 20000")
+    parser.add_argument("--tsp-configs", nargs="*", default=list(TSP_CONFIGS), choices=list(TSP_CONFIGS))
+    parser.add_argument("--fleet-configs", nargs="*", default=list(FLEET_CONFIGS), choices=list(FLEET_CONFIGS))
+    parser.add_argument("--time-limit", type=float, default=10.0, help="seconds per solver run")
+    parser.add_argument("--best-known", help="JSON file mapping instance name to best known cost")
+    parser.add_argument("--output-dir", default="benchmark_reports")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    best_known = None
+    if args.best_known:
+        with open(args.best_known) as f:
+            best_known = json.load(f)
+
+    rows = run_benchmark(args.tsplib, args.sizes, args.tsp_configs, args.fleet_configs,
+                         args.time_limit, args.seed, best_known)
+    paths = write_reports(rows, args.output_dir)
+
+    print(f"{'instance':<22} {'config':<22} {'stops':>6} {'cost':>12} {'gap_%':>8} {'sec':>8} {'MB':>8}")
+    for row in rows:
+        cost = f"{row['cost']:.1f}" if row['cost'] is not None else row['status']
+        gap = f"{row['gap_pct']:.2f}" if row['gap_pct'] is not None else "-"
+        seconds = f"{row['seconds']:.2f}" if row['seconds'] is not None else "-"
+        memory = f"{row['peak_memory_mb']:.1f}" if row['peak_memory_mb'] is not None else "-"
+        if row.get('memory_scope') == "main_process_only":
+            memory += "*"
+        print(f"{row['instance']:<22} {row['config']:<22} {row['stops']:>6} {cost:>12} {gap:>8} "
+              f"{seconds:>8} {memory:>8}")
+    if any(row.get('memory_scope') == "main_process_only" for row in rows):
+        print("\n* memory of the main process only; worker processes are not counted")
+    print(f"\nReports: {paths['csv']}, {paths['json']}")
+
+
+if __name__ == "__main__":
+    main()
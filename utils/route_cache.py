@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Tuple
+
+
+def route_fingerprint(bins: List[Dict[str, Any]], constraints: Dict[str, Any], matrix_version: Any) -> str:
+    """Hash of the bin set (IDs and coordinates), the routing constraints and the cost matrix version"""
+    items = sorted((str(b['id']), round(b['coordinates'][0], 6), round(b['coordinates'][1], 6)) for b in bins)
+    payload = json.dumps([items, constraints, matrix_version], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def constraints_fingerprint(constraints: Dict[str, Any], matrix_version: Any) -> str:
+    """Hash of the constraints alone: entries with the same one can warm-start each other"""
+    return hashlib.sha1(json.dumps([constraints, matrix_version], sort_keys=True, default=str).encode()).hexdigest()
+
+
+class RouteCache:
+    """Optimized routes cached in memory (LRU) and on disk (one JSON file per route).
+
+    Entries are keyed by route_fingerprint. An index of every entry's bin IDs
+    lets similar() find the cached route whose bin set overlaps most with a
+    new request under the same constraints, to be used as a warm start.
+    """
+
+    def __init__(self, path: str = "matrix_cache/routes", max_entries: int = 128,
+                 max_disk_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.index_file = os.path.join(path, "index.json")
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+        self._index: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file) as f:
+                    self._index = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._index = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        """Cached result for a fingerprint, from memory or disk"""
+        with self._lock:
+            result = self._load(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def _load(self, key: str) -> Dict[str, Any] | None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if key in self._index and os.path.exists(self._file(key)):
+            with open(self._file(key)) as f:
+                result = json.load(f)
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key: str, result: Dict[str, Any], bin_ids: List[str], group: str):
+        """Store a result; group is the constraints_fingerprint used for warm-start lookups"""
+        with self._lock:
+            self._remember(key, result)
+            temporary = self._file(key) + ".tmp"
+            with open(temporary, 'w') as f:
+                json.dump(result, f, default=_to_json)
+            os.replace(temporary, self._file(key))
+
+            self._index[key] = {'bin_ids': sorted(bin_ids), 'group': group, 'stored_at': time.time()}
+            if len(self._index) > self.max_disk_entries:
+                for old in sorted(self._index, key=lambda k: self._index[k]['stored_at'])[
+                        :len(self._index) - self.max_disk_entries]:
+                    self._index.pop(old)
+                    self._memory.pop(old, None)
+                    if os.path.exists(self._file(old)):
+                        os.remove(self._file(old))
+            self._save_index()
+
+    def similar(self, bin_ids: List[str], group: str, min_overlap: float = 0.5) -> Tuple[str, Dict[str, Any]] | None:
+        """Cached (key, result) with the largest Jaccard overlap of bin IDs, if at least min_overlap"""
+        wanted = set(bin_ids)
+        best_key, best_overlap = None, min_overlap
+        with self._lock:
+            for key, entry in self._index.items():
+                if entry['group'] != group:
+                    continue
+                cached = set(entry['bin_ids'])
+                overlap = len(wanted & cached) / max(len(wanted | cached), 1)
+                if overlap >= best_overlap:
+                    best_key, best_overlap = key, overlap
+            if best_key is None:
+                return None
+            result = self._load(best_key)
+        return (best_key, result) if result is not None else None
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index):
+                if os.path.exists(self._file(key)):
+                    os.remove(self._file(key))
+            self._index.clear()
+            self._memory.clear()
+            self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'entries': len(self._index), 'in_memory': len(self._memory),
+                'hits': self.hits, 'misses': self.misses}
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _save_index(self):
+        temporary = self.index_file + ".tmp"
+        with open(temporary, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(temporary, self.index_file)
+
+
+def _to_json(value):
+    """JSON fallback for NumPy scalars in route results"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
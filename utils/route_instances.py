@@ -0,0 +1,65 @@
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+
+from utils.route_optimizer import DEFAULT_DEPOT
+
+# Bounding box of the generated city (greater São Paulo)
+CITY_BOUNDS = ((-23.75, -23.40), (-46.85, -46.45))
+
+WASTE_TYPES = ['comum', 'reciclavel', 'organico']
+NAME_PREFIXES = ['Rua', 'Avenida', 'Praça', 'Escola', 'Hospital', 'Mercado', 'Parque']
+
+
+def generate_city_instance(num_bins: int, num_trucks: int | None = None, seed: int = 0,
+                           clustered: float = 0.7, capacity_kg: float = 8000.0,
+                           min_fill: float = 80.0) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Random city with bins (in the format of Database.get_all_bins) and a fleet
+
+    A share of the bins (clustered) sits around a few neighbourhood centres,
+    the rest is spread uniformly. Every bin is at or above min_fill so all of
+    them are due. Names use the SERVICE_WINDOWS keywords (escola, hospital,
+    mercado) for some bins, so time windows appear as in production. With no
+    num_trucks, enough trucks are provided to carry the estimated load with
+    ~25% slack.
+    """
+    rng = np.random.default_rng(seed)
+    (lat_min, lat_max), (lon_min, lon_max) = CITY_BOUNDS
+
+    num_clustered = int(num_bins * clustered)
+    centres = np.column_stack([rng.uniform(lat_min, lat_max, max(num_bins // 150, 3)),
+                               rng.uniform(lon_min, lon_max, max(num_bins // 150, 3))])
+    around = centres[rng.integers(0, len(centres), num_clustered)] + rng.normal(0, 0.012, (num_clustered, 2))
+    spread = np.column_stack([rng.uniform(lat_min, lat_max, num_bins - num_clustered),
+                              rng.uniform(lon_min, lon_max, num_bins - num_clustered)])
+    coordinates = np.vstack([around, spread])
+    rng.shuffle(coordinates)
+
+    fill = rng.uniform(min_fill, 100.0, num_bins)
+    waste = rng.choice(WASTE_TYPES, num_bins, p=[0.6, 0.25, 0.15])
+    prefixes = rng.choice(NAME_PREFIXES, num_bins, p=[0.45, 0.3, 0.1, 0.04, 0.02, 0.04, 0.05])
+
+    bins = [{
+        'id': f"GEN{i:05d}",
+        'name': f"{prefixes[i]} {i}",
+        'location': f"{prefixes[i]} {i}, São Paulo",
+        'coordinates': [round(float(coordinates[i, 0]), 6), round(float(coordinates[i, 1]), 6)],
+        'fill_level': round(float(fill[i]), 1),
+        'battery_level': int(rng.integers(20, 100)),
+        'waste_type': str(waste[i]),
+        'status': 'active',
+    } for i in range(num_bins)]
+
+    if num_trucks is None:
+        from utils.route_optimizer import RouteOptimizer
+        total_load = sum(RouteOptimizer().estimate_load(b) for b in bins)
+        num_trucks = max(1, int(np.ceil(total_load * 1.25 / capacity_kg)))
+
+    fleet = [{
+        'truck_id': f"TRUCK_{k + 1:03d}",
+        'driver': None,
+        'capacity_kg': capacity_kg,
+        'depot': list(DEFAULT_DEPOT),
+        'shift_hours': 10.0,
+    } for k in range(num_trucks)]
+    return bins, fleet
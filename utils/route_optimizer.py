@@ -1,366 +1,656 @@
 import json
+import os
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-import random
+from typing import Callable, Dict, Iterator, List, Any, Sequence
+
+import numpy as np
+
+from utils.alns import solve_alns
+from utils.distance_matrix import DistanceMatrixStore, haversine_matrix
+from utils.gps_trace import douglas_peucker
+from utils.parallel_search import multi_start_search
+from utils.route_cache import RouteCache, constraints_fingerprint, route_fingerprint
+from utils.tsp import anytime_tsp, cheapest_insertion, nearest_neighbour_tour, local_search, tour_length
+from utils.vrp import RoutingProblem, RoutingSolution, solve_cvrp
+
+# Main EcoSmart depot (São Paulo), used when no depot is given
+DEFAULT_DEPOT = [-23.5505, -46.6333]
+
+# Defaults used to turn fill levels into truck load
+DEFAULT_BIN_VOLUME_LITERS = 1000
+WASTE_DENSITY_KG_PER_LITER = {
+    'comum': 0.15,
+    'reciclavel': 0.06,
+    'organico': 0.45,
+}
+WASTE_TYPES = list(WASTE_DENSITY_KG_PER_LITER)
+DEFAULT_SERVICE_MINUTES = 3.0
+DEFAULT_SHIFT_HOURS = 8.0
+DEFAULT_SHIFT_START = "06:00"
+DEFAULT_SPEED_KMH = 25.0
+DEFAULT_UNLOAD_MINUTES = 15.0
+
+# Service windows (start, end, service minutes) for bins whose name contains
+# the keyword; a bin's own time_window/service_minutes take precedence
+SERVICE_WINDOWS = {
+    'escola': ("09:00", "11:30", 5.0),
+    'hospital': ("06:00", "09:00", 8.0),
+    'mercado': ("05:00", "08:00", 6.0),
+}
+
+
+def parse_clock(value) -> float:
+    """Minutes since midnight from 'HH:MM' (numbers are taken as minutes already)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    hours, minutes = str(value).split(":")[:2]
+    return int(hours) * 60.0 + int(minutes)
+
+
+def format_clock(minutes: float) -> str:
+    """'HH:MM' from minutes since midnight"""
+    minutes = int(round(minutes))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
 
-class RouteOptimizer:
-    def __init__(self, db_path: str = "ecosmart.db"):
-        # Se esta classe for apenas para otimização e não para gerenciar DB,
-        # você pode simplificar o __init__ ou adaptá-lo para a lógica de rotas.
-        self.db_path = db_path
-        # ... inicialização de lógica de otimização de rotas (ex: APIs de mapa)
-        pass
 
 class RouteOptimizer:
-    def __init__(self, db_path: str = "ecosmart.db"):
-        # Se esta classe for apenas para otimização e não para gerenciar DB,
-        # você pode simplificar o __init__ ou adaptá-lo para a lógica de rotas.
-        self.db_path = db_path
-        # ... inicialização de lógica de otimização de rotas (ex: APIs de mapa)
-        pass
-class RouteOptimizer:
-    def __init__(self, db_path: str = "ecosmart.db"):
-        # Se esta classe for apenas para otimização e não para gerenciar DB,
-        # você pode simplificar o __init__ ou adaptá-lo para a lógica de rotas.
+    def __init__(self, db_path: str = "ecosmart.db", fill_threshold: int = 80,
+                 matrix_store: DistanceMatrixStore | None = None, road_network=None,
+                 route_cache: RouteCache | None = None, forecaster=None):
         self.db_path = db_path
-        # ... inicialização de lógica de otimização de rotas (ex: APIs de mapa)
-        pass
+        self.fill_threshold = fill_threshold
+        self.matrix_store = matrix_store
+        self.road_network = road_network
+        self.route_cache = route_cache
+        self.forecaster = forecaster
 
-    def calculate_optimal_route(self, bins_for_collection):
-        """
-        Recebe uma lista de lixeiras e retorna a rota otimizada.
-        """
-        # Implemente aqui o algoritmo de otimização de rotas (ex: TSP).
-        
-        # Por enquanto, apenas um placeholder para resolver o erro:
-        print(f"Calculando rota para {len(bins_for_collection)} lixeiras...")
-        return bins_for_collection
-
-    
-    def init_notifications_table(self):
-        """Initialize notifications table in database"""
+    def load_fleet(self) -> List[Dict[str, Any]]:
+        """Active trucks from the database as a fleet definition"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                notification_type TEXT DEFAULT 'info',
-                is_read BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP,
-                data TEXT
-            )
+            SELECT truck_id, driver, capacity_kg, depot
+            FROM trucks
+            WHERE status = 'active'
+            ORDER BY truck_id
         """)
         
-        conn.commit()
-        conn.close()
-    
-    def send_notification(self, user_id: str, title: str, message: str, 
-                         notification_type: str = "info", data: Dict | None = None, 
-                         expires_hours: int = 24) -> bool:
-        """Send a notification to a user"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            expires_at = datetime.now() + timedelta(hours=expires_hours)
-            data_json = json.dumps(data) if data else None
-            
-            cursor.execute("""
-                INSERT INTO notifications (user_id, title, message, notification_type, expires_at, data)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (user_id, title, message, notification_type, expires_at, data_json))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"Error sending notification: {e}")
-            return False
-    
-    def get_user_notifications(self, user_id: str, limit: int = 10, 
-                             only_unread: bool = False) -> List[Dict[str, Any]]:
-        """Get notifications for a specific user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        query = """
-            SELECT id, title, message, notification_type, is_read, created_at, data
-            FROM notifications
-            WHERE user_id = ? AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
-        """
-        params = [user_id]
-        
-        if only_unread:
-            query += " AND is_read = FALSE"
-        
-        query += " ORDER BY created_at DESC LIMIT ?"
-        params.append(str(limit))
-        
-        cursor.execute(query, params)
-        
-        notifications = []
+        fleet = []
         for row in cursor.fetchall():
-            data = json.loads(row[6]) if row[6] else {}
-            notifications.append({
-                'id': row[0],
-                'title': row[1],
-                'message': row[2],
-                'type': row[3],
-                'is_read': bool(row[4]),
-                'created_at': row[5],
-                'data': data
+            fleet.append({
+                'truck_id': row[0],
+                'driver': row[1],
+                'capacity_kg': row[2],
+                'depot': json.loads(row[3]) if row[3] else DEFAULT_DEPOT,
+                'shift_hours': DEFAULT_SHIFT_HOURS,
+                'avg_speed_kmh': DEFAULT_SPEED_KMH
             })
         
         conn.close()
-        return notifications
-    
-    def mark_as_read(self, notification_id: int) -> bool:
-        """Mark a notification as read"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE notifications
-                SET is_read = TRUE
-                WHERE id = ?
-            """, (notification_id,))
-            
-            conn.commit()
-            conn.close()
-            return True
-            
-        except Exception as e:
-            print(f"Error marking notification as read: {e}")
-            return False
-    
-    def get_unread_count(self, user_id: str) -> int:
-        """Get count of unread notifications for user"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM notifications
-            WHERE user_id = ? AND is_read = FALSE 
-            AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
-        """, (user_id,))
-        
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count
-    
-    def send_points_notification(self, user_id: str, points: int, action: str) -> bool:
-        """Send notification when user earns points"""
-        title = "🎉 Pontos Ganhos!"
-        message = f"Você ganhou {points} pontos por {action}!"
-        
-        data = {
-            'points_earned': points,
-            'action': action,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="success",
-            data=data,
-            expires_hours=48
-        )
-    
-    def send_level_up_notification(self, user_id: str, new_level: int) -> bool:
-        """Send notification when user levels up"""
-        title = "🎊 Level Up!"
-        message = f"Parabéns! Você subiu para o nível {new_level}!"
-        
-        data = {
-            'new_level': new_level,
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="success",
-            data=data,
-            expires_hours=72
-        )
-    
-    def send_achievement_notification(self, user_id: str, achievement: Dict[str, Any]) -> bool:
-        """Send notification when user unlocks an achievement"""
-        title = f"🏆 Nova Conquista: {achievement['title']}"
-        message = f"Você desbloqueou: {achievement['description']}"
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="achievement",
-            data=achievement,
-            expires_hours=168  # 1 week
-        )
-    
-    def send_reward_notification(self, user_id: str, reward: Dict[str, Any]) -> bool:
-        """Send notification when user redeems a reward"""
-        title = f"🎁 Recompensa Resgatada!"
-        message = f"Você resgatou: {reward['name']}"
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="info",
-            data=reward,
-            expires_hours=240  # 10 days
-        )
-    
-    def send_maintenance_alert(self, user_id: str, bin_id: str, issue: str) -> bool:
-        """Send maintenance alert to administrators"""
-        title = "🔧 Alerta de Manutenção"
-        message = f"Lixeira {bin_id} necessita manutenção: {issue}"
-        
-        data = {
-            'bin_id': bin_id,
-            'issue': issue,
-            'priority': 'medium',
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="warning",
-            data=data,
-            expires_hours=24
-        )
-    
-    def send_collection_alert(self, user_id: str, bin_id: str, fill_level: int) -> bool:
-        """Send collection needed alert"""
-        title = "🚛 Coleta Necessária"
-        message = f"Lixeira {bin_id} está {fill_level}% cheia e necessita coleta"
-        
-        data = {
-            'bin_id': bin_id,
-            'fill_level': fill_level,
-            'priority': 'high' if fill_level >= 90 else 'medium',
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="urgent" if fill_level >= 90 else "warning",
-            data=data,
-            expires_hours=6
-        )
-    
-    def send_weekly_summary(self, user_id: str, stats: Dict[str, Any]) -> bool:
-        """Send weekly summary notification"""
-        title = "📊 Resumo Semanal"
-        message = f"Esta semana: {stats['disposals']} descartes, {stats['points']} pontos ganhos!"
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="info",
-            data=stats,
-            expires_hours=168
-        )
-    
-    def send_challenge_notification(self, user_id: str, challenge: Dict[str, Any]) -> bool:
-        """Send notification about new challenge"""
-        title = "🎯 Novo Desafio!"
-        message = f"{challenge['title']} - {challenge['reward']} pontos"
-        
-        return self.send_notification(
-            user_id=user_id,
-            title=title,
-            message=message,
-            notification_type="challenge",
-            data=challenge,
-            expires_hours=168
-        )
-    
-    def cleanup_expired_notifications(self):
-        """Remove expired notifications from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            DELETE FROM notifications
-            WHERE expires_at IS NOT NULL AND expires_at < CURRENT_TIMESTAMP
-        """)
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        conn.close()
-        
-        return deleted_count
-    
-    def get_notification_stats(self) -> Dict[str, Any]:
-        """Get overall notification statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Total notifications
-        cursor.execute("SELECT COUNT(*) FROM notifications")
-        total = cursor.fetchone()[0]
-        
-        # Unread notifications
-        cursor.execute("SELECT COUNT(*) FROM notifications WHERE is_read = FALSE")
-        unread = cursor.fetchone()[0]
-        
-        # Notifications by type
-        cursor.execute("""
-            SELECT notification_type, COUNT(*)
-            FROM notifications
-            GROUP BY notification_type
-        """)
-        
-        by_type = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        conn.close()
-        
+        return fleet
+
+    def estimate_load(self, bin_item: Dict[str, Any]) -> float:
+        """Estimated waste in a bin (kg) from its fill level, volume and waste type"""
+        volume = bin_item.get('volume_liters') or DEFAULT_BIN_VOLUME_LITERS
+        density = WASTE_DENSITY_KG_PER_LITER.get(bin_item.get('waste_type', 'comum'), 0.15)
+        return bin_item.get('fill_level', 0) / 100.0 * volume * density
+
+    def service_window(self, bin_item: Dict[str, Any]) -> tuple:
+        """(window start, window end, service minutes) of a bin, in minutes"""
+        window = bin_item.get('time_window')
+        service = bin_item.get('service_minutes')
+
+        if window is None or service is None:
+            name = bin_item.get('name', '').lower()
+            for keyword, (start, end, default_service) in SERVICE_WINDOWS.items():
+                if keyword in name:
+                    window = window if window is not None else (start, end)
+                    service = service if service is not None else default_service
+                    break
+
+        if service is None:
+            service = DEFAULT_SERVICE_MINUTES
+        if window is None:
+            return 0.0, np.inf, float(service)
+        return parse_clock(window[0]), parse_clock(window[1]), float(service)
+
+    def apply_forecast(self, bins: List[Dict[str, Any]], service_time: datetime | None = None
+                       ) -> List[Dict[str, Any]]:
+        """Bins with fill_level predicted at service_time (mid-shift from now by default)
+
+        Without a forecaster the bins are returned unchanged. The measured
+        level is kept in current_fill_level.
+        """
+        if self.forecaster is None:
+            return bins
+        if service_time is None:
+            service_time = datetime.now() + timedelta(hours=DEFAULT_SHIFT_HOURS / 2)
+        return self.forecaster.forecast(bins, service_time)
+
+    def select_bins(self, bins: List[Dict[str, Any]], fill_threshold: int | None = None) -> List[Dict[str, Any]]:
+        """Bins whose fill level is at or above the collection threshold"""
+        threshold = self.fill_threshold if fill_threshold is None else fill_threshold
+        return [b for b in bins if b.get('fill_level', 0) >= threshold]
+
+    def cost_matrix(self, depots: List[Sequence[float]], bins: List[Dict[str, Any]]) -> np.ndarray:
+        """Distance matrix in km over the depots followed by the bins
+
+        With a matrix store the rows come from its persisted matrix (only new
+        or moved bins are computed); otherwise the matrix is computed here,
+        over the road network when one is set and straight-line if not.
+        """
+        if self.matrix_store is None:
+            coordinates = np.array(list(depots) + [b['coordinates'] for b in bins], dtype=np.float64)
+            if self.road_network is not None:
+                return self.road_network.costs(coordinates, coordinates)[0]
+            return haversine_matrix(coordinates)
+
+        items = [(f"depot:{d[0]:.6f},{d[1]:.6f}", d) for d in depots]
+        items += [(b['id'], b['coordinates']) for b in bins]
+        self.matrix_store.sync(items)
+        return self.matrix_store.submatrix([item_id for item_id, _ in items])
+
+    def point_costs(self, coordinates: np.ndarray, point: Sequence[float]) -> tuple:
+        """Distances in km from every [lat, lon] row to point, and from point to every row
+
+        Uses the same cost model as cost_matrix, for adding a single stop to
+        an existing problem without rebuilding its matrix.
+        """
+        coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        point = np.asarray(point, dtype=np.float64).reshape(1, 2)
+        if self.matrix_store is not None:
+            cost_fn = self.matrix_store.cost_fn
+        elif self.road_network is not None:
+            cost_fn = self.road_network.costs
+        else:
+            return haversine_matrix(coordinates, point)[:, 0], haversine_matrix(point, coordinates)[0]
+        return cost_fn(coordinates, point)[0][:, 0], cost_fn(point, coordinates)[0][0]
+
+    def matrix_version(self) -> str:
+        """Identifies the cost model, so cached routes are not reused across matrix changes"""
+        if self.matrix_store is not None:
+            return f"store:{os.path.abspath(self.matrix_store.path)}:{self.matrix_store.version}"
+        if self.road_network is not None:
+            summary = self.road_network.summary()
+            return f"road:{summary['nodes']}:{summary['edges']}:{summary['total_length_km']}"
+        return "haversine"
+
+    def _cached_route(self, cached: Dict[str, Any], bins: List[Dict[str, Any]], start: float) -> Dict[str, Any]:
+        """A cached route result with stops refreshed from the current bin data"""
+        current = {b['id']: b for b in bins}
+
+        def refresh(stops):
+            return [dict(stop, **current.get(stop['id'], {})) for stop in stops]
+
+        result = dict(cached, cache='hit', solve_time_s=round(time.perf_counter() - start, 3))
+        if 'routes' in cached:
+            result['routes'] = [dict(route, stops=refresh(route['stops'])) for route in cached['routes']]
+            result['unassigned'] = refresh(cached['unassigned'])
+        else:
+            result['stops'] = refresh(cached['stops'])
+        return result
+
+    def route_geometry(self, route: Dict[str, Any], tolerance_m: float = 0.0) -> List[List[float]]:
+        """[lat, lon] polyline of a route: depot, stops (and unload trips) in order and back
+
+        Legs follow the streets when a road network is set and are straight
+        lines otherwise; the path is simplified with Douglas-Peucker at
+        tolerance_m.
+        """
+        unloads: Dict[int, List[List[float]]] = {}
+        for unload in route.get('unloads', []):
+            unloads.setdefault(unload['after_stop'], []).append(unload['coordinates'])
+        waypoints = [list(route['depot'])]
+        for index, stop in enumerate(route['stops']):
+            waypoints += unloads.get(index, [])
+            waypoints.append(list(stop['coordinates']))
+        waypoints += unloads.get(len(route['stops']), [])
+        waypoints.append(list(route['depot']))
+
+        if self.road_network is None:
+            path = waypoints
+        else:
+            path = waypoints[:1]
+            for origin, destination in zip(waypoints[:-1], waypoints[1:]):
+                path += self.road_network.path_geometry(origin, destination)[1:]
+
+        path = np.array(path, dtype=np.float64)
+        kept = douglas_peucker(path[:, 0], path[:, 1], tolerance_m)
+        return path[kept].round(6).tolist()
+
+    def build_distance_matrix(self, depot: Sequence[float], bins: List[Dict[str, Any]]) -> np.ndarray:
+        """Distance matrix in km; row/column 0 is the depot, i + 1 is bins[i]"""
+        return self.cost_matrix([depot], bins)
+
+    def calculate_optimal_route(self, bins_for_collection: List[Dict[str, Any]],
+                                depot: Sequence[float] | None = None,
+                                fill_threshold: int | None = None,
+                                time_limit: float | None = None,
+                                starts: int = 1, workers: int | None = None,
+                                service_time: datetime | None = None) -> Dict[str, Any]:
+        """
+        Recebe uma lista de lixeiras e retorna a rota otimizada.
+
+        Bins above the fill threshold are visited in a closed tour that starts
+        and ends at the depot: a nearest-neighbour tour improved with 2-opt and
+        Or-opt. With starts > 1, that many randomized starts are searched on a
+        process pool and the shortest tour is kept. Returns the ordered stops,
+        with the distance from the previous stop, and the total route distance
+        in km. With a forecaster, bins are selected by their predicted fill
+        level at service_time.
+        """
+        start = time.perf_counter()
+        depot = list(depot) if depot is not None else DEFAULT_DEPOT
+        selected = self.select_bins(self.apply_forecast(bins_for_collection, service_time), fill_threshold)
+
+        if not selected:
+            return self._route_result(depot, [], np.array([0]), np.zeros((1, 1)), 0.0, start)
+
+        constraints = {'kind': 'tour', 'depot': depot}
+        cached, warm = self._tour_cache_lookup(selected, constraints)
+        if cached is not None:
+            return self._cached_route(cached, selected, start)
+
+        dist = self.build_distance_matrix(depot, selected)
+        deadline = start + time_limit if time_limit else None
+
+        initial = nearest_neighbour_tour(dist, 0)
+        initial_km = tour_length(dist, initial)
+        if warm is not None:
+            initial = self._warm_tour(dist, selected, warm)
+
+        if starts > 1:
+            remaining = deadline - time.perf_counter() if deadline else None
+            # One start continues from the warm-start tour, the others are randomized
+            tour = multi_start_search(dist, starts, workers, time_limit=remaining,
+                                      initial_tour=initial if warm is not None else None)['tour']
+        else:
+            tour = local_search(dist, initial, deadline)
+
+        result = self._route_result(depot, selected, tour, dist, initial_km, start)
+        if self.route_cache is not None:
+            self._tour_cache_put(selected, constraints, result)
+            result = dict(result, cache='warm' if warm is not None else 'miss')
+        return result
+
+    def _tour_cache_lookup(self, selected: List[Dict[str, Any]], constraints: Dict[str, Any]) -> tuple:
+        """(cached result, similar cached entry) for a tour request; both None without a route cache"""
+        if self.route_cache is None:
+            return None, None
+        version = self.matrix_version()
+        cached = self.route_cache.get(route_fingerprint(selected, constraints, version))
+        if cached is not None:
+            return cached, None
+        return None, self.route_cache.similar([b['id'] for b in selected],
+                                              constraints_fingerprint(constraints, version))
+
+    def _tour_cache_put(self, selected: List[Dict[str, Any]], constraints: Dict[str, Any], result: Dict[str, Any]):
+        # Building the matrix may have bumped the store version: key on the version used
+        version = self.matrix_version()
+        self.route_cache.put(route_fingerprint(selected, constraints, version), result,
+                             [b['id'] for b in selected], constraints_fingerprint(constraints, version))
+
+    def _warm_tour(self, dist: np.ndarray, selected: List[Dict[str, Any]], warm: tuple) -> np.ndarray:
+        """Keep the cached visiting order of the bins still due and insert the new ones"""
+        node_of = {b['id']: index + 1 for index, b in enumerate(selected)}
+        kept = [node_of[stop['id']] for stop in warm[1]['stops'] if stop['id'] in node_of]
+        missing = sorted(set(node_of.values()) - set(kept))
+        return cheapest_insertion(dist, [0] + kept, missing)
+
+    def iter_optimal_route(self, bins_for_collection: List[Dict[str, Any]],
+                           depot: Sequence[float] | None = None,
+                           fill_threshold: int | None = None,
+                           time_budget: float = 10.0, cancel=None,
+                           on_improvement: Callable[[Dict[str, Any]], None] | None = None,
+                           service_time: datetime | None = None) -> Iterator[Dict[str, Any]]:
+        """
+        Versão "anytime" de calculate_optimal_route.
+
+        Yields a route right after construction and then each better route
+        found within time_budget seconds; stops early when cancel (e.g. a
+        threading.Event) is set. Every yielded route is also passed to
+        on_improvement when given. With a route cache, a cached route for the
+        same bins is yielded alone, a similar one seeds the search, and a
+        search that used its whole budget is cached.
+        """
+        start = time.perf_counter()
+        depot = list(depot) if depot is not None else DEFAULT_DEPOT
+        selected = self.select_bins(self.apply_forecast(bins_for_collection, service_time), fill_threshold)
+
+        if not selected:
+            result = self._route_result(depot, [], np.array([0]), np.zeros((1, 1)), 0.0, start)
+            if on_improvement:
+                on_improvement(result)
+            yield result
+            return
+
+        constraints = {'kind': 'tour', 'depot': depot}
+        cached, warm = self._tour_cache_lookup(selected, constraints)
+        if cached is not None:
+            result = self._cached_route(cached, selected, start)
+            if on_improvement:
+                on_improvement(result)
+            yield result
+            return
+
+        dist = self.build_distance_matrix(depot, selected)
+        initial = self._warm_tour(dist, selected, warm) if warm is not None else None
+        initial_km = tour_length(dist, nearest_neighbour_tour(dist, 0)) if warm is not None else None
+        remaining = max(time_budget - (time.perf_counter() - start), 0.0)
+        result = None
+        for tour, length in anytime_tsp(dist, remaining, cancel, initial_tour=initial):
+            initial_km = length if initial_km is None else initial_km
+            result = self._route_result(depot, selected, tour, dist, initial_km, start)
+            if self.route_cache is not None:
+                result['cache'] = 'warm' if warm is not None else 'miss'
+            if on_improvement:
+                on_improvement(result)
+            yield result
+
+        # A cancelled search is not cached: its route may be far from the budget's best
+        if self.route_cache is not None and result is not None and not (cancel is not None and cancel.is_set()):
+            self._tour_cache_put(selected, constraints, result)
+
+    def _route_result(self, depot: Sequence[float], bins: List[Dict[str, Any]], tour: np.ndarray,
+                      dist: np.ndarray, initial_km: float, start: float) -> Dict[str, Any]:
+        """Format a depot-rooted tour over matrix indices as a route description"""
+        stops = []
+        previous = 0
+        for number, node in enumerate(tour[1:], start=1):
+            stop = dict(bins[node - 1])
+            stop['stop_number'] = number
+            stop['distance_from_previous_km'] = round(float(dist[previous, node]), 3)
+            stops.append(stop)
+            previous = node
+
+        total_km = tour_length(dist, tour)
         return {
-            'total_notifications': total,
-            'unread_notifications': unread,
-            'read_rate': ((total - unread) / total * 100) if total > 0 else 0,
-            'notifications_by_type': by_type
+            'depot': list(depot),
+            'stops': stops,
+            'num_stops': len(stops),
+            'return_to_depot_km': round(float(dist[previous, 0]), 3),
+            'total_distance_km': round(total_km, 3),
+            'initial_distance_km': round(initial_km, 3),
+            'improvement_pct': round((1 - total_km / initial_km) * 100, 2) if initial_km > 0 else 0.0,
+            'solve_time_s': round(time.perf_counter() - start, 3)
         }
-    
-    def simulate_push_notification(self, user_id: str, title: str, message: str) -> Dict[str, Any]:
-        """Simulate sending a push notification (for demo purposes)"""
-        # In a real implementation, this would integrate with push notification services
-        # like Firebase Cloud Messaging, Apple Push Notification service, etc.
-        
-        notification_payload = {
-            'to': user_id,
-            'title': title,
-            'body': message,
-            'data': {
-                'timestamp': datetime.now().isoformat(),
-                'app': 'EcoSmart',
-                'type': 'gamification'
+
+    def calculate_fleet_routes(self, bins_for_collection: List[Dict[str, Any]],
+                               fleet: List[Dict[str, Any]] | None = None,
+                               fill_threshold: int | None = None,
+                               time_limit: float | None = None,
+                               method: str = "savings",
+                               service_time: datetime | None = None,
+                               facilities: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
+        """Capacitated routes for several trucks (one route per truck)
+
+        Each truck in fleet has truck_id, capacity_kg, depot and optionally
+        shift_start ('HH:MM'), shift_hours, avg_speed_kmh and compartments
+        ({waste_type: kg}) or waste_types (dedicated trucks); by default the
+        active trucks in the database are used. Bin loads are estimated from
+        fill level, volume and waste type. Bins with a service window (their
+        own time_window or a SERVICE_WINDOWS keyword) are only served inside
+        it. Routes come from a savings construction followed by inter-route
+        relocate/swap and intra-route 2-opt/Or-opt. method="alns" continues
+        from there with adaptive large-neighbourhood search for the rest of
+        time_limit (30 s by default), which pays off on large instances.
+        With a forecaster, selection and loads use fill levels predicted at
+        service_time. facilities are unload points (transfer stations,
+        cooperatives) with id, coordinates and optionally unload_minutes:
+        with them, capacity_kg is per trip and trucks unload at the nearest
+        facility on their way whenever the next stop would not fit.
+        """
+        start = time.perf_counter()
+        fleet = fleet if fleet is not None else self.load_fleet()
+        selected = self.select_bins(self.apply_forecast(bins_for_collection, service_time), fill_threshold)
+        if not fleet:
+            raise ValueError("Fleet definition is empty")
+
+        if method not in ("savings", "alns"):
+            raise ValueError(f"Unknown routing method: {method}")
+
+        cache_key = warm = None
+        if self.route_cache is not None:
+            constraints = {
+                'kind': 'fleet', 'method': method,
+                'fleet': [[t.get('truck_id'), t.get('capacity_kg'), t.get('depot'), t.get('shift_start'),
+                           t.get('shift_hours'), t.get('avg_speed_kmh'), t.get('compartments'),
+                           t.get('waste_types')] for t in fleet],
+                'facilities': [[f.get('id'), f['coordinates'], f.get('unload_minutes')] for f in facilities or []],
             }
-        }
-        
-        # Simulate successful delivery
+            # Loads follow fill levels; 5% steps keep small sensor noise from missing the cache
+            fills = {b['id']: int(round(b.get('fill_level', 0) / 5.0)) * 5 for b in selected}
+            cache_key = route_fingerprint(selected, dict(constraints, fill=fills), self.matrix_version())
+            cached = self.route_cache.get(cache_key)
+            if cached is not None:
+                return self._cached_route(cached, selected, start)
+            warm = self.route_cache.similar([b['id'] for b in selected],
+                                            constraints_fingerprint(constraints, self.matrix_version()))
+
+        problem = self.build_routing_problem(selected, fleet, facilities)
+        initial_routes = None
+        if warm is not None:
+            offset = int(problem.customers[0]) if len(problem.customers) else 0
+            node_of = {b['id']: offset + index for index, b in enumerate(selected)}
+            cached_routes = {route['truck_id']: route['stops'] for route in warm[1]['routes']}
+            initial_routes = [[node_of[stop['id']] for stop in cached_routes.get(truck.get('truck_id'), [])
+                               if stop['id'] in node_of] for truck in fleet]
+
+        if method == "alns":
+            solution, _ = solve_alns(problem, time_limit or 30.0, initial_routes=initial_routes)
+        else:
+            solution = solve_cvrp(problem, time_limit, initial_routes)
+
+        result = self._fleet_result(problem, solution, selected, fleet, start, facilities)
+        if cache_key is not None:
+            version = self.matrix_version()
+            self.route_cache.put(route_fingerprint(selected, dict(constraints, fill=fills), version), result,
+                                 [b['id'] for b in selected], constraints_fingerprint(constraints, version))
+            result = dict(result, cache='warm' if warm is not None else 'miss')
+        return result
+
+    def calculate_city_routes(self, bins_for_collection: List[Dict[str, Any]],
+                              fleet: List[Dict[str, Any]] | None = None,
+                              fill_threshold: int | None = None,
+                              district_size: int = 400, partition: str = "kmeans",
+                              workers: int | None = None, time_limit: float | None = None,
+                              service_time: datetime | None = None) -> Dict[str, Any]:
+        """City-wide routes by decomposition into districts (for 10k+ bins)
+
+        See utils.decomposition.solve_by_districts; time_limit applies per district.
+        """
+        from utils.decomposition import solve_by_districts
+
+        fleet = fleet if fleet is not None else self.load_fleet()
+        if not fleet:
+            raise ValueError("Fleet definition is empty")
+        selected = self.select_bins(self.apply_forecast(bins_for_collection, service_time), fill_threshold)
+        return solve_by_districts(self, selected, fleet, district_size, partition, workers, time_limit)
+
+    def stream_index(self, bin_item: Dict[str, Any]) -> int:
+        """Position of a bin's waste type in WASTE_TYPES ('comum' if unknown)"""
+        waste_type = bin_item.get('waste_type', 'comum')
+        return WASTE_TYPES.index(waste_type) if waste_type in WASTE_TYPES else 0
+
+    def truck_compartments(self, truck: Dict[str, Any]) -> List[float]:
+        """Capacity in kg per waste type (WASTE_TYPES order) of a truck in a stream-aware fleet
+
+        A truck with compartments ({waste_type: kg}) keeps each stream in its
+        own compartment; a truck with waste_types is dedicated to those
+        streams; any other truck carries only 'comum'.
+        """
+        capacity = truck.get('capacity_kg', 8000)
+        if truck.get('compartments'):
+            return [float(truck['compartments'].get(w, 0.0)) for w in WASTE_TYPES]
+        streams = truck.get('waste_types') or ['comum']
+        return [float(capacity) if w in streams else 0.0 for w in WASTE_TYPES]
+
+    def fleet_depots(self, fleet: List[Dict[str, Any]]) -> List[List[float]]:
+        """Distinct depots of a fleet, in order of first use (node order of the routing problem)"""
+        depots = []
+        for truck in fleet:
+            depot = list(truck.get('depot') or DEFAULT_DEPOT)
+            if depot not in depots:
+                depots.append(depot)
+        return depots
+
+    def build_routing_problem(self, bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]],
+                              facilities: List[Dict[str, Any]] | None = None) -> RoutingProblem:
+        """Routing problem whose first nodes are the fleet's distinct depots, then the unload
+        facilities, followed by the bins
+
+        If any truck declares compartments or waste_types, loads are also
+        tracked per waste type so streams are never mixed (see
+        truck_compartments).
+        """
+        depots = self.fleet_depots(fleet)
+        facilities = facilities or []
+        dist = self.cost_matrix(depots + [list(f['coordinates']) for f in facilities], bins)
+        size = dist.shape[0]
+        offset = len(depots) + len(facilities)
+
+        demand = np.zeros(size)
+        service = np.zeros(size)
+        window_start = np.zeros(size)
+        window_end = np.full(size, np.inf)
+        for index, bin_item in enumerate(bins):
+            demand[offset + index] = self.estimate_load(bin_item)
+            window_start[offset + index], window_end[offset + index], service[offset + index] = \
+                self.service_window(bin_item)
+
+        compartment_demand = compartment_capacity = None
+        if any(t.get('compartments') or t.get('waste_types') for t in fleet):
+            stream = np.array([self.stream_index(b) for b in bins], dtype=np.intp)
+            compartment_demand = np.zeros((size, len(WASTE_TYPES)))
+            compartment_demand[np.arange(offset, size), stream] = demand[offset:]
+            compartment_capacity = np.array([self.truck_compartments(t) for t in fleet])
+
+        return RoutingProblem(
+            dist=dist,
+            customers=list(range(offset, offset + len(bins))),
+            demand=demand,
+            vehicle_depot=[depots.index(list(t.get('depot') or DEFAULT_DEPOT)) for t in fleet],
+            vehicle_capacity=[t.get('capacity_kg', 8000) for t in fleet],
+            vehicle_speed_kmh=[t.get('avg_speed_kmh', DEFAULT_SPEED_KMH) for t in fleet],
+            vehicle_shift_min=[t.get('shift_hours', DEFAULT_SHIFT_HOURS) * 60.0 for t in fleet],
+            service_min=service,
+            window_start=window_start,
+            window_end=window_end,
+            vehicle_shift_start_min=[parse_clock(t.get('shift_start', DEFAULT_SHIFT_START)) for t in fleet],
+            compartment_demand=compartment_demand,
+            compartment_capacity=compartment_capacity,
+            unload_nodes=list(range(len(depots), offset)),
+            unload_min=max([f.get('unload_minutes', DEFAULT_UNLOAD_MINUTES) for f in facilities],
+                           default=DEFAULT_UNLOAD_MINUTES)
+        )
+
+    def _fleet_result(self, problem: RoutingProblem, solution: RoutingSolution,
+                      bins: List[Dict[str, Any]], fleet: List[Dict[str, Any]], start: float,
+                      facilities: List[Dict[str, Any]] | None = None) -> Dict[str, Any]:
+        """Format a routing solution as one route description per truck"""
+        offset = int(problem.customers[0]) if len(problem.customers) else 0
+        first_facility = int(problem.unload_nodes[0]) if problem.has_unloads else offset
+        routes = []
+        for vehicle, truck in enumerate(fleet):
+            route = solution.routes[vehicle]
+            previous = int(problem.vehicle_depot[vehicle])
+            stops = []
+            for number, node in enumerate(route, start=1):
+                stop = dict(bins[node - offset])
+                stop['stop_number'] = number
+                stop['load_kg'] = round(float(problem.demand[node]), 1)
+                stop['distance_from_previous_km'] = round(float(problem.dist[previous, node]), 3)
+                stop['arrival_time'] = format_clock(solution.start_time[node])
+                if np.isfinite(problem.window_end[node]):
+                    stop['service_window'] = [format_clock(problem.window_start[node]),
+                                              format_clock(problem.window_end[node])]
+                stops.append(stop)
+                previous = node
+
+            capacity = float(problem.vehicle_capacity[vehicle])
+            routes.append({
+                'truck_id': truck.get('truck_id', f"TRUCK_{vehicle + 1:03d}"),
+                'driver': truck.get('driver'),
+                'depot': list(truck.get('depot') or DEFAULT_DEPOT),
+                'stops': stops,
+                'num_stops': len(stops),
+                'load_kg': round(float(solution.load[vehicle]), 1),
+                'capacity_kg': capacity,
+                'utilization_pct': round(float(solution.load[vehicle]) / capacity * 100, 1) if capacity else 0.0,
+                'distance_km': round(float(solution.distance[vehicle]), 3),
+                'duration_min': round(float(solution.duration(vehicle)), 1),
+                'shift_start': format_clock(problem.vehicle_shift_start[vehicle]),
+                'return_time': format_clock(solution.return_time[vehicle]) if route else None
+            })
+            if problem.has_unloads:
+                unloads = problem.route_unloads(vehicle, route)
+                routes[-1]['unloads'] = [{'facility': facilities[node - first_facility].get('id'),
+                                          'coordinates': list(facilities[node - first_facility]['coordinates']),
+                                          'after_stop': served, 'arrival_time': format_clock(arrival)}
+                                         for node, served, arrival in unloads]
+                routes[-1]['num_trips'] = len(unloads)
+                for index, stop in enumerate(stops):
+                    stop['trip'] = 1 + sum(served <= index for _, served, _ in unloads)
+            if solution.compartment_load is not None:
+                routes[-1]['load_by_type_kg'] = {w: round(float(kg), 1) for w, kg in
+                                                 zip(WASTE_TYPES, solution.compartment_load[vehicle])}
+
         return {
-            'status': 'sent',
-            'message_id': f"msg_{random.randint(1000, 9999)}",
-            'delivered_at': datetime.now().isoformat(),
-            'payload': notification_payload
+            'routes': routes,
+            'unassigned': [bins[node - offset] for node in solution.unassigned],
+            'total_distance_km': round(solution.total_distance(), 3),
+            'solve_time_s': round(time.perf_counter() - start, 3)
         }
+
+
+class AnytimeRouteJob:
+    """Runs iter_optimal_route in a background thread and keeps the latest route
+
+    Meant for pages that redraw periodically: they read latest (the best
+    route so far) and done, and may cancel() to keep the current route.
+    """
+
+    def __init__(self, optimizer: RouteOptimizer, bins: List[Dict[str, Any]],
+                 depot: Sequence[float] | None = None, time_budget: float = 10.0):
+        self.time_budget = time_budget
+        self.latest: Dict[str, Any] | None = None
+        self.improvements = 0
+        self.error: str | None = None
+        self.started_at = time.time()
+        self._cancel = threading.Event()
+        self._first_route = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(optimizer, bins, depot), name="anytime-route", daemon=True)
+        self._thread.start()
+
+    def _run(self, optimizer: RouteOptimizer, bins: List[Dict[str, Any]], depot):
+        try:
+            for result in optimizer.iter_optimal_route(bins, depot, time_budget=self.time_budget,
+                                                       cancel=self._cancel):
+                self.latest = result
+                self.improvements += 1
+                self._first_route.set()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self._first_route.set()
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    def wait_first(self, timeout: float | None = None) -> Dict[str, Any] | None:
+        """Block until the first route is available (or the job ends)"""
+        self._first_route.wait(timeout)
+        return self.latest
+
+    def cancel(self):
+        self._cancel.set()
@@ -0,0 +1,269 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any
+
+from utils.collection_detector import CollectionDetector
+from utils.dispatch import DispatchManager
+from utils.fill_forecast import FillForecaster
+from utils.gps_trace import TraceStore
+from utils.route_optimizer import RouteOptimizer
+
+
+class Job:
+    """A periodic job and its timing metrics"""
+
+    def __init__(self, name: str, func: Callable[[], Any], interval_seconds: float,
+                 run_immediately: bool = False):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.next_run = time.monotonic() + (0 if run_immediately else interval_seconds)
+        self.running = False
+
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.last_result = None
+        self.last_error = None
+        self.last_run_at = None
+
+    def metrics(self) -> Dict[str, Any]:
+        """Timing metrics of this job"""
+        return {
+            'job': self.name,
+            'interval_seconds': self.interval_seconds,
+            'runs': self.runs,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'overruns': self.overruns,
+            'running': self.running,
+            'last_seconds': round(self.last_seconds, 4),
+            'avg_seconds': round(self.total_seconds / self.runs, 4) if self.runs else 0.0,
+            'max_seconds': round(self.max_seconds, 4),
+            'last_run_at': self.last_run_at,
+            'last_result': self.last_result,
+            'last_error': self.last_error
+        }
+
+
+class JobScheduler:
+    """In-process periodic job scheduler, independent of Streamlit reruns.
+
+    Jobs run on a small thread pool so one slow job does not delay the
+    others. If a job is still running when it becomes due again, that run is
+    skipped and counted instead of piling up. Only the process holding the
+    leader lease in the database runs jobs, so several Streamlit workers (or
+    pages) can start a scheduler safely.
+    """
+
+    def __init__(self, db_path: str = "ecosmart.db", tick_seconds: float = 1.0,
+                 lease_seconds: float = 30.0, max_workers: int = 4):
+        self.db_path = db_path
+        self.tick_seconds = tick_seconds
+        self.lease_seconds = lease_seconds
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, Job] = {}
+        self.is_leader = False
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ecosmart-job")
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.init_lease_table()
+
+    def init_lease_table(self):
+        """Initialize the leader lease table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def add_job(self, name: str, func: Callable[[], Any], interval_seconds: float,
+                run_immediately: bool = False) -> Job:
+        """Register a periodic job"""
+        job = Job(name, func, interval_seconds, run_immediately)
+        with self._lock:
+            self.jobs[name] = job
+        return job
+
+    def try_acquire_leadership(self) -> bool:
+        """Take or renew the leader lease; returns whether this scheduler leads"""
+        now = time.time()
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            cursor = conn.cursor()
+
+            cursor.execute("""
+                INSERT OR IGNORE INTO scheduler_leases (name, owner, expires_at)
+                VALUES ('leader', ?, ?)
+            """, (self.node_id, now + self.lease_seconds))
+            cursor.execute("""
+                UPDATE scheduler_leases
+                SET owner = ?, expires_at = ?
+                WHERE name = 'leader' AND (owner = ? OR expires_at < ?)
+            """, (self.node_id, now + self.lease_seconds, self.node_id, now))
+            cursor.execute("SELECT owner FROM scheduler_leases WHERE name = 'leader'")
+            self.is_leader = cursor.fetchone()[0] == self.node_id
+
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error renewing scheduler lease: {e}")
+            self.is_leader = False
+
+        return self.is_leader
+
+    def release_leadership(self):
+        """Give up the leader lease so another process can take over immediately"""
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("DELETE FROM scheduler_leases WHERE name = 'leader' AND owner = ?", (self.node_id,))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Error releasing scheduler lease: {e}")
+        self.is_leader = False
+
+    def _run_job(self, job: Job):
+        start = time.perf_counter()
+        try:
+            result = job.func()
+            job.last_result = result if isinstance(result, (int, float, str, dict, type(None))) else str(result)
+            job.last_error = None
+        except Exception as e:
+            job.errors += 1
+            job.last_error = str(e)
+            print(f"Error running job {job.name}: {e}")
+        finally:
+            elapsed = time.perf_counter() - start
+            job.runs += 1
+            job.last_seconds = elapsed
+            job.total_seconds += elapsed
+            job.max_seconds = max(job.max_seconds, elapsed)
+            if elapsed > job.interval_seconds:
+                job.overruns += 1
+            job.last_run_at = time.strftime("%Y-%m-%d %H:%M:%S")
+            job.running = False
+
+    def run_pending(self):
+        """Submit every due job; due jobs that are still running are skipped"""
+        now = time.monotonic()
+        with self._lock:
+            jobs = list(self.jobs.values())
+
+        for job in jobs:
+            if now < job.next_run:
+                continue
+
+            # Schedule from the planned time so intervals do not drift
+            job.next_run += job.interval_seconds * max(1, int((now - job.next_run) // job.interval_seconds) + 1)
+
+            if job.running:
+                job.skipped += 1
+                continue
+
+            job.running = True
+            self._executor.submit(self._run_job, job)
+
+    def _loop(self):
+        last_lease = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_lease >= self.lease_seconds / 3:
+                self.try_acquire_leadership()
+                last_lease = time.monotonic()
+
+            if self.is_leader:
+                self.run_pending()
+
+            self._stop.wait(self.tick_seconds)
+
+    def start(self):
+        """Start the scheduler thread (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="ecosmart-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        """Stop scheduling new runs and release the leader lease"""
+        self._stop.set()
+        if self._thread and wait:
+            self._thread.join(timeout=self.tick_seconds * 5)
+        self._executor.shutdown(wait=wait)
+        self.release_leadership()
+
+    def get_metrics(self) -> List[Dict[str, Any]]:
+        """Per-job timing metrics"""
+        with self._lock:
+            return [job.metrics() for job in self.jobs.values()]
+
+
+_default_scheduler = None
+_default_dispatch = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_dispatch() -> DispatchManager | None:
+    """The DispatchManager of the process-wide scheduler (None before it starts)"""
+    return _default_dispatch
+
+
+def start_default_scheduler(db, notifications, simulation_interval: float = 10.0) -> JobScheduler:
+    """Start the process-wide scheduler with the standard EcoSmart jobs
+
+    Meant to be called from a st.cache_resource function; repeated calls in
+    the same process return the already running scheduler.
+    """
+    global _default_scheduler, _default_dispatch
+    with _default_scheduler_lock:
+        if _default_scheduler is not None:
+            return _default_scheduler
+
+        scheduler = JobScheduler(db.db_path)
+        scheduler.add_job("sensor_simulation", db.update_sensor_data_realtime, simulation_interval)
+        scheduler.add_job("sensor_rollup", db.rollup_sensor_readings, 300, run_immediately=True)
+        scheduler.add_job("telemetry_flush", db.flush_truck_positions, 1.0)
+        scheduler.add_job("notification_cleanup", notifications.cleanup_expired_notifications, 3600,
+                          run_immediately=True)
+        scheduler.add_job("archive_old_data", db.archive_old_data, 6 * 3600)
+
+        forecaster = FillForecaster(db.db_path)
+        scheduler.add_job("overflow_forecast", lambda: forecaster.overflow_alerts(notifications), 900)
+
+        # The shift's routes: bins crossing the threshold are inserted as readings arrive
+        dispatch = DispatchManager(RouteOptimizer(db.db_path, forecaster=forecaster))
+        dispatch.attach(db)
+        scheduler.add_job("dispatch_plan", lambda: dispatch.plan(db.get_all_bins()), 24 * 3600,
+                          run_immediately=True)
+
+        detector = CollectionDetector(db, dispatch=dispatch)
+        detector.attach()
+        scheduler.add_job("collection_confirmation", detector.expire, 300)
+        scheduler.add_job("collection_bin_index", detector.refresh_bins, 3600)
+
+        traces = TraceStore(db.db_path)
+        scheduler.add_job("trace_compression", traces.compress_closed_days, 3600, run_immediately=True)
+        scheduler.start()
+
+        _default_scheduler = scheduler
+        _default_dispatch = dispatch
+        return scheduler
@@ -0,0 +1,270 @@
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+import numpy as np
+
+# Hourly fill-rate multipliers (index = hour of day) for each usage profile.
+# A multiplier of 1.0 means the bin fills at its base rate for that hour.
+_NIGHT = [0.2] * 6
+FILL_RATE_PROFILES = {
+    'residencial': _NIGHT + [1.2, 1.8, 1.4, 0.8, 0.7, 0.9, 1.3, 1.0, 0.7, 0.7, 0.8, 1.2, 1.8, 2.0, 1.6, 1.0, 0.6, 0.3],
+    'comercial': _NIGHT + [0.4, 0.8, 1.2, 1.5, 1.6, 1.8, 2.0, 1.8, 1.5, 1.4, 1.3, 1.2, 0.9, 0.6, 0.4, 0.3, 0.2, 0.2],
+    'escola': _NIGHT + [0.8, 2.0, 2.2, 2.0, 1.6, 1.4, 2.4, 1.8, 1.6, 1.2, 0.6, 0.3, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2],
+    'hospital': [0.8] * 6 + [1.0, 1.2, 1.3, 1.3, 1.3, 1.3, 1.4, 1.3, 1.3, 1.2, 1.2, 1.1, 1.0, 1.0, 0.9, 0.9, 0.8, 0.8],
+    'lazer': _NIGHT + [0.5, 0.8, 1.0, 1.2, 1.5, 1.8, 2.0, 2.0, 1.8, 1.6, 1.4, 1.2, 1.0, 0.7, 0.5, 0.4, 0.3, 0.2],
+    'transporte': [0.3] * 5 + [1.0, 2.0, 2.5, 2.0, 1.2, 1.0, 1.0, 1.2, 1.0, 1.0, 1.2, 1.8, 2.5, 2.2, 1.4, 0.8, 0.6, 0.4, 0.3],
+}
+
+# Keywords in the bin name that select a profile; anything else is residential
+PROFILE_KEYWORDS = {
+    'escola': 'escola',
+    'hospital': 'hospital',
+    'mercado': 'comercial',
+    'shopping': 'comercial',
+    'empresa': 'comercial',
+    'parque': 'lazer',
+    'praça': 'lazer',
+    'terminal': 'transporte',
+}
+
+# A stored level this far from the simulated one was written by someone else (API, collection)
+EXTERNAL_WRITE_MARGIN = 1.0
+
+# Base fill rate in percentage points per hour, by waste type
+BASE_FILL_RATES = {
+    'comum': 1.6,
+    'reciclavel': 1.1,
+    'organico': 2.0,
+}
+
+PROFILE_NAMES = list(FILL_RATE_PROFILES.keys())
+_PROFILE_MATRIX = np.array([FILL_RATE_PROFILES[name] for name in PROFILE_NAMES], dtype=np.float64)
+
+
+def profile_for_bin(bin_name: str) -> str:
+    """Pick the fill-rate profile of a bin from keywords in its name"""
+    lowered = (bin_name or "").lower()
+    for keyword, profile in PROFILE_KEYWORDS.items():
+        if keyword in lowered:
+            return profile
+    return 'residencial'
+
+
+class SensorSimulator:
+    """Vectorized simulator for N fill-level sensors.
+
+    All sensor state lives in NumPy arrays, so one call to step() advances
+    fill, battery, temperature and humidity for every sensor at once. Each
+    sensor reports on its own interval; the readings that are due in a tick
+    are written through Database.save_sensor_readings_bulk in chunks.
+    """
+
+    def __init__(self, sensor_ids: List[str], bin_ids: List[str], profiles: List[str],
+                 base_rates: np.ndarray, fill: np.ndarray, battery: np.ndarray | None = None,
+                 temperature: np.ndarray | None = None, humidity: np.ndarray | None = None,
+                 report_interval: float = 60.0, battery_drain_per_hour: float = 0.02,
+                 db=None, batch_size: int = 10000, seed: int | None = None):
+        n = len(sensor_ids)
+        self.rng = np.random.default_rng(seed)
+        self.db = db
+        self.batch_size = batch_size
+
+        self.sensor_ids = np.asarray(sensor_ids, dtype=object)
+        self.bin_ids = np.asarray(bin_ids, dtype=object)
+        self.profile_index = np.array([PROFILE_NAMES.index(p) for p in profiles], dtype=np.intp)
+        self.base_rates = np.asarray(base_rates, dtype=np.float64)
+
+        self.fill = np.asarray(fill, dtype=np.float64).copy()
+        self.battery = np.full(n, 100.0) if battery is None else np.asarray(battery, dtype=np.float64).copy()
+        self.temperature = np.full(n, 22.0) if temperature is None else np.asarray(temperature, dtype=np.float64).copy()
+        self.humidity = np.full(n, 60.0) if humidity is None else np.asarray(humidity, dtype=np.float64).copy()
+
+        # Staggered report schedule so sensors do not all report in the same tick
+        self.report_interval = float(report_interval)
+        self.battery_drain_per_hour = battery_drain_per_hour
+        self.next_report = self.rng.uniform(0, self.report_interval, n)
+
+        self.clock = datetime.now()
+        self.elapsed = 0.0
+        self._last_collection_event = None
+        self.stats = {'ticks': 0, 'readings_written': 0, 'write_seconds': 0.0, 'step_seconds': 0.0}
+
+    def __len__(self) -> int:
+        return len(self.sensor_ids)
+
+    @classmethod
+    def from_database(cls, db, **kwargs) -> "SensorSimulator":
+        """Build a simulator for the sensors currently stored in the database"""
+        bins = {b['id']: b for b in db.get_all_bins()}
+        sensors = db.get_all_sensors()
+
+        profiles = [profile_for_bin(bins.get(s['bin_id'], {}).get('name', '')) for s in sensors]
+        rates = [BASE_FILL_RATES.get(bins.get(s['bin_id'], {}).get('waste_type', 'comum'), 1.5)
+                 for s in sensors]
+
+        return cls(
+            sensor_ids=[s['sensor_id'] for s in sensors],
+            bin_ids=[s['bin_id'] for s in sensors],
+            profiles=profiles,
+            base_rates=np.array(rates),
+            fill=np.array([s['fill_level'] for s in sensors], dtype=np.float64),
+            battery=np.array([s['battery_level'] for s in sensors], dtype=np.float64),
+            temperature=np.array([s['temperature'] or 22.0 for s in sensors], dtype=np.float64),
+            humidity=np.array([s['humidity'] or 60 for s in sensors], dtype=np.float64),
+            db=db,
+            **kwargs
+        )
+
+    @classmethod
+    def synthetic(cls, n: int, seed: int | None = None, **kwargs) -> "SensorSimulator":
+        """Build a simulator with n synthetic sensors, for load tests"""
+        rng = np.random.default_rng(seed)
+        waste_types = list(BASE_FILL_RATES.keys())
+
+        profile_choice = rng.integers(0, len(PROFILE_NAMES), n)
+        waste_choice = rng.integers(0, len(waste_types), n)
+        base_rates = np.array([BASE_FILL_RATES[w] for w in waste_types])[waste_choice]
+        base_rates *= rng.lognormal(0.0, 0.3, n)
+
+        return cls(
+            sensor_ids=[f"SIM_{i:06d}" for i in range(n)],
+            bin_ids=[f"SIMBIN_{i:06d}" for i in range(n)],
+            profiles=[PROFILE_NAMES[i] for i in profile_choice],
+            base_rates=base_rates,
+            fill=rng.uniform(0, 80, n),
+            battery=rng.uniform(40, 100, n),
+            temperature=rng.normal(22.0, 3.0, n),
+            humidity=rng.uniform(40, 80, n),
+            seed=seed,
+            **kwargs
+        )
+
+    def fill_rates(self, hour: int) -> np.ndarray:
+        """Expected fill rate (percentage points per hour) of every sensor at a given hour"""
+        return self.base_rates * _PROFILE_MATRIX[self.profile_index, hour % 24]
+
+    def step(self, dt_seconds: float) -> np.ndarray:
+        """Advance every sensor by dt_seconds and return the indices that report now"""
+        start = time.perf_counter()
+        n = len(self)
+        hours = dt_seconds / 3600.0
+        hour = self.clock.hour
+
+        # Fill: profile-driven rate with multiplicative noise, never decreasing on its own
+        noise = self.rng.lognormal(0.0, 0.25, n)
+        self.fill = np.minimum(100.0, self.fill + self.fill_rates(hour) * hours * noise)
+
+        # Battery: slow drain plus a small cost per transmitted reading
+        reporting = self.next_report <= self.elapsed + dt_seconds
+        self.battery -= self.battery_drain_per_hour * hours
+        self.battery[reporting] -= 0.001
+        np.maximum(self.battery, 0.0, out=self.battery)
+
+        # Temperature and humidity: mean-reverting around a daily cycle
+        ambient = 22.0 + 5.0 * np.sin((hour - 9) / 24.0 * 2 * np.pi)
+        ambient_humidity = 65.0 - 15.0 * np.sin((hour - 9) / 24.0 * 2 * np.pi)
+        reversion = min(1.0, hours * 2.0)
+        self.temperature += (ambient - self.temperature) * reversion + self.rng.normal(0, 0.2, n) * np.sqrt(hours)
+        self.humidity += (ambient_humidity - self.humidity) * reversion + self.rng.normal(0, 1.0, n) * np.sqrt(hours)
+        np.clip(self.humidity, 0.0, 100.0, out=self.humidity)
+
+        self.elapsed += dt_seconds
+        self.clock += timedelta(seconds=dt_seconds)
+
+        due = np.flatnonzero(reporting)
+        self.next_report[due] += self.report_interval * np.ceil(
+            (self.elapsed - self.next_report[due]) / self.report_interval + 1e-9
+        )
+
+        self.stats['ticks'] += 1
+        self.stats['step_seconds'] += time.perf_counter() - start
+        return due
+
+    def readings(self, indices: np.ndarray) -> List[tuple]:
+        """Reading tuples in the layout expected by Database.save_sensor_readings_bulk"""
+        timestamp = self.clock.isoformat()
+        return list(zip(
+            self.sensor_ids[indices].tolist(),
+            self.bin_ids[indices].tolist(),
+            [timestamp] * len(indices),
+            np.round(self.fill[indices], 1).tolist(),
+            np.round(self.battery[indices], 1).tolist(),
+            np.round(self.temperature[indices], 1).tolist(),
+            np.round(self.humidity[indices], 0).tolist(),
+        ))
+
+    def tick(self, dt_seconds: float | None = None) -> int:
+        """Advance by dt_seconds (default: real time since the last tick) and write due readings"""
+        if dt_seconds is None:
+            dt_seconds = max(1.0, (datetime.now() - self.clock).total_seconds())
+
+        due = self.step(dt_seconds)
+        if self.db is None or len(due) == 0:
+            return 0
+
+        start = time.perf_counter()
+        written = 0
+        for chunk_start in range(0, len(due), self.batch_size):
+            chunk = due[chunk_start:chunk_start + self.batch_size]
+            written += self.db.save_sensor_readings_bulk(self.readings(chunk))
+
+        self.stats['write_seconds'] += time.perf_counter() - start
+        self.stats['readings_written'] += written
+        return written
+
+    def empty_bins(self, indices: np.ndarray | List[int]):
+        """Reset the fill level of collected bins"""
+        self.fill[np.asarray(indices, dtype=np.intp)] = 0.0
+
+    def sync_from_database(self):
+        """Adopt levels written outside the simulator and empty bins a truck was detected at
+
+        Stored levels are the rounded simulated ones, so only differences
+        beyond EXTERNAL_WRITE_MARGIN (API readings, manual collections) are
+        taken over. Bins with a newly detected (pending) collection are
+        emptied, so their sensors report the drop that confirms it.
+        """
+        if self.db is None:
+            return
+        levels = self.db.get_bin_fill_levels()
+        stored = np.array([levels.get(b, np.nan) for b in self.bin_ids], dtype=np.float64)
+        external = np.abs(stored - self.fill) > EXTERNAL_WRITE_MARGIN
+        self.fill[external] = stored[external]
+
+        if self._last_collection_event is None:
+            # Collections detected before the simulator started are already reflected in the levels
+            _, self._last_collection_event = self.db.get_pending_collection_bins(0)
+            return
+        collected, self._last_collection_event = self.db.get_pending_collection_bins(self._last_collection_event)
+        if collected:
+            self.empty_bins(np.flatnonzero(np.isin(self.bin_ids, collected)))
+
+    def run(self, duration_seconds: float, tick_seconds: float = 10.0,
+            realtime: bool = False) -> Dict[str, Any]:
+        """Run the simulator for a simulated duration and report throughput
+
+        With realtime=False the ticks run back to back, which is how the
+        ingestion path is load-tested with large sensor counts.
+        """
+        wall_start = time.perf_counter()
+        written = 0
+        simulated = 0.0
+
+        while simulated < duration_seconds:
+            tick_start = time.perf_counter()
+            written += self.tick(tick_seconds)
+            simulated += tick_seconds
+            if realtime:
+                time.sleep(max(0.0, tick_seconds - (time.perf_counter() - tick_start)))
+
+        wall = time.perf_counter() - wall_start
+        return {
+            'sensors': len(self),
+            'simulated_seconds': simulated,
+            'wall_seconds': round(wall, 3),
+            'readings_written': written,
+            'readings_per_second': round(written / wall, 1) if wall > 0 else 0.0,
+            'step_seconds': round(self.stats['step_seconds'], 3),
+            'write_seconds': round(self.stats['write_seconds'], 3),
+        }
@@ -0,0 +1,151 @@
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+METERS_PER_DEGREE_LAT = 110_574.0
+METERS_PER_DEGREE_LON_EQUATOR = 111_320.0
+
+
+class GridIndex:
+    """Static spatial index of points on a uniform grid of square cells.
+
+    Coordinates are projected to local metres (equirectangular, fine at city
+    scale). Points are sorted by cell key, so finding the points of a cell is
+    a binary search: lookups are O(log n) plus the points in nearby cells.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_m: float = 250.0):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_m = cell_m
+        self.origin_lat = float(self.lat.mean()) if len(self.lat) else 0.0
+        self.meters_per_degree_lon = METERS_PER_DEGREE_LON_EQUATOR * math.cos(math.radians(self.origin_lat))
+
+        self.x, self.y = self.project(self.lat, self.lon)
+        cell_x = np.floor(self.x / cell_m).astype(np.int64)
+        cell_y = np.floor(self.y / cell_m).astype(np.int64)
+        self.min_x = int(cell_x.min()) if len(cell_x) else 0
+        self.min_y = int(cell_y.min()) if len(cell_y) else 0
+        self.rows = int(cell_y.max()) - self.min_y + 1 if len(cell_y) else 1
+        self.cols = int(cell_x.max()) - self.min_x + 1 if len(cell_x) else 1
+
+        keys = self._key(cell_x, cell_y)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def project(self, lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+        """Local metric coordinates (x east, y north) of [lat, lon]"""
+        return (np.asarray(lon, dtype=np.float64) * self.meters_per_degree_lon,
+                np.asarray(lat, dtype=np.float64) * METERS_PER_DEGREE_LAT)
+
+    def _key(self, cell_x, cell_y):
+        return (cell_x - self.min_x) * self.rows + (cell_y - self.min_y)
+
+    def _cell_members(self, cell_x: int, cell_y: int) -> np.ndarray:
+        if not (0 <= cell_x - self.min_x < self.cols and 0 <= cell_y - self.min_y < self.rows):
+            return self.order[:0]
+        key = self._key(cell_x, cell_y)
+        left = np.searchsorted(self.sorted_keys, key, side='left')
+        right = np.searchsorted(self.sorted_keys, key, side='right')
+        return self.order[left:right]
+
+    def _ring_members(self, cell_x: int, cell_y: int, ring: int) -> List[np.ndarray]:
+        if ring == 0:
+            return [self._cell_members(cell_x, cell_y)]
+        members = []
+        for dx in range(-ring, ring + 1):
+            members.append(self._cell_members(cell_x + dx, cell_y - ring))
+            members.append(self._cell_members(cell_x + dx, cell_y + ring))
+        for dy in range(-ring + 1, ring):
+            members.append(self._cell_members(cell_x - ring, cell_y + dy))
+            members.append(self._cell_members(cell_x + ring, cell_y + dy))
+        return members
+
+    def nearest(self, lat: float, lon: float, max_distance_m: float = np.inf) -> Tuple[int, float]:
+        """Index of the nearest point and its distance in metres (-1 if none within range)"""
+        if len(self) == 0:
+            return -1, np.inf
+        x, y = self.project(lat, lon)
+        cell_x, cell_y = int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+        max_ring = max(self.rows, self.cols) + abs(cell_x - self.min_x) + abs(cell_y - self.min_y)
+
+        best, best_distance = -1, np.inf
+        ring = 0
+        # Points in ring r are at least (r - 1) cells away, so stop once that exceeds the best
+        while ring <= max_ring and (ring - 1) * self.cell_m <= min(best_distance, max_distance_m):
+            members = self._ring_members(cell_x, cell_y, ring)
+            candidates = np.concatenate(members) if members else self.order[:0]
+            if len(candidates):
+                distances = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+                k = int(np.argmin(distances))
+                if distances[k] < best_distance:
+                    best, best_distance = int(candidates[k]), float(distances[k])
+            ring += 1
+
+        if best_distance > max_distance_m:
+            return -1, np.inf
+        return best, best_distance
+
+    def nearest_many(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest point index and distance (m) for every query point"""
+        indices = np.empty(len(lats), dtype=np.intp)
+        distances = np.empty(len(lats))
+        for q, (lat, lon) in enumerate(zip(lats, lons)):
+            indices[q], distances[q] = self.nearest(lat, lon)
+        return indices, distances
+
+    def within(self, lat: float, lon: float, radius_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices of the points within radius_m of a location, and their distances"""
+        x, y = self.project(lat, lon)
+        cell_x, cell_y = int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+        reach = int(math.ceil(radius_m / self.cell_m))
+
+        members = [self._cell_members(cell_x + dx, cell_y + dy)
+                   for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)]
+        candidates = np.concatenate(members) if members else self.order[:0]
+        distances = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+        inside = distances <= radius_m
+        return candidates[inside], distances[inside]
+
+    def pairs_within(self, lats: np.ndarray, lons: np.ndarray,
+                     radius_m: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """All (query, point, distance) pairs within radius_m, for many query points at once
+
+        Vectorized cell join: for every neighbouring cell offset, the point
+        range of each query's cell is found with one searchsorted and
+        expanded, so there is no Python loop over queries.
+        """
+        qx, qy = self.project(lats, lons)
+        cell_x = np.floor(qx / self.cell_m).astype(np.int64)
+        cell_y = np.floor(qy / self.cell_m).astype(np.int64)
+        reach = int(math.ceil(radius_m / self.cell_m))
+
+        queries, points = [], []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                nx, ny = cell_x + dx, cell_y + dy
+                valid = ((nx - self.min_x >= 0) & (nx - self.min_x < self.cols) &
+                         (ny - self.min_y >= 0) & (ny - self.min_y < self.rows))
+                q = np.flatnonzero(valid)
+                keys = self._key(nx[q], ny[q])
+                left = np.searchsorted(self.sorted_keys, keys, side='left')
+                counts = np.searchsorted(self.sorted_keys, keys, side='right') - left
+                if not counts.sum():
+                    continue
+                owner = np.repeat(q, counts)
+                # Position within each query's run, added to its run start
+                starts = np.repeat(left - np.cumsum(counts) + counts, counts)
+                queries.append(owner)
+                points.append(self.order[starts + np.arange(len(owner))])
+
+        if not queries:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, np.zeros(0)
+        queries, points = np.concatenate(queries), np.concatenate(points)
+        distances = np.hypot(self.x[points] - qx[queries], self.y[points] - qy[queries])
+        inside = distances <= radius_m
+        return queries[inside], points[inside], distances[inside]
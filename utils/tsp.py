@@ -0,0 +1,286 @@
+import time
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# Moves must improve the tour by more than this (km) to be applied
+IMPROVEMENT_EPS = 1e-9
+
+
+def is_symmetric(dist: np.ndarray) -> bool:
+    """Whether a distance matrix is symmetric (straight-line) or directed (road network)"""
+    return dist.shape[0] == dist.shape[1] and np.allclose(dist, dist.T)
+
+
+def tour_length(dist: np.ndarray, tour: np.ndarray) -> float:
+    """Length of a closed tour (returns to tour[0])"""
+    tour = np.asarray(tour, dtype=np.intp)
+    if len(tour) < 2:
+        return 0.0
+    return float(dist[tour, np.roll(tour, -1)].sum())
+
+
+def nearest_neighbour_tour(dist: np.ndarray, start: int = 0) -> np.ndarray:
+    """Greedy nearest-neighbour tour starting (and ending) at start"""
+    n = dist.shape[0]
+    tour = np.empty(n, dtype=np.intp)
+    penalty = np.zeros(n)
+    current = start
+
+    for k in range(n):
+        tour[k] = current
+        penalty[current] = np.inf
+        if k < n - 1:
+            current = int(np.argmin(dist[current] + penalty))
+
+    return tour
+
+
+def two_opt(dist: np.ndarray, tour: np.ndarray, deadline: float | None = None,
+            symmetric: bool | None = None) -> Tuple[np.ndarray, bool]:
+    """Improve a closed tour with 2-opt until no improving move remains
+
+    For every edge (a, b) the gain of reconnecting against all later edges
+    (c, d) is evaluated in one vectorized expression and the best one is
+    applied. tour[0] stays fixed. Returns the tour and whether it changed.
+    """
+    tour = np.asarray(tour, dtype=np.intp).copy()
+    n = len(tour)
+    if n < 4:
+        return tour, False
+    if symmetric is None:
+        symmetric = is_symmetric(dist)
+
+    ext = np.append(tour, tour[0])
+    edges = dist[ext[:-1], ext[1:]]
+    reverse_gain = None if symmetric else np.concatenate(([0.0], np.cumsum(dist[ext[1:], ext[:-1]] - edges)))
+    changed = False
+    improved = True
+
+    while improved:
+        improved = False
+        for i in range(n - 2):
+            a, b = ext[i], ext[i + 1]
+            c = ext[i + 2:n]
+            d = ext[i + 3:n + 1]
+
+            delta = dist[a, c] + dist[b, d] - edges[i] - edges[i + 2:n]
+            if reverse_gain is not None:
+                # Directed matrix: the reversed segment b..c changes cost too
+                delta += reverse_gain[i + 2:n] - reverse_gain[i + 1]
+            if i == 0:
+                delta[-1] = 0.0
+
+            k = int(np.argmin(delta))
+            if delta[k] < -IMPROVEMENT_EPS:
+                j = i + 2 + k
+                ext[i + 1:j + 1] = ext[i + 1:j + 1][::-1]
+                edges[i + 1:j] = edges[i + 1:j][::-1] if symmetric else dist[ext[i + 1:j], ext[i + 2:j + 1]]
+                edges[i] = dist[ext[i], ext[i + 1]]
+                edges[j] = dist[ext[j], ext[j + 1]]
+                if reverse_gain is not None:
+                    reverse_gain = np.concatenate(([0.0], np.cumsum(dist[ext[1:], ext[:-1]] - edges)))
+                improved = changed = True
+
+            if deadline is not None and time.perf_counter() > deadline:
+                return ext[:-1].copy(), changed
+
+    return ext[:-1].copy(), changed
+
+
+def neighbour_lists(dist: np.ndarray, k: int = 10) -> np.ndarray:
+    """Indices of the k nearest other nodes of every node"""
+    n = dist.shape[0]
+    k = max(1, min(k, n - 1))
+    masked = dist.copy()
+    np.fill_diagonal(masked, np.inf)
+    return np.argpartition(masked, k - 1, axis=1)[:, :k]
+
+
+def or_opt(dist: np.ndarray, tour: np.ndarray, max_segment: int = 3, deadline: float | None = None,
+           symmetric: bool | None = None, neighbours: np.ndarray | None = None) -> Tuple[np.ndarray, bool]:
+    """Improve a closed tour by relocating segments of 1..max_segment stops
+
+    A segment is only tried next to the nearest neighbours of its end stops
+    (forwards and, on symmetric matrices, reversed), which keeps each
+    evaluation O(k) instead of O(n). tour[0] stays fixed.
+    """
+    tour = np.asarray(tour, dtype=np.intp).copy()
+    n = len(tour)
+    if n < 4:
+        return tour, False
+    if symmetric is None:
+        symmetric = is_symmetric(dist)
+    if neighbours is None:
+        neighbours = neighbour_lists(dist)
+
+    position = np.empty(n, dtype=np.intp)
+    position[tour] = np.arange(n)
+    changed = False
+    improved = True
+
+    while improved:
+        improved = False
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length <= n:
+                prev, first, last = tour[i - 1], tour[i], tour[i + length - 1]
+                nxt = tour[(i + length) % n]
+                removal_gain = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+                # Candidate edges j = (tour[j], tour[j + 1]) touching a neighbour of the segment
+                near = position[np.concatenate((neighbours[first], neighbours[last]))]
+                candidates = np.unique(np.concatenate((near, (near - 1) % n)))
+                candidates = candidates[(candidates < i - 1) | (candidates > i + length - 1)]
+                if len(candidates) == 0:
+                    i += 1
+                    continue
+
+                starts, ends = tour[candidates], tour[(candidates + 1) % n]
+                edge_cost = dist[starts, ends]
+                insert_cost = dist[starts, first] + dist[last, ends] - edge_cost
+                best_index, reverse = int(np.argmin(insert_cost)), False
+                best = insert_cost[best_index]
+
+                if symmetric and length > 1:
+                    reversed_cost = dist[starts, last] + dist[first, ends] - edge_cost
+                    reversed_index = int(np.argmin(reversed_cost))
+                    if reversed_cost[reversed_index] < best:
+                        best_index, best, reverse = reversed_index, reversed_cost[reversed_index], True
+
+                if removal_gain - best > IMPROVEMENT_EPS:
+                    j = int(candidates[best_index])
+                    segment = tour[i:i + length]
+                    if reverse:
+                        segment = segment[::-1]
+                    rest = np.concatenate((tour[:i], tour[i + length:]))
+                    insert_at = j + 1 if j < i else j - length + 1
+                    tour = np.concatenate((rest[:insert_at], segment, rest[insert_at:]))
+                    position[tour] = np.arange(n)
+                    improved = changed = True
+                else:
+                    i += 1
+
+                if deadline is not None and time.perf_counter() > deadline:
+                    return tour, changed
+
+    return tour, changed
+
+
+def local_search(dist: np.ndarray, tour: np.ndarray, deadline: float | None = None) -> np.ndarray:
+    """Alternate 2-opt and Or-opt until neither improves the tour"""
+    symmetric = is_symmetric(dist)
+    neighbours = neighbour_lists(dist)
+    tour = np.asarray(tour, dtype=np.intp)
+    while True:
+        tour, changed_2opt = two_opt(dist, tour, deadline, symmetric)
+        tour, changed_oropt = or_opt(dist, tour, deadline=deadline, symmetric=symmetric,
+                                     neighbours=neighbours)
+        if not changed_oropt or (deadline is not None and time.perf_counter() > deadline):
+            return tour
+
+
+def solve_tsp(dist: np.ndarray, start: int = 0, time_limit: float | None = None) -> Tuple[np.ndarray, float]:
+    """Nearest-neighbour construction followed by 2-opt/Or-opt local search"""
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    tour = nearest_neighbour_tour(dist, start)
+    tour = local_search(dist, tour, deadline)
+    return tour, tour_length(dist, tour)
+
+
+def randomized_nearest_neighbour_tour(dist: np.ndarray, rng: np.random.Generator, start: int = 0,
+                                      candidates: int = 3) -> np.ndarray:
+    """Nearest-neighbour tour that picks at random among the closest unvisited nodes"""
+    n = dist.shape[0]
+    tour = np.empty(n, dtype=np.intp)
+    penalty = np.zeros(n)
+    current = start
+
+    for k in range(n):
+        tour[k] = current
+        penalty[current] = np.inf
+        remaining = n - k - 1
+        if remaining:
+            row = dist[current] + penalty
+            choices = min(candidates, remaining)
+            closest = np.argpartition(row, choices - 1)[:choices]
+            current = int(rng.choice(closest))
+
+    return tour
+
+
+def double_bridge(tour: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Random double-bridge move (keeps tour[0]): A B C D -> A C B D
+
+    A perturbation 2-opt and Or-opt cannot undo in one step, used to restart
+    local search from a nearby tour.
+    """
+    n = len(tour)
+    if n < 8:
+        return tour.copy()
+    a, b, c = np.sort(rng.choice(np.arange(1, n), size=3, replace=False))
+    return np.concatenate([tour[:a], tour[b:c], tour[a:b], tour[c:]])
+
+
+def iterated_local_search(dist: np.ndarray, tour: np.ndarray, rng: np.random.Generator,
+                          deadline: float | None = None, max_kicks: int = 20) -> Tuple[np.ndarray, float]:
+    """Local search, then double-bridge kicks that are kept when they lead to a shorter tour"""
+    best = local_search(dist, tour, deadline)
+    best_length = tour_length(dist, best)
+    for _ in range(max_kicks):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        candidate = local_search(dist, double_bridge(best, rng), deadline)
+        length = tour_length(dist, candidate)
+        if length < best_length - IMPROVEMENT_EPS:
+            best, best_length = candidate, length
+    return best, best_length
+
+
+def anytime_tsp(dist: np.ndarray, time_budget: float, cancel=None, seed: int = 0,
+                slice_seconds: float = 0.25,
+                initial_tour: np.ndarray | None = None) -> Iterator[Tuple[np.ndarray, float]]:
+    """Yield successively shorter (tour, length) pairs until the budget runs out
+
+    The nearest-neighbour tour (or initial_tour) is yielded immediately. Local search then runs
+    in short time slices, so an improvement is reported as soon as a slice
+    finds one and cancel (anything with is_set(), e.g. threading.Event) is
+    honoured within slice_seconds. At a local optimum the search continues
+    from double-bridge kicks of the best tour.
+    """
+    deadline = time.perf_counter() + time_budget
+    rng = np.random.default_rng(seed)
+    symmetric = is_symmetric(dist)
+    neighbours = neighbour_lists(dist)
+
+    best = np.asarray(initial_tour, dtype=np.intp) if initial_tour is not None else nearest_neighbour_tour(dist, 0)
+    best_length = tour_length(dist, best)
+    yield best, best_length
+
+    current = best
+    while time.perf_counter() < deadline and not (cancel is not None and cancel.is_set()):
+        step_deadline = min(deadline, time.perf_counter() + slice_seconds)
+        current, changed_2opt = two_opt(dist, current, step_deadline, symmetric)
+        current, changed_oropt = or_opt(dist, current, deadline=step_deadline, symmetric=symmetric,
+                                        neighbours=neighbours)
+        length = tour_length(dist, current)
+        if length < best_length - IMPROVEMENT_EPS:
+            best, best_length = current, length
+            yield best, best_length
+
+        if not (changed_2opt or changed_oropt) and time.perf_counter() < step_deadline:
+            # Local optimum: kick the best tour found so far
+            if len(best) < 8:
+                return
+            current = double_bridge(best, rng)
+
+
+def cheapest_insertion(dist: np.ndarray, tour: np.ndarray, nodes) -> np.ndarray:
+    """Insert nodes one by one into a closed tour, each at its cheapest position"""
+    tour = list(int(n) for n in tour)
+    for node in nodes:
+        current = np.asarray(tour, dtype=np.intp)
+        following = np.roll(current, -1)
+        added = dist[current, node] + dist[node, following] - dist[current, following]
+        tour.insert(int(np.argmin(added)) + 1, int(node))
+    return np.asarray(tour, dtype=np.intp)
@@ -0,0 +1,769 @@
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from utils.tsp import IMPROVEMENT_EPS, is_symmetric, local_search, neighbour_lists
+
+
+class RoutingProblem:
+    """A capacitated vehicle routing instance with time windows.
+
+    Node indices refer to rows of dist. Depot nodes are listed per vehicle;
+    customers are every other node with a demand. Times are in minutes since
+    midnight: a vehicle leaves its depot at its shift start, travels at its
+    average speed, may wait for a stop's window to open, and must be back
+    before the shift ends. Service at a stop must start inside
+    [window_start, window_end].
+
+    Optionally demand is also split by stream: compartment_demand has one
+    column per stream and compartment_capacity one row per vehicle, and a
+    route must fit every compartment as well as the total capacity. A
+    dedicated truck is a vehicle with zero capacity for the other streams.
+
+    With unload_nodes (transfer stations, cooperatives) vehicle capacity is
+    per trip: whenever the next stop would overflow the truck, it detours
+    to the facility that adds the least distance, unloads for unload_min
+    and carries on, and it unloads once more before returning to its depot.
+    Distances and schedules include those detours.
+    """
+
+    def __init__(self, dist: np.ndarray, customers: List[int], demand: np.ndarray,
+                 vehicle_depot: List[int], vehicle_capacity: List[float],
+                 vehicle_speed_kmh: List[float], vehicle_shift_min: List[float],
+                 service_min: np.ndarray, window_start: np.ndarray | None = None,
+                 window_end: np.ndarray | None = None,
+                 vehicle_shift_start_min: List[float] | None = None,
+                 compartment_demand: np.ndarray | None = None,
+                 compartment_capacity: np.ndarray | None = None,
+                 unload_nodes: List[int] | None = None, unload_min: float = 15.0):
+        self.dist = dist
+        self.customers = np.asarray(customers, dtype=np.intp)
+        self.demand = np.asarray(demand, dtype=np.float64)
+        self.vehicle_depot = np.asarray(vehicle_depot, dtype=np.intp)
+        self.vehicle_capacity = np.asarray(vehicle_capacity, dtype=np.float64)
+        self.vehicle_speed_kmh = np.asarray(vehicle_speed_kmh, dtype=np.float64)
+        self.vehicle_shift_min = np.asarray(vehicle_shift_min, dtype=np.float64)
+        self.service_min = np.asarray(service_min, dtype=np.float64)
+
+        n = dist.shape[0]
+        self.window_start = np.zeros(n) if window_start is None else np.asarray(window_start, dtype=np.float64)
+        self.window_end = np.full(n, np.inf) if window_end is None else np.asarray(window_end, dtype=np.float64)
+        self.has_time_windows = bool(np.any(self.window_start > 0) or np.any(np.isfinite(self.window_end)))
+        self.vehicle_shift_start = (np.zeros(len(self.vehicle_depot)) if vehicle_shift_start_min is None
+                                    else np.asarray(vehicle_shift_start_min, dtype=np.float64))
+        self.vehicle_shift_end = self.vehicle_shift_start + self.vehicle_shift_min
+        self.compartment_demand = (None if compartment_demand is None
+                                   else np.asarray(compartment_demand, dtype=np.float64).reshape(n, -1))
+        self.compartment_capacity = (None if compartment_capacity is None
+                                     else np.asarray(compartment_capacity, dtype=np.float64)
+                                     .reshape(len(self.vehicle_depot), -1))
+        self.unload_nodes = np.asarray(unload_nodes if unload_nodes is not None else [], dtype=np.intp)
+        self.unload_min = float(unload_min)
+        self.has_unloads = len(self.unload_nodes) > 0
+
+        self.symmetric = is_symmetric(dist)
+        self.neighbours = neighbour_lists(dist, 15)
+
+    @property
+    def num_vehicles(self) -> int:
+        return len(self.vehicle_depot)
+
+    @property
+    def num_nodes(self) -> int:
+        return self.dist.shape[0]
+
+    def add_customer(self, to_node: np.ndarray, from_node: np.ndarray, demand: float,
+                     service_min: float, window_start: float = 0.0, window_end: float = np.inf,
+                     compartment_demand: np.ndarray | None = None) -> int:
+        """Append a customer given its distances to and from the existing nodes; returns its index
+
+        The matrix lives in a buffer with spare capacity, so adding customers
+        one at a time costs O(n) each (amortized) instead of a full copy.
+        """
+        n = self.num_nodes
+        buffer = getattr(self, '_buffer', None)
+        if buffer is None or buffer.shape[0] <= n:
+            buffer = np.empty((max(2 * n, 16), max(2 * n, 16)), dtype=np.float64)
+            buffer[:n, :n] = self.dist
+            self._buffer = buffer
+        buffer[:n, n] = to_node
+        buffer[n, :n] = from_node
+        buffer[n, n] = 0.0
+        self.dist = buffer[:n + 1, :n + 1]
+
+        self.customers = np.append(self.customers, n)
+        self.demand = np.append(self.demand, demand)
+        if self.compartment_demand is not None:
+            row = np.zeros((1, self.compartment_demand.shape[1])) if compartment_demand is None \
+                else np.asarray(compartment_demand, dtype=np.float64).reshape(1, -1)
+            self.compartment_demand = np.vstack([self.compartment_demand, row])
+        self.service_min = np.append(self.service_min, service_min)
+        self.window_start = np.append(self.window_start, window_start)
+        self.window_end = np.append(self.window_end, window_end)
+        self.has_time_windows = self.has_time_windows or window_start > 0 or np.isfinite(window_end)
+
+        k = self.neighbours.shape[1]
+        nearest = np.argpartition(np.asarray(from_node, dtype=np.float64), k - 1)[:k]
+        self.neighbours = np.vstack([self.neighbours, nearest])
+        return n
+
+    def _overflows(self, vehicle: int, load: float, streams: np.ndarray | None, node: int) -> bool:
+        if load + self.demand[node] > self.vehicle_capacity[vehicle] + 1e-9:
+            return True
+        return streams is not None and bool(np.any(streams + self.compartment_demand[node] >
+                                                   self.compartment_capacity[vehicle] + 1e-9))
+
+    def _best_unload(self, origin: int, destination: int) -> int:
+        facilities = self.unload_nodes
+        return int(facilities[np.argmin(self.dist[origin, facilities] + self.dist[facilities, destination])])
+
+    def route_path(self, vehicle: int, route: List[int]) -> Tuple[List[int], List[bool]]:
+        """Nodes driven through, depot to depot, and which of them are unload visits"""
+        depot = int(self.vehicle_depot[vehicle])
+        path, unloads = [depot], [False]
+        if not self.has_unloads:
+            return path + [int(n) for n in route] + [depot], [False] * (len(route) + 2)
+        load = 0.0
+        streams = None if self.compartment_demand is None else np.zeros(self.compartment_demand.shape[1])
+        for node in route:
+            if load > 0 and self._overflows(vehicle, load, streams, node):
+                path.append(self._best_unload(path[-1], node))
+                unloads.append(True)
+                load = 0.0
+                if streams is not None:
+                    streams = np.zeros_like(streams)
+            path.append(int(node))
+            unloads.append(False)
+            load += self.demand[node]
+            if streams is not None:
+                streams = streams + self.compartment_demand[node]
+        if route:
+            path.append(self._best_unload(path[-1], depot))
+            unloads.append(True)
+        return path + [depot], unloads + [False]
+
+    def route_distance(self, vehicle: int, route: List[int]) -> float:
+        """Distance in km of a depot -> stops -> depot route (with unload detours)"""
+        if not route:
+            return 0.0
+        if self.has_unloads:
+            nodes = np.array(self.route_path(vehicle, route)[0], dtype=np.intp)
+        else:
+            depot = self.vehicle_depot[vehicle]
+            nodes = np.array([depot] + list(route) + [depot], dtype=np.intp)
+        return float(self.dist[nodes[:-1], nodes[1:]].sum())
+
+    def travel_min(self, vehicle: int, origin, destination):
+        """Travel time in minutes between nodes (scalars or arrays) for a vehicle"""
+        return self.dist[origin, destination] / self.vehicle_speed_kmh[vehicle] * 60.0
+
+    def route_schedule(self, vehicle: int, route: List[int]) -> Tuple[np.ndarray, float]:
+        """Service start time at each stop and the time the vehicle is back at the depot"""
+        if self.has_unloads:
+            return self._unload_schedule(vehicle, route)[:2]
+        starts = np.empty(len(route))
+        previous = self.vehicle_depot[vehicle]
+        ready = self.vehicle_shift_start[vehicle]
+        for index, node in enumerate(route):
+            starts[index] = max(self.window_start[node], ready + self.travel_min(vehicle, previous, node))
+            ready = starts[index] + self.service_min[node]
+            previous = node
+        return starts, ready + self.travel_min(vehicle, previous, self.vehicle_depot[vehicle])
+
+    def _unload_schedule(self, vehicle: int, route: List[int]) -> Tuple[np.ndarray, float, List[Tuple[int, int, float]]]:
+        """route_schedule following route_path, plus (facility, stops before it, arrival) per unload"""
+        path, is_unload = self.route_path(vehicle, route)
+        starts = np.empty(len(route))
+        visits = []
+        ready = self.vehicle_shift_start[vehicle]
+        previous, index = path[0], 0
+        for node, unload in zip(path[1:-1], is_unload[1:-1]):
+            arrival = ready + self.travel_min(vehicle, previous, node)
+            if unload:
+                visits.append((node, index, arrival))
+                ready = arrival + self.unload_min
+            else:
+                starts[index] = max(self.window_start[node], arrival)
+                ready = starts[index] + self.service_min[node]
+                index += 1
+            previous = node
+        return starts, ready + self.travel_min(vehicle, previous, path[-1]), visits
+
+    def route_unloads(self, vehicle: int, route: List[int]) -> List[Tuple[int, int, float]]:
+        """Unload visits of a route: (facility node, number of stops served before it, arrival minute)"""
+        return self._unload_schedule(vehicle, route)[2] if self.has_unloads and route else []
+
+    def route_duration(self, vehicle: int, route: List[int]) -> float:
+        """Duration in minutes of a route (travel, waiting and service)"""
+        if not route:
+            return 0.0
+        return self.route_schedule(vehicle, route)[1] - self.vehicle_shift_start[vehicle]
+
+    def route_load(self, route: List[int]) -> float:
+        """Total demand of a route"""
+        return float(self.demand[list(route)].sum()) if route else 0.0
+
+    def route_compartment_load(self, route: List[int]) -> np.ndarray | None:
+        """Demand of a route per compartment (None without compartments)"""
+        if self.compartment_demand is None:
+            return None
+        if not route:
+            return np.zeros(self.compartment_demand.shape[1])
+        return self.compartment_demand[list(route)].sum(axis=0)
+
+    def fits(self, vehicle: int, load: float, compartment_load: np.ndarray | None = None) -> bool:
+        """Whether a total load (and per-compartment load) fits a vehicle; always true with unloads"""
+        if self.has_unloads:
+            return True
+        if load > self.vehicle_capacity[vehicle] + 1e-9:
+            return False
+        if compartment_load is None or self.compartment_capacity is None:
+            return True
+        return bool(np.all(compartment_load <= self.compartment_capacity[vehicle] + 1e-9))
+
+    def is_feasible(self, vehicle: int, route: List[int], check_capacity: bool = True) -> bool:
+        """Capacity, time-window and shift-length feasibility of a route"""
+        if check_capacity and not self.fits(vehicle, self.route_load(route), self.route_compartment_load(route)):
+            return False
+        if not route:
+            return True
+        starts, return_time = self.route_schedule(vehicle, route)
+        return (bool(np.all(starts <= self.window_end[list(route)] + 1e-9)) and
+                return_time <= self.vehicle_shift_end[vehicle] + 1e-9)
+
+
+class RoutingSolution:
+    """One route (list of customer nodes) per vehicle plus unserved customers"""
+
+    def __init__(self, problem: RoutingProblem, routes: List[List[int]], unassigned: List[int] | None = None):
+        self.problem = problem
+        self.routes = [list(r) for r in routes]
+        self.unassigned = list(unassigned or [])
+        self.route_of = np.full(problem.dist.shape[0], -1, dtype=np.intp)
+        self.position = np.full(problem.dist.shape[0], -1, dtype=np.intp)
+        self.distance = np.zeros(problem.num_vehicles)
+        self.load = np.zeros(problem.num_vehicles)
+        self.compartment_load = (None if problem.compartment_demand is None
+                                 else np.zeros((problem.num_vehicles, problem.compartment_demand.shape[1])))
+        # Schedule caches: earliest service start and latest feasible start per
+        # stop, so time-window checks of a local change are O(1)
+        self.start_time = np.zeros(problem.dist.shape[0])
+        self.latest_start = np.full(problem.dist.shape[0], np.inf)
+        self.return_time = problem.vehicle_shift_start.copy()
+        for vehicle in range(problem.num_vehicles):
+            self.refresh(vehicle)
+
+    def grow(self):
+        """Extend per-node caches after customers were added to the problem"""
+        extra = self.problem.num_nodes - len(self.route_of)
+        if extra > 0:
+            self.route_of = np.concatenate([self.route_of, np.full(extra, -1, dtype=np.intp)])
+            self.position = np.concatenate([self.position, np.full(extra, -1, dtype=np.intp)])
+            self.start_time = np.concatenate([self.start_time, np.zeros(extra)])
+            self.latest_start = np.concatenate([self.latest_start, np.full(extra, np.inf)])
+
+    def refresh(self, vehicle: int):
+        """Recompute cached position, distance, load and schedule of one route"""
+        problem = self.problem
+        route = self.routes[vehicle]
+        for index, node in enumerate(route):
+            self.route_of[node] = vehicle
+            self.position[node] = index
+        self.distance[vehicle] = problem.route_distance(vehicle, route)
+        self.load[vehicle] = problem.route_load(route)
+        if self.compartment_load is not None:
+            self.compartment_load[vehicle] = problem.route_compartment_load(route)
+
+        if not route:
+            self.return_time[vehicle] = problem.vehicle_shift_start[vehicle]
+            return
+        starts, self.return_time[vehicle] = problem.route_schedule(vehicle, route)
+        self.start_time[route] = starts
+
+        # Backward pass: latest start at each stop that keeps the rest of the route feasible
+        latest = problem.vehicle_shift_end[vehicle]
+        if problem.has_unloads:
+            path, is_unload = problem.route_path(vehicle, route)
+            following = path[-1]
+            for node, unload in zip(reversed(path[1:-1]), reversed(is_unload[1:-1])):
+                latest -= problem.travel_min(vehicle, node, following)
+                if unload:
+                    latest -= problem.unload_min
+                else:
+                    latest = min(problem.window_end[node], latest - problem.service_min[node])
+                    self.latest_start[node] = latest
+                following = node
+            return
+        following = problem.vehicle_depot[vehicle]
+        for node in reversed(route):
+            latest = min(problem.window_end[node],
+                         latest - problem.travel_min(vehicle, node, following) - problem.service_min[node])
+            self.latest_start[node] = latest
+            following = node
+
+    def fits(self, vehicle: int, added: int, removed: int = -1) -> bool:
+        """Capacity check for adding node added to a route (optionally in place of node removed)"""
+        problem = self.problem
+        if problem.has_unloads:
+            # Per-trip capacity: only a stop larger than the truck can never fit
+            return not problem._overflows(vehicle, 0.0, None if self.compartment_load is None
+                                          else np.zeros(self.compartment_load.shape[1]), added)
+        load = self.load[vehicle] + problem.demand[added] - (problem.demand[removed] if removed >= 0 else 0.0)
+        if self.compartment_load is None:
+            return load <= problem.vehicle_capacity[vehicle] + 1e-9
+        compartments = self.compartment_load[vehicle] + problem.compartment_demand[added]
+        if removed >= 0:
+            compartments = compartments - problem.compartment_demand[removed]
+        return problem.fits(vehicle, load, compartments)
+
+    def duration(self, vehicle: int) -> float:
+        """Route duration in minutes, including waiting for time windows"""
+        if not self.routes[vehicle]:
+            return 0.0
+        return float(self.return_time[vehicle] - self.problem.vehicle_shift_start[vehicle])
+
+    def ready_time(self, vehicle: int, index: int) -> float:
+        """Time the vehicle can leave the stop at position index (-1 is the depot)"""
+        if index < 0:
+            return float(self.problem.vehicle_shift_start[vehicle])
+        node = self.routes[vehicle][index]
+        return float(self.start_time[node] + self.problem.service_min[node])
+
+    def latest_arrival(self, vehicle: int, index: int) -> float:
+        """Latest arrival at position index that keeps the route feasible (len(route) is the depot)"""
+        if index >= len(self.routes[vehicle]):
+            return float(self.problem.vehicle_shift_end[vehicle])
+        return float(self.latest_start[self.routes[vehicle][index]])
+
+    def can_place(self, vehicle: int, node: int, index: int, replace: bool = False) -> bool:
+        """O(1) time-window check for putting node at position index of a route
+
+        With replace=False the node is inserted before the stop at index; with
+        replace=True it takes the place of that stop.
+        """
+        problem = self.problem
+        route = self.routes[vehicle]
+        depot = problem.vehicle_depot[vehicle]
+        before = route[index - 1] if index > 0 else depot
+        after_index = index + 1 if replace else index
+        after = route[after_index] if after_index < len(route) else depot
+
+        start = max(problem.window_start[node],
+                    self.ready_time(vehicle, index - 1) + problem.travel_min(vehicle, before, node))
+        if start > problem.window_end[node] + 1e-9:
+            return False
+        arrival = start + problem.service_min[node] + problem.travel_min(vehicle, node, after)
+        return arrival <= self.latest_arrival(vehicle, after_index) + 1e-9
+
+    def adjacent_nodes(self, vehicle: int, index: int) -> Tuple[int, int]:
+        """Nodes before and after position index of a route (depot at the ends)"""
+        route = self.routes[vehicle]
+        depot = self.problem.vehicle_depot[vehicle]
+        prev = route[index - 1] if index > 0 else depot
+        nxt = route[index + 1] if index + 1 < len(route) else depot
+        return prev, nxt
+
+    def total_distance(self) -> float:
+        return float(self.distance.sum())
+
+    def copy(self) -> "RoutingSolution":
+        return RoutingSolution(self.problem, self.routes, self.unassigned)
+
+
+# Insertion positions checked exactly (with unload detours) per route and stop
+UNLOAD_INSERTION_CANDIDATES = 3
+
+
+def savings_construction(problem: RoutingProblem) -> List[List[int]]:
+    """Clarke-Wright parallel savings over nearest-neighbour candidate pairs
+
+    Every customer belongs to its nearest depot, and each depot's routes are
+    built against it with the largest capacity and shift of the trucks based
+    there; assignment to actual trucks and any repair happen afterwards.
+    With compartments, a merge is only kept if the merged route fits the
+    compartments of some vehicle.
+    """
+    customers = problem.customers
+    depots = np.unique(problem.vehicle_depot)
+    home = np.argmin(problem.dist[np.ix_(depots, customers)] + problem.dist[np.ix_(customers, depots)].T, axis=0)
+    routes: List[List[int]] = []
+    for k, depot in enumerate(depots):
+        vehicles = np.flatnonzero(problem.vehicle_depot == depot)
+        routes += _depot_savings(problem, int(depot), customers[home == k], vehicles)
+    return sorted(routes, key=lambda r: -problem.route_load(r))
+
+
+def _depot_savings(problem: RoutingProblem, depot: int, customers: np.ndarray,
+                   vehicles: np.ndarray) -> List[List[int]]:
+    """Savings routes over customers, rooted at one depot and sized for its vehicles"""
+    if not len(customers):
+        return []
+    dist = problem.dist
+    reference = int(vehicles[np.argmax(problem.vehicle_capacity[vehicles])])
+    capacity = problem.vehicle_capacity[reference]
+    shift = problem.vehicle_shift_min[vehicles].max()
+    speed = problem.vehicle_speed_kmh[vehicles].mean()
+
+    # Candidate pairs (i, j): j among the nearest neighbours of i, both customers
+    is_customer = np.zeros(dist.shape[0], dtype=bool)
+    is_customer[customers] = True
+    first = np.repeat(customers, problem.neighbours.shape[1])
+    second = problem.neighbours[customers].ravel()
+    keep = is_customer[second]
+    first, second = first[keep], second[keep]
+    savings = dist[first, depot] + dist[depot, second] - dist[first, second]
+    order = np.argsort(-savings, kind='stable')
+
+    routes: Dict[int, List[int]] = {int(c): [int(c)] for c in customers}
+    owner = {int(c): int(c) for c in customers}
+    load = {int(c): float(problem.demand[c]) for c in customers}
+    length = {int(c): float(dist[depot, c] + dist[c, depot]) for c in customers}
+    service = {int(c): float(problem.service_min[c]) for c in customers}
+    compartments = problem.compartment_demand
+    if compartments is not None:
+        by_stream = {int(c): compartments[c].copy() for c in customers}
+        stream_capacity = problem.compartment_capacity + 1e-9
+
+    for k in order:
+        if savings[k] < 0:
+            break
+        i, j = int(first[k]), int(second[k])
+        ri, rj = owner[i], owner[j]
+        if ri == rj:
+            continue
+        route_i, route_j = routes[ri], routes[rj]
+
+        # Join the end of one route to the start of the other, reversing if allowed
+        if route_i[-1] == i and route_j[0] == j:
+            merged = route_i + route_j
+        elif problem.symmetric and route_i[0] == i and route_j[0] == j:
+            merged = route_i[::-1] + route_j
+        elif problem.symmetric and route_i[-1] == i and route_j[-1] == j:
+            merged = route_i + route_j[::-1]
+        elif problem.symmetric and route_i[0] == i and route_j[-1] == j:
+            merged = route_j + route_i
+        else:
+            continue
+
+        new_load = load[ri] + load[rj]
+        new_length = length[ri] + length[rj] - float(savings[k])
+        new_service = service[ri] + service[rj]
+        if new_load > capacity or new_length / speed * 60.0 + new_service > shift:
+            continue
+        if compartments is not None:
+            new_streams = by_stream[ri] + by_stream[rj]
+            if not np.any(np.all(new_streams <= stream_capacity, axis=1)):
+                continue
+        if problem.has_time_windows and not problem.is_feasible(reference, merged, check_capacity=False):
+            continue
+
+        routes[ri] = merged
+        load[ri], length[ri], service[ri] = new_load, new_length, new_service
+        if compartments is not None:
+            by_stream[ri] = new_streams
+            del by_stream[rj]
+        for node in route_j:
+            owner[node] = ri
+        del routes[rj], load[rj], length[rj], service[rj]
+
+    return list(routes.values())
+
+
+def insertion_cost(solution: RoutingSolution, vehicle: int, node: int, min_index: int = 0) -> Tuple[float, int]:
+    """Cheapest feasible position to insert node into a route: (added km, index)
+
+    Positions before min_index (stops already served) are not considered.
+    """
+    problem = solution.problem
+    route = solution.routes[vehicle]
+    if not solution.fits(vehicle, node):
+        return np.inf, -1
+
+    depot = problem.vehicle_depot[vehicle]
+    nodes = np.array([depot] + route + [depot], dtype=np.intp)
+    before, after = nodes[:-1], nodes[1:]
+    added = problem.dist[before, node] + problem.dist[node, after] - problem.dist[before, after]
+
+    # Vectorized time-window check of every insertion position at once
+    ready = np.concatenate(([problem.vehicle_shift_start[vehicle]],
+                            solution.start_time[route] + problem.service_min[route]))
+    latest = np.concatenate((solution.latest_start[route], [problem.vehicle_shift_end[vehicle]]))
+    start = np.maximum(problem.window_start[node], ready + problem.travel_min(vehicle, before, node))
+    arrival = start + problem.service_min[node] + problem.travel_min(vehicle, node, after)
+    added[(start > problem.window_end[node] + 1e-9) | (arrival > latest + 1e-9)] = np.inf
+    added[:min_index] = np.inf
+
+    if problem.has_unloads:
+        # Detours to unload points move with the insertion: check the best few positions exactly
+        for index in np.argsort(added, kind='stable')[:UNLOAD_INSERTION_CANDIDATES]:
+            if not np.isfinite(added[index]):
+                break
+            candidate = route[:index] + [node] + route[index:]
+            if problem.is_feasible(vehicle, candidate):
+                return problem.route_distance(vehicle, candidate) - float(solution.distance[vehicle]), int(index)
+        return np.inf, -1
+
+    index = int(np.argmin(added))
+    if not np.isfinite(added[index]):
+        return np.inf, -1
+    return float(added[index]), index
+
+
+def insert_node(solution: RoutingSolution, vehicle: int, node: int, index: int):
+    """Insert node at a route position and refresh that route"""
+    solution.routes[vehicle].insert(index, node)
+    solution.refresh(vehicle)
+
+
+def remove_node(solution: RoutingSolution, node: int) -> int:
+    """Remove a node from its route; returns the vehicle it was removed from"""
+    vehicle = int(solution.route_of[node])
+    solution.routes[vehicle].pop(int(solution.position[node]))
+    solution.route_of[node] = -1
+    solution.position[node] = -1
+    solution.refresh(vehicle)
+    return vehicle
+
+
+def assign_routes(problem: RoutingProblem, routes: List[List[int]]) -> RoutingSolution:
+    """Give constructed routes to vehicles, then repair and reinsert leftovers
+
+    Routes are matched largest load to largest capacity among the free
+    trucks of the route's nearest depot, then of any depot (with
+    compartments, to the largest such vehicle whose compartments fit). With unload
+    facilities, routes beyond the fleet size become extra trips of the
+    truck that finishes earliest. Remaining routes and stops that break a
+    truck's limits are reinserted where cheapest; whatever still does not
+    fit is reported as unassigned.
+    """
+    dist = problem.dist
+    vehicles_by_capacity = list(np.argsort(-problem.vehicle_capacity, kind='stable'))
+    assigned: List[List[int]] = [[] for _ in range(problem.num_vehicles)]
+    leftovers: List[int] = []
+
+    for route in routes:
+        if not vehicles_by_capacity:
+            if problem.has_unloads:
+                # Another trip for the truck that finishes earliest, after an unload
+                for vehicle in sorted(range(problem.num_vehicles), key=lambda v: problem.route_duration(v, assigned[v])):
+                    if assigned[vehicle] and problem.is_feasible(vehicle, assigned[vehicle] + list(route)):
+                        assigned[vehicle] = assigned[vehicle] + list(route)
+                        break
+                else:
+                    leftovers.extend(route)
+            else:
+                leftovers.extend(route)
+            continue
+        depot_cost = [dist[d, route[0]] + dist[route[-1], d] for d in problem.vehicle_depot[vehicles_by_capacity]]
+        nearest = min(depot_cost)
+        candidates = ([v for v, cost in zip(vehicles_by_capacity, depot_cost) if cost <= nearest] +
+                      [v for v, cost in zip(vehicles_by_capacity, depot_cost) if cost > nearest])
+        chosen = candidates[0]
+        if problem.compartment_demand is not None:
+            load, streams = problem.route_load(route), problem.route_compartment_load(route)
+            chosen = next((v for v in candidates if problem.fits(v, load, streams)), chosen)
+        vehicles_by_capacity.remove(chosen)
+        assigned[chosen] = list(route)
+
+    solution = RoutingSolution(problem, assigned)
+
+    # Drop the stops with the largest detour until every route is feasible
+    for vehicle in range(problem.num_vehicles):
+        while solution.routes[vehicle] and not problem.is_feasible(vehicle, solution.routes[vehicle]):
+            route = solution.routes[vehicle]
+            gains = []
+            for index, node in enumerate(route):
+                prev, nxt = solution.adjacent_nodes(vehicle, index)
+                gains.append(problem.dist[prev, node] + problem.dist[node, nxt] - problem.dist[prev, nxt])
+            node = route[int(np.argmax(gains))]
+            remove_node(solution, node)
+            leftovers.append(node)
+
+    reinsert(solution, leftovers)
+    return solution
+
+
+def reinsert(solution: RoutingSolution, nodes: List[int]) -> List[int]:
+    """Cheapest feasible insertion of nodes (largest demand first); returns the ones left out"""
+    problem = solution.problem
+    for node in sorted(nodes, key=lambda n: -problem.demand[n]):
+        best = (np.inf, -1, -1)
+        for vehicle in range(problem.num_vehicles):
+            cost, index = insertion_cost(solution, vehicle, node)
+            if cost < best[0]:
+                best = (cost, vehicle, index)
+        if best[1] >= 0:
+            insert_node(solution, best[1], node, best[2])
+        else:
+            solution.unassigned.append(node)
+    return solution.unassigned
+
+
+def _relocate_delta(solution: RoutingSolution, node: int, target: int, index: int) -> Tuple[float, bool]:
+    """Distance change and feasibility of moving node to position index of route target"""
+    problem = solution.problem
+    dist = problem.dist
+    source = int(solution.route_of[node])
+    prev, nxt = solution.adjacent_nodes(source, int(solution.position[node]))
+    removal = dist[prev, node] + dist[node, nxt] - dist[prev, nxt]
+
+    route = solution.routes[target]
+    depot = problem.vehicle_depot[target]
+    before = route[index - 1] if index > 0 else depot
+    after = route[index] if index < len(route) else depot
+    addition = dist[before, node] + dist[node, after] - dist[before, after]
+
+    if not solution.fits(target, node):
+        return addition - removal, False
+    return addition - removal, solution.can_place(target, node, index)
+
+
+def _swap_delta(solution: RoutingSolution, u: int, v: int) -> Tuple[float, bool]:
+    """Distance change and feasibility of exchanging u and v between their routes"""
+    problem = solution.problem
+    dist = problem.dist
+    ru, rv = int(solution.route_of[u]), int(solution.route_of[v])
+    pu, su = solution.adjacent_nodes(ru, int(solution.position[u]))
+    pv, sv = solution.adjacent_nodes(rv, int(solution.position[v]))
+
+    delta_u = dist[pu, v] + dist[v, su] - dist[pu, u] - dist[u, su]
+    delta_v = dist[pv, u] + dist[u, sv] - dist[pv, v] - dist[v, sv]
+
+    if not (solution.fits(ru, v, removed=u) and solution.fits(rv, u, removed=v)):
+        return delta_u + delta_v, False
+
+    feasible = (solution.can_place(ru, v, int(solution.position[u]), replace=True) and
+                solution.can_place(rv, u, int(solution.position[v]), replace=True))
+    return delta_u + delta_v, feasible
+
+
+def inter_route_search(solution: RoutingSolution, deadline: float | None = None) -> RoutingSolution:
+    """Relocate and swap stops between routes until no improving move remains
+
+    Moves are only evaluated between a stop and its nearest neighbours in
+    other routes (plus empty vehicles for relocation), with O(1) delta and
+    feasibility checks from cached route loads and schedules.
+    """
+    problem = solution.problem
+    improved = True
+
+    while improved:
+        improved = False
+        for node in problem.customers:
+            node = int(node)
+            source = int(solution.route_of[node])
+            if source < 0:
+                continue
+
+            best = (-IMPROVEMENT_EPS, None)
+            for other in problem.neighbours[node]:
+                other = int(other)
+                target = int(solution.route_of[other])
+                if target < 0 or target == source:
+                    continue
+                for index in (int(solution.position[other]), int(solution.position[other]) + 1):
+                    delta, feasible = _relocate_delta(solution, node, target, index)
+                    if feasible and delta < best[0]:
+                        best = (delta, ('relocate', target, index))
+                delta, feasible = _swap_delta(solution, node, other)
+                if feasible and delta < best[0]:
+                    best = (delta, ('swap', other))
+
+            for target in range(problem.num_vehicles):
+                if not solution.routes[target] and target != source:
+                    delta, feasible = _relocate_delta(solution, node, target, 0)
+                    if feasible and delta < best[0]:
+                        best = (delta, ('relocate', target, 0))
+
+            move = best[1]
+            if move is not None:
+                if problem.has_unloads:
+                    changed = {source, move[1] if move[0] == 'relocate' else int(solution.route_of[move[1]])}
+                    before = {v: list(solution.routes[v]) for v in changed}
+                    previous_km = sum(solution.distance[v] for v in changed)
+                if move[0] == 'relocate':
+                    _, target, index = move
+                    remove_node(solution, node)
+                    insert_node(solution, target, node, index)
+                else:
+                    other = move[1]
+                    ru, rv = int(solution.route_of[node]), int(solution.route_of[other])
+                    iu, iv = int(solution.position[node]), int(solution.position[other])
+                    solution.routes[ru][iu], solution.routes[rv][iv] = other, node
+                    solution.refresh(ru)
+                    solution.refresh(rv)
+                if problem.has_unloads and (
+                        sum(solution.distance[v] for v in changed) > previous_km - IMPROVEMENT_EPS or
+                        not all(problem.is_feasible(v, solution.routes[v]) for v in changed)):
+                    # The O(1) estimate ignored unload detours: undo the move
+                    for v, route in before.items():
+                        solution.routes[v] = route
+                    for v in changed:
+                        solution.refresh(v)
+                else:
+                    improved = True
+
+            if deadline is not None and time.perf_counter() > deadline:
+                return solution
+
+    return solution
+
+
+def improve_routes(solution: RoutingSolution, deadline: float | None = None) -> RoutingSolution:
+    """Intra-route 2-opt/Or-opt on every route
+
+    The reordered route is kept only if it still meets its time windows and
+    shift (and, with unload facilities, is shorter including the detours);
+    capacity cannot change.
+    """
+    problem = solution.problem
+    for vehicle, route in enumerate(solution.routes):
+        if len(route) < 3:
+            continue
+        nodes = np.array([problem.vehicle_depot[vehicle]] + route, dtype=np.intp)
+        tour = local_search(problem.dist[np.ix_(nodes, nodes)], np.arange(len(nodes)), deadline)
+        candidate = [int(n) for n in nodes[tour[1:]]]
+        if problem.has_unloads:
+            if (problem.route_distance(vehicle, candidate) >= solution.distance[vehicle] - IMPROVEMENT_EPS or
+                    not problem.is_feasible(vehicle, candidate)):
+                continue
+        elif problem.has_time_windows and not problem.is_feasible(vehicle, candidate):
+            continue
+        solution.routes[vehicle] = candidate
+        solution.refresh(vehicle)
+    return solution
+
+
+def warm_start_solution(problem: RoutingProblem, routes: List[List[int]]) -> RoutingSolution:
+    """Solution from given routes (e.g. a cached plan for a similar bin set)
+
+    Stops are dropped from the end of routes that are no longer feasible, and
+    customers missing from the routes are placed by cheapest insertion.
+    """
+    routes = [list(r) for r in routes[:problem.num_vehicles]]
+    routes += [[] for _ in range(problem.num_vehicles - len(routes))]
+    for vehicle, route in enumerate(routes):
+        while route and not problem.is_feasible(vehicle, route):
+            route.pop()
+    placed = {node for route in routes for node in route}
+    solution = RoutingSolution(problem, routes)
+    reinsert(solution, [int(c) for c in problem.customers if int(c) not in placed])
+    return solution
+
+
+def solve_cvrp(problem: RoutingProblem, time_limit: float | None = None,
+               initial_routes: List[List[int]] | None = None) -> RoutingSolution:
+    """Savings construction, assignment to trucks, then inter- and intra-route local search
+
+    With initial_routes the construction is skipped and the search starts
+    from those routes instead (see warm_start_solution).
+    """
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    if initial_routes is not None:
+        solution = warm_start_solution(problem, initial_routes)
+    else:
+        solution = assign_routes(problem, savings_construction(problem))
+    solution = improve_routes(solution, deadline)
+    solution = inter_route_search(solution, deadline)
+    return improve_routes(solution, deadline)